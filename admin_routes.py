@@ -0,0 +1,109 @@
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import PlainTextResponse
+from typing import List, Literal, Optional
+from auth.auth_middleware import auth_middleware
+from auth.auth_models import AuthenticatedUser
+from models.admin_models import QueryStatsEntry, AllocationGrowth
+from models.audit_models import AuditPage
+from models.api_responses import SuccessResponse
+from models.status_code import sc
+from utils.audit_log import audit_log
+from utils.commons import to_json_response
+from utils.loop_monitor import loop_monitor
+from utils.memory_diagnostics import memory_diagnostics
+from utils.metrics import metrics_registry
+from utils.query_stats import query_stats
+from utils.sampling_profiler import sampling_profiler
+
+admin_router = APIRouter(prefix="/api/v1/admin", tags=["admin"])
+
+@admin_router.get("/metrics")
+async def get_metrics(current_user: AuthenticatedUser = Depends(auth_middleware.require_admin())):
+    """Runtime statistics of caches, coalescing layers and background workers (admin only)"""
+    result = SuccessResponse(data=metrics_registry.collect(), status_code=sc.SUCCESS)
+    return to_json_response(result)
+
+@admin_router.get("/queries")
+async def get_top_queries(
+    limit: int = Query(20, ge=1, le=500),
+    orderBy: Literal["total", "count", "mean", "p99", "max"] = Query("total", description="statistic the queries are ranked by"),
+    source: Optional[Literal["postgresql", "mongodb"]] = Query(None, description="only queries of this data source"),
+    current_user: AuthenticatedUser = Depends(auth_middleware.require_admin())
+):
+    """Database queries dominating latency over the rolling window of the query stats (admin only)"""
+    entries = query_stats.top(limit, orderBy, source)
+    return to_json_response(SuccessResponse[List[QueryStatsEntry]](data=entries, status_code=sc.SUCCESS))
+
+@admin_router.delete("/queries")
+async def reset_query_stats(current_user: AuthenticatedUser = Depends(auth_middleware.require_admin())):
+    """Starts the query stats afresh, e.g. before measuring a change (admin only)"""
+    query_stats.reset()
+    return to_json_response(SuccessResponse[None](data=None, message="Query stats reset", status_code=sc.SUCCESS))
+
+@admin_router.get("/event-loop")
+async def get_event_loop_report(current_user: AuthenticatedUser = Depends(auth_middleware.require_admin())):
+    """Event loop lag and the stacks of the latest code that blocked the loop (admin only)"""
+    data = {**loop_monitor.stats(), "blockingStacks": loop_monitor.recent_captures()}
+    return to_json_response(SuccessResponse(data=data, status_code=sc.SUCCESS))
+
+@admin_router.get("/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(10, gt=0, le=120, description="how long to sample"),
+    intervalMs: float = Query(10, ge=1, le=1000, description="time between two samples"),
+    includeIdle: bool = Query(False, description="also count threads waiting for work"),
+    current_user: AuthenticatedUser = Depends(auth_middleware.require_admin())
+):
+    """
+    Samples the stacks of the event loop and executor threads for the given time and returns them
+    in collapsed stack format, e.g. for flamegraph.pl or speedscope. One session at a time (admin only).
+    """
+    collapsed = await sampling_profiler.profile(seconds, intervalMs / 1000, includeIdle)
+    return PlainTextResponse(collapsed)
+
+@admin_router.get("/memory")
+async def get_memory_report(current_user: AuthenticatedUser = Depends(auth_middleware.require_admin())):
+    """RSS, garbage collector and tracemalloc figures, and the allocations of the sampled requests per route (admin only)"""
+    data = {**memory_diagnostics.stats(), "routes": memory_diagnostics.route_allocations()}
+    return to_json_response(SuccessResponse(data=data, status_code=sc.SUCCESS))
+
+@admin_router.post("/memory/tracing")
+async def start_memory_tracing(
+    frames: int = Query(10, ge=1, le=100, description="frames of traceback kept per allocation"),
+    current_user: AuthenticatedUser = Depends(auth_middleware.require_admin())
+):
+    """
+    Starts tracing allocations with tracemalloc and takes the baseline snapshot. Tracing slows the
+    process down and takes memory, stop it when done (admin only).
+    """
+    memory_diagnostics.start(frames)
+    return to_json_response(SuccessResponse[None](data=None, message="Tracing allocations", status_code=sc.SUCCESS))
+
+@admin_router.delete("/memory/tracing")
+async def stop_memory_tracing(current_user: AuthenticatedUser = Depends(auth_middleware.require_admin())):
+    """Stops tracing allocations (admin only)"""
+    memory_diagnostics.stop()
+    return to_json_response(SuccessResponse[None](data=None, message="Stopped tracing allocations", status_code=sc.SUCCESS))
+
+@admin_router.get("/memory/growth")
+async def get_memory_growth(
+    limit: int = Query(20, ge=1, le=500),
+    groupBy: Literal["lineno", "filename", "traceback"] = Query("lineno", description="how allocations are grouped into sites"),
+    rebase: bool = Query(True, description="make this snapshot the baseline of the next call"),
+    current_user: AuthenticatedUser = Depends(auth_middleware.require_admin())
+):
+    """Allocation sites that grew the most since the previous snapshot, or since tracing started (admin only)"""
+    growth = await memory_diagnostics.top_growth(limit, groupBy, rebase)
+    return to_json_response(SuccessResponse[List[AllocationGrowth]](data=growth, status_code=sc.SUCCESS))
+
+@admin_router.get("/audit")
+async def get_audit_trail(
+    actor: Optional[str] = Query(None, description="only changes made by this admin (email)"),
+    target: Optional[str] = Query(None, description="only changes to this user (email)"),
+    action: Optional[str] = Query(None, description="only changes of this kind, e.g. assign_roles"),
+    cursor: Optional[str] = Query(None, description="nextCursor of the previous page"),
+    limit: int = Query(50, ge=1, le=500),
+    current_user: AuthenticatedUser = Depends(auth_middleware.require_admin())
+):
+    """Administrative changes with the values they replaced, newest first (admin only)"""
+    page = await audit_log.page(actor, target, action, cursor, limit)
+    return to_json_response(SuccessResponse[AuditPage](data=page, status_code=sc.SUCCESS))
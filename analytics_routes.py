@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, Query
+from analytics_service import analytics_service
+from auth.auth_middleware import auth_middleware
+from auth.auth_models import AuthenticatedUser
+from utils.commons import to_json_response
+
+analytics_router = APIRouter(prefix="/api/v1/user/analytics", tags=["analytics"])
+
+@analytics_router.get("/summary")
+async def get_weight_summary(current_user: AuthenticatedUser = Depends(auth_middleware.require_permissions(["read"]))):
+  """Count, average, spread and goal gap of user weights"""
+  result = await analytics_service.get_summary()
+  return to_json_response(result)
+
+@analytics_router.get("/weight-distribution")
+async def get_weight_distribution(
+  bucketKg: int = Query(10, ge=1, le=100, description="width of the histogram buckets"),
+  current_user: AuthenticatedUser = Depends(auth_middleware.require_permissions(["read"]))
+):
+  """Percentiles of weight, goal weight and goal gap, and the histogram of weights"""
+  result = await analytics_service.get_weight_distribution(bucketKg)
+  return to_json_response(result)
+
+@analytics_router.get("/goal-gap-cohorts")
+async def get_goal_gap_cohorts(current_user: AuthenticatedUser = Depends(auth_middleware.require_permissions(["read"]))):
+  """Users grouped by the weight they want to lose, as a percentage of their current weight"""
+  result = await analytics_service.get_goal_gap_cohorts()
+  return to_json_response(result)
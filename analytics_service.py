@@ -0,0 +1,155 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, List
+import numpy as np
+from models.analytics_models import WeightSummary, HistogramBucket, WeightDistribution, GoalGapCohort, GoalGapCohorts
+from models.api_responses import SuccessResponse
+from models.status_code import sc
+from utils.mongo_db_manager import mongodb_manager
+from utils.ttl_cache import TTLCache
+from utils.config import settings
+from utils.tracing import traced
+from mongo_collection_names import CollectionNames
+
+# Profiles the figures are computed on
+VALID_PROFILE = {"weight": {"$gt": 0}, "goal_weight": {"$gt": 0}}
+
+# Range of weights accepted by UserRequest
+MIN_WEIGHT_KG = 20
+MAX_WEIGHT_KG = 300
+
+PERCENTILES = [10, 25, 50, 75, 90, 95, 99]
+
+# Weight to lose as a percentage of the current weight
+GOAL_GAP_PERCENT = {"$multiply": [{"$divide": [{"$subtract": ["$weight", "$goal_weight"]}, "$weight"]}, 100]}
+GOAL_GAP_COHORT_BOUNDARIES = [0, 5, 10, 15, 20, 30, 50, 100]
+
+
+class AnalyticsService:
+  """
+  Weight analytics over user_profile. Grouping and bucketing run as aggregation pipelines
+  in MongoDB; percentiles, which $group can't compute before MongoDB 7, are computed with
+  NumPy over projected weights streamed in chunks. Results are cached for a while, so
+  dashboard refreshes don't recompute them.
+  """
+
+  def __init__(self):
+    self.cache = TTLCache(
+      name="user_analytics",
+      max_entries=64,
+      ttl_seconds=settings.ANALYTICS_CACHE_TTL_SECONDS,
+      negative_ttl_seconds=settings.ANALYTICS_CACHE_TTL_SECONDS
+    )
+
+  @traced("service")
+  async def get_summary(self) -> SuccessResponse[WeightSummary]:
+    summary = await self.cache.get_or_load(("summary",), self._summary)
+    return SuccessResponse[WeightSummary](data=summary, status_code=sc.SUCCESS)
+
+  @traced("service")
+  async def get_weight_distribution(self, bucket_kg: int) -> SuccessResponse[WeightDistribution]:
+    distribution = await self.cache.get_or_load(("distribution", bucket_kg), lambda: self._distribution(bucket_kg))
+    return SuccessResponse[WeightDistribution](data=distribution, status_code=sc.SUCCESS)
+
+  @traced("service")
+  async def get_goal_gap_cohorts(self) -> SuccessResponse[GoalGapCohorts]:
+    cohorts = await self.cache.get_or_load(("cohorts",), self._cohorts)
+    return SuccessResponse[GoalGapCohorts](data=cohorts, status_code=sc.SUCCESS)
+
+  async def _summary(self) -> WeightSummary:
+    pipeline = [
+      {"$match": VALID_PROFILE},
+      {"$group": {
+        "_id": None,
+        "users": {"$sum": 1},
+        "averageWeight": {"$avg": "$weight"},
+        "minWeight": {"$min": "$weight"},
+        "maxWeight": {"$max": "$weight"},
+        "weightStdDev": {"$stdDevPop": "$weight"},
+        "averageGoalWeight": {"$avg": "$goal_weight"},
+        "averageGoalGapKg": {"$avg": {"$subtract": ["$weight", "$goal_weight"]}}
+      }}
+    ]
+    results = await self._collection().aggregate(pipeline).to_list(None)
+    figures = {key: value for key, value in results[0].items() if key != "_id"} if results else {"users": 0}
+    rounded = {key: round(value, 2) if isinstance(value, float) else value for key, value in figures.items()}
+    return WeightSummary(**rounded, computedOn=self._now())
+
+  async def _distribution(self, bucket_kg: int) -> WeightDistribution:
+    boundaries = list(range(MIN_WEIGHT_KG, MAX_WEIGHT_KG + bucket_kg + 1, bucket_kg))
+    pipeline = [
+      {"$match": VALID_PROFILE},
+      {"$bucket": {"groupBy": "$weight", "boundaries": boundaries, "default": "out_of_range", "output": {"count": {"$sum": 1}}}}
+    ]
+    histogram_task = self._collection().aggregate(pipeline).to_list(None)
+    weights, counts = await asyncio.gather(self._load_weights(), histogram_task)
+
+    counts_by_lower = {bucket["_id"]: bucket["count"] for bucket in counts}
+    histogram = [
+      HistogramBucket(lowerKg=lower, upperKg=upper, count=counts_by_lower.get(lower, 0))
+      for lower, upper in zip(boundaries, boundaries[1:])
+    ]
+    percentiles = await asyncio.to_thread(self._percentiles, weights)
+    return WeightDistribution(users=len(weights), percentiles=percentiles, weightHistogram=histogram, computedOn=self._now())
+
+  async def _load_weights(self) -> np.ndarray:
+    """weight and goal_weight of every valid profile as an (n, 2) array, read in chunks of projected documents"""
+    chunk_size = settings.ANALYTICS_CHUNK_SIZE
+    cursor = self._collection().find(VALID_PROFILE, {"_id": 0, "weight": 1, "goal_weight": 1}).batch_size(chunk_size)
+    chunks = []
+    while True:
+      documents = await cursor.to_list(length=chunk_size)
+      if not documents:
+        break
+      chunks.append(np.array([(document["weight"], document["goal_weight"]) for document in documents], dtype=np.float64))
+    return np.concatenate(chunks) if chunks else np.empty((0, 2))
+
+  @staticmethod
+  def _percentiles(weights: np.ndarray) -> Dict[str, Dict[str, float]]:
+    if not len(weights):
+      return {}
+    metrics = {"weight": weights[:, 0], "goalWeight": weights[:, 1], "goalGap": weights[:, 0] - weights[:, 1]}
+    return {
+      metric: {f"p{percent}": round(float(value), 2) for percent, value in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+      for metric, values in metrics.items()
+    }
+
+  async def _cohorts(self) -> GoalGapCohorts:
+    pipeline = [
+      {"$match": VALID_PROFILE},
+      {"$bucket": {
+        "groupBy": GOAL_GAP_PERCENT,
+        "boundaries": GOAL_GAP_COHORT_BOUNDARIES,
+        "default": "out_of_range",
+        "output": {
+          "users": {"$sum": 1},
+          "averageWeight": {"$avg": "$weight"},
+          "averageGoalGapKg": {"$avg": {"$subtract": ["$weight", "$goal_weight"]}}
+        }
+      }}
+    ]
+    results = await self._collection().aggregate(pipeline).to_list(None)
+    by_lower = {result["_id"]: result for result in results}
+    cohorts: List[GoalGapCohort] = []
+    for lower, upper in zip(GOAL_GAP_COHORT_BOUNDARIES, GOAL_GAP_COHORT_BOUNDARIES[1:]):
+      result = by_lower.get(lower)
+      cohorts.append(GoalGapCohort(
+        minGapPercent=lower,
+        maxGapPercent=upper,
+        users=result["users"] if result else 0,
+        averageWeight=round(result["averageWeight"], 2) if result else 0.0,
+        averageGoalGapKg=round(result["averageGoalGapKg"], 2) if result else 0.0
+      ))
+    return GoalGapCohorts(cohorts=cohorts, computedOn=self._now())
+
+  @staticmethod
+  def _collection():
+    return mongodb_manager.get_collection(CollectionNames.USER_PROFILE, timeout=settings.ANALYTICS_QUERY_TIMEOUT_SECONDS)
+
+  @staticmethod
+  def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+#Global instance
+analytics_service = AnalyticsService()
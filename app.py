@@ -2,17 +2,31 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.encoders import jsonable_encoder
-from models.api_responses import ErrorResponse
 from models.status_code import sc
 from utils.config import settings
 from contextlib import asynccontextmanager
 from utils.logger import logger
+from utils.compression_middleware import CompressionMiddleware
+from utils.load_shedding_middleware import LoadSheddingMiddleware, RouteGroup
+from utils.tracing import TracingMiddleware, tracer
+from utils.memory_diagnostics import AllocationTrackingMiddleware, memory_diagnostics
+from utils.error_handling import to_error_response, stack_trace_sampler
+from utils.conditional_get import content_etag, is_not_modified, not_modified_response, REVALIDATE_PUBLIC
 from dummy_routes import dummy_router
+from analytics_routes import analytics_router
 from auth.auth_routes import auth_router
+from admin_routes import admin_router
+from job_routes import job_router
 from business_exception import BusinessException
 from utils.data_sources_manager import data_sources_manager
+from postgre_migrations import MIGRATIONS
+from auth.user_snapshot_cache import user_snapshot_cache
+from dummy_service import user_service
+from utils.job_runner import job_runner
+from utils.audit_log import audit_log
+from utils.loop_monitor import loop_monitor
 from datetime import datetime, timezone
 
 @asynccontextmanager
@@ -23,7 +37,12 @@ async def lifespan_handler(app: FastAPI):
     # Startup
     try:
         logger.info("Starting Template Project..")
-        await data_sources_manager.connect_all()
+        if settings.LOOP_MONITOR_ENABLED:
+            loop_monitor.start()
+        await data_sources_manager.connect_all(MIGRATIONS if settings.POSTGRE_AUTO_MIGRATE else None)
+        await user_snapshot_cache.start()
+        await job_runner.start()
+        await audit_log.start()
         logger.info("Application startup completed successfully")
     except Exception as e:
         logger.error(f"Failed to start application: {str(e)}")
@@ -34,7 +53,14 @@ async def lifespan_handler(app: FastAPI):
     # Shutdown
     try:
         logger.info("Shutting down Template Project...")
+        await job_runner.stop()
+        await audit_log.stop()
+        await user_snapshot_cache.stop()
+        if user_service.insert_batcher:
+            await user_service.insert_batcher.drain()
         await data_sources_manager.disconnect_all()
+        await loop_monitor.stop()
+        tracer.stop()
         logger.info("Application shutdown completed successfully")
     except Exception as e:
         logger.error(f"Error during application shutdown: {str(e)}")
@@ -48,6 +74,34 @@ app = FastAPI(
 
 )
 
+# Measures the routes only, not the middlewares
+if settings.MEMORY_ROUTE_SAMPLE_RATE > 0:
+    app.add_middleware(
+        AllocationTrackingMiddleware,
+        diagnostics=memory_diagnostics,
+        sample_rate=settings.MEMORY_ROUTE_SAMPLE_RATE,
+    )
+
+# Innermost of the middlewares but the allocation tracking, so that shed requests still get CORS headers
+if settings.LOAD_SHEDDING_ENABLED:
+    app.add_middleware(
+        LoadSheddingMiddleware,
+        groups=[
+            RouteGroup("health", ("/health",), settings.HEALTH_CONCURRENCY_LIMIT, reserved=True),
+            # Before auth: the admin and bulk routes under /api/v1/auth are shed first, like the other admin work
+            RouteGroup(
+                "admin",
+                ("/api/v1/admin", "/api/v1/auth/users", "/api/v1/auth/roles/", "/api/v1/auth/permissions/", "/api/v1/auth/assign-"),
+                settings.ADMIN_CONCURRENCY_LIMIT,
+                admit_below=0.7,
+            ),
+            RouteGroup("auth", ("/api/v1/auth",), settings.AUTH_CONCURRENCY_LIMIT, admit_below=1.0),
+            RouteGroup("user", ("/api/v1/user", "/api/v1/jobs"), settings.USER_CONCURRENCY_LIMIT, admit_below=0.9),
+        ],
+        default_group="user",
+        shared_capacity=settings.MAX_CONCURRENT_REQUESTS,
+    )
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -57,48 +111,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+    compress_level=settings.COMPRESSION_LEVEL,
+    offload_size=settings.COMPRESSION_OFFLOAD_SIZE,
+)
+
 #handle pydantic model errors
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    logger.error(f"Pydantic model validation failed in {request.method} {request.url.path}: {exc!r}")
-    error_response = ErrorResponse(
+    logger.warning(f"Pydantic model validation failed in {request.method} {request.url.path}: {exc!r}")
+    return to_error_response(
         error="Input validation failed",
         status_code=sc.UNPROCESSABLE_ENTITY,
         details=jsonable_encoder(exc.errors())
     )
-    return JSONResponse(
-        status_code=error_response.status_code,
-        content=error_response.model_dump(exclude_none=True),
-    )
 
 #handle business logic violation exception 
 @app.exception_handler(BusinessException)
 async def business_exception_handler(request: Request, exc: BusinessException):
-    logger.error(f"Business violation exception in {request.method} {request.url.path}", exc_info=True)
-    error_response = ErrorResponse(
-        error=str(exc),
-        status_code=exc.error_code
-    )
-    return JSONResponse(
-        status_code=error_response.status_code,
-        content=error_response.model_dump(exclude_none=True),
-    )
+    # Expected client errors (4xx) are routine and don't need a stack trace
+    if exc.error_code < sc.INTERNAL_SERVER_ERROR:
+        logger.warning(f"Business violation exception in {request.method} {request.url.path}: {exc}")
+    else:
+        stack_trace_sampler.log_unexpected(f"Business violation exception in {request.method} {request.url.path}", exc)
+    return to_error_response(error=str(exc), status_code=exc.error_code)
 
 #handle unexpected exceptions
 @app.exception_handler(Exception)
 async def generic_exception_handler(request: Request, exc: Exception):
-    logger.error(f"Unhandled exception in {request.method} {request.url.path}", exc_info=True)
-    error_response = ErrorResponse(
-        error=str(exc),
-        status_code=sc.INTERNAL_SERVER_ERROR
-    )
-    return JSONResponse(
-        status_code=error_response.status_code,
-        content=error_response.model_dump(exclude_none=True),
-    )
+    stack_trace_sampler.log_unexpected(f"Unhandled exception in {request.method} {request.url.path}", exc)
+    return to_error_response(error=str(exc), status_code=sc.INTERNAL_SERVER_ERROR)
+
+# Outermost, so that the request ID is known to everything below, shed requests and unhandled errors included
+app.add_middleware(TracingMiddleware, error_handler=generic_exception_handler)
 
 app.include_router(dummy_router)
+app.include_router(analytics_router)
 app.include_router(auth_router)
+app.include_router(admin_router)
+app.include_router(job_router)
 
 # Favicon endpoint to prevent 404 logs
 @app.get("/favicon.ico")
@@ -106,9 +159,20 @@ async def favicon():
     return {"message": "No favicon available"}
 
 # Health check endpoint
+HEALTH_STATUS = {"status": "healthy", "service": "template-app", "version" : "1.0.0"}
+HEALTH_BODY = JSONResponse(content=HEALTH_STATUS).body
+HEALTH_ETAG = content_etag(HEALTH_BODY)
+
 @app.get("/health")
-async def health_check():
-    return {"status": "healthy", "service": "template-app", "version" : "1.0.0"}
+async def health_check(request: Request):
+    # Constant body, serialized once
+    if is_not_modified(request, HEALTH_ETAG):
+        return not_modified_response(HEALTH_ETAG, REVALIDATE_PUBLIC)
+    return Response(
+        content=HEALTH_BODY,
+        media_type="application/json",
+        headers={"ETag": HEALTH_ETAG, "Cache-Control": REVALIDATE_PUBLIC}
+    )
 
 
 # Database health check endpoint
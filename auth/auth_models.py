@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional
 
 
@@ -21,6 +21,13 @@ class AccessPermissions(BaseModel):
     roles: Optional[List[str]] = []
     permissions: Optional[List[str]] = []
 
+class UserSnapshot(BaseModel):
+    """Model for the authoritative roles and permissions of a user, as stored in app_user"""
+    firstName: str
+    email: str
+    roles: List[str] = []
+    permissions: List[str] = []
+
 class AuthenticatedUser(BaseModel):
     """Model for authenticated user context"""
     firstName: str
@@ -29,6 +36,36 @@ class AuthenticatedUser(BaseModel):
     permissions: Optional[List[str]] = []
     token: str = None
 
+class UserSummary(BaseModel):
+    """Model for listing users, never carries the password"""
+    firstName: str
+    lastName: str
+    email: str
+    roles: List[str] = []
+    permissions: List[str] = []
+
+class UserDirectoryEntry(UserSummary):
+    """Model for a user in the admin user directory"""
+    lastUpdatedOn: str
+
+class UserDirectoryPage(BaseModel):
+    """Model for a page of the admin user directory"""
+    users: List[UserDirectoryEntry] = []
+    nextCursor: Optional[str] = None
+
+class IntrospectionRequest(BaseModel):
+    """Model for a batch token introspection request"""
+    tokens: List[str] = Field(..., min_length=1)
+
+class TokenIntrospection(BaseModel):
+    """Model for the introspection of one token, only an active token carries its user"""
+    active: bool
+    email: Optional[str] = None
+    firstName: Optional[str] = None
+    roles: List[str] = []
+    permissions: List[str] = []
+    expiresAt: Optional[int] = Field(None, description="expiry of the token in seconds since the epoch")
+
 class AssignRolesRequest(BaseModel):
     """Model for assigning roles request"""
     email: EmailStr
@@ -46,6 +83,19 @@ class AppUser(BaseModel):
     lastName: str
     email: EmailStr
     password: str
-    roles: Optional[str] = None
-    permissions: Optional[str] = None
+    roles: List[str] = []
+    permissions: List[str] = []
     social_login_ids: Optional[str] = None
+
+class UserImportRejection(BaseModel):
+    """Model for a row of a user import that was not imported"""
+    line: int
+    email: Optional[str] = None
+    reason: str
+
+class UserImportReport(BaseModel):
+    """Model for the result of a user import job"""
+    rows: int
+    imported: int
+    rejected: int
+    rejections: List[UserImportRejection] = []
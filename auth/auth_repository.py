@@ -1,14 +1,148 @@
-from .auth_models import SignUpRequest,AppUser
+from .auth_models import SignUpRequest,AppUser,UserSummary,UserDirectoryEntry
 from business_exception import BusinessException
 from models.status_code import sc
 from utils.config import settings
+from utils.logger import logger
+import asyncio
 import bcrypt
 from utils.postgre_db_manager import postgre_manager
+from utils.tracing import traced
+from datetime import datetime
+from typing import Optional
+from utils.commons import split_comma_separated
+from utils.single_flight import SingleFlight
+from .user_snapshot_cache import user_snapshot_cache
+
+IS_USER_EXISTS_QUERY = "SELECT COUNT('x') FROM app_user WHERE email_id = :email"
+
+GET_APP_USER_QUERY = """
+    SELECT first_name, last_name, email_id, password, role_list, permission_list, social_login_ids
+    FROM app_user 
+    WHERE email_id = :email
+"""
+
+# Return the values they overwrite for the audit trail, read from the row locked for the update
+UPDATE_ROLES_QUERY = """
+    WITH previous AS (
+        SELECT user_id, role_list, last_updated_by, last_updated_on FROM app_user WHERE email_id = :email FOR UPDATE
+    )
+    UPDATE app_user
+    SET roles = :roles, role_list = CAST(:roleList AS TEXT[]), last_updated_by = :updatedBy, last_updated_on = NOW()
+    FROM previous
+    WHERE app_user.user_id = previous.user_id
+    RETURNING previous.role_list AS previous_list, previous.last_updated_by AS previous_updated_by, previous.last_updated_on AS previous_updated_on
+"""
+
+UPDATE_PERMISSIONS_QUERY = """
+    WITH previous AS (
+        SELECT user_id, permission_list, last_updated_by, last_updated_on FROM app_user WHERE email_id = :email FOR UPDATE
+    )
+    UPDATE app_user
+    SET permissions = :permissions, permission_list = CAST(:permissionList AS TEXT[]), last_updated_by = :updatedBy, last_updated_on = NOW()
+    FROM previous
+    WHERE app_user.user_id = previous.user_id
+    RETURNING previous.permission_list AS previous_list, previous.last_updated_by AS previous_updated_by, previous.last_updated_on AS previous_updated_on
+"""
+
+UPDATE_PASSWORD_QUERY = """
+    UPDATE app_user 
+    SET password = :password, last_updated_by = :updatedBy, last_updated_on = NOW()
+    WHERE email_id = :email
+"""
+
+# Replaces the hash only if the password was not changed meanwhile. Not a change of the user:
+# last_updated_on is left alone, so the snapshot cache and the directory order don't see it.
+REHASH_PASSWORD_QUERY = """
+    UPDATE app_user
+    SET password = :password
+    WHERE email_id = :email AND password = :oldPassword
+"""
+
+# Staging table of a user import, private to the connection and dropped with the transaction
+CREATE_IMPORT_STAGING_QUERY = """
+    CREATE TEMP TABLE app_user_import (
+        line INT NOT NULL,
+        first_name VARCHAR(201) NOT NULL,
+        last_name VARCHAR(201) NOT NULL,
+        email_id VARCHAR(201) NOT NULL,
+        password VARCHAR(1000) NOT NULL
+    ) ON COMMIT DROP
+"""
+
+IMPORT_STAGING_COLUMNS = ["line", "first_name", "last_name", "email_id", "password"]
+
+# Returns the emails inserted, the others already had an account
+MERGE_IMPORTED_USERS_QUERY = """
+    INSERT INTO app_user (first_name, last_name, email_id, password, roles, role_list, created_by, created_on, last_updated_by, last_updated_on)
+    SELECT first_name, last_name, email_id, password, :roles, CAST(:roleList AS TEXT[]), :createdBy, NOW(), :createdBy, NOW()
+    FROM app_user_import
+    ORDER BY line
+    ON CONFLICT (email_id) DO NOTHING
+    RETURNING email_id
+"""
+
+USERS_WITH_ROLE_QUERY = """
+    SELECT first_name, last_name, email_id, role_list, permission_list
+    FROM app_user
+    WHERE role_list @> CAST(:roles AS TEXT[]) AND email_id > :after
+    ORDER BY email_id
+    LIMIT :limit
+"""
+
+USERS_WITH_PERMISSION_QUERY = """
+    SELECT first_name, last_name, email_id, role_list, permission_list
+    FROM app_user
+    WHERE permission_list @> CAST(:permissions AS TEXT[]) AND email_id > :after
+    ORDER BY email_id
+    LIMIT :limit
+"""
+
+def _user_directory_query(search: bool, roles: bool, after: bool) -> str:
+    """
+    Builds the user directory query with only the conditions in use,
+    so that every variant gets its own index friendly plan
+    """
+    conditions = []
+    if search:
+        conditions.append("(lower(email_id) LIKE :prefix OR lower(first_name) LIKE :prefix OR lower(last_name) LIKE :prefix)")
+    if roles:
+        conditions.append("role_list && CAST(:roles AS TEXT[])")
+    if after:
+        conditions.append("(last_updated_on, email_id) < (CAST(:afterUpdatedOn AS TIMESTAMP), CAST(:afterEmail AS VARCHAR))")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    return f"""
+    SELECT first_name, last_name, email_id, role_list, permission_list, last_updated_on
+    FROM app_user
+    {where}
+    ORDER BY last_updated_on DESC, email_id DESC
+    LIMIT :limit
+"""
+
+# Concurrent lookups of the same email share one query
+_user_exists_flight = SingleFlight("is_user_exists")
+_app_user_flight = SingleFlight("get_app_user")
+
+_SAMPLE_EMAIL = {"email": "someone@example.com"}
+postgre_manager.register_hot_query("is_user_exists", IS_USER_EXISTS_QUERY, _SAMPLE_EMAIL)
+postgre_manager.register_hot_query("get_app_user", GET_APP_USER_QUERY, _SAMPLE_EMAIL)
+postgre_manager.register_hot_query("assign_roles", UPDATE_ROLES_QUERY, {**_SAMPLE_EMAIL, "roles": "", "roleList": [], "updatedBy": ""})
+postgre_manager.register_hot_query("assign_permissions", UPDATE_PERMISSIONS_QUERY, {**_SAMPLE_EMAIL, "permissions": "", "permissionList": [], "updatedBy": ""})
+postgre_manager.register_hot_query("users_with_role", USERS_WITH_ROLE_QUERY, {"roles": ["admin"], "after": "", "limit": 100})
+postgre_manager.register_hot_query("users_with_permission", USERS_WITH_PERMISSION_QUERY, {"permissions": ["delete"], "after": "", "limit": 100})
+postgre_manager.register_hot_query("user_directory", _user_directory_query(False, False, True),
+                                   {"afterUpdatedOn": datetime(2000, 1, 1), "afterEmail": "", "limit": 50})
+postgre_manager.register_hot_query("user_directory_search", _user_directory_query(True, False, False), {"prefix": "some%", "limit": 50})
+postgre_manager.register_hot_query("update_password", UPDATE_PASSWORD_QUERY, {**_SAMPLE_EMAIL, "password": "", "updatedBy": ""})
+postgre_manager.register_hot_query("rehash_password", REHASH_PASSWORD_QUERY, {**_SAMPLE_EMAIL, "password": "", "oldPassword": ""})
+
+# Rehashes in progress by email, holding the tasks so they are not garbage collected
+_rehash_tasks: dict[str, asyncio.Task] = {}
 
 def _hash_password(password: str) -> str:
     try:
         # Generate salt and hash password
-        salt = bcrypt.gensalt()
+        salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
         hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
         return hashed.decode('utf-8')
     except Exception as error:
@@ -19,16 +153,17 @@ def _hash_password(password: str) -> str:
         )
 
 
+@traced("repository")
 async def create_user(signup_request: SignUpRequest,role:str) -> None:
     try:
         # Prepare SQL query to INSERT a new user
         insert_query = """
-            INSERT INTO app_user (first_name, last_name, email_id, password, roles, created_by, created_on, last_updated_by, last_updated_on)
-            VALUES (:firstName, :lastName, :email, :password, :roles, :createdBy, NOW(), :lastUpdatedBy, NOW());
+            INSERT INTO app_user (first_name, last_name, email_id, password, roles, role_list, created_by, created_on, last_updated_by, last_updated_on)
+            VALUES (:firstName, :lastName, :email, :password, :roles, CAST(:roleList AS TEXT[]), :createdBy, NOW(), :lastUpdatedBy, NOW());
         """
 
-        # Hash the password before storing
-        hashed_password = _hash_password(signup_request.password)
+        # Hash the password before storing, off the event loop as bcrypt is slow on purpose
+        hashed_password = await asyncio.to_thread(_hash_password, signup_request.password)
 
         values = {
             'firstName': signup_request.firstName,
@@ -36,6 +171,7 @@ async def create_user(signup_request: SignUpRequest,role:str) -> None:
             'email': signup_request.email,
             'password': hashed_password,
             'roles': role,
+            'roleList': [role],
             'createdBy': 'system',
             'lastUpdatedBy': 'system'
         }
@@ -50,25 +186,28 @@ async def create_user(signup_request: SignUpRequest,role:str) -> None:
             details={"user_email": signup_request.email}
         )
 
+@traced("repository")
 async def is_user_exists(email: str) -> bool:
-    query = "SELECT COUNT('x') FROM app_user WHERE email_id = :email"
+    return await _user_exists_flight.do(email, lambda: _is_user_exists(email))
+
+async def _is_user_exists(email: str) -> bool:
     params = {"email": email}
-    result =  await postgre_manager.fetch_one(query=query, values=params)
+    result =  await postgre_manager.fetch_one(query=IS_USER_EXISTS_QUERY, values=params)
     return True if result and result[0] != 0 else False
 
+@traced("repository")
 async def get_users_count() -> int:
     query = "SELECT COUNT('x') FROM app_user"
     result = await postgre_manager.fetch_one(query=query)
     return result[0] if result else 0
 
+@traced("repository")
 async def get_app_user(email: str) -> AppUser:
-    query = """
-        SELECT first_name, last_name, email_id, password, roles, permissions, social_login_ids
-        FROM app_user 
-        WHERE email_id = :email
-    """
+    return await _app_user_flight.do(email, lambda: _get_app_user(email))
+
+async def _get_app_user(email: str) -> AppUser:
     params = {"email": email}
-    record = await postgre_manager.fetch_one(query=query, values=params)
+    record = await postgre_manager.fetch_one(query=GET_APP_USER_QUERY, values=params)
 
     if not record:
         raise BusinessException(
@@ -81,79 +220,123 @@ async def get_app_user(email: str) -> AppUser:
         lastName=record['last_name'],
         email=record['email_id'],
         password=record['password'],  # Return actual password hash
-        roles=record['roles'],
-        permissions=record['permissions'],
+        roles=record['role_list'],
+        permissions=record['permission_list'],
         social_login_ids=record['social_login_ids'] if record['social_login_ids'] else None
     )
 
 
-async def assign_roles(email: str, roles: list[str],admin_user:str) -> None:
-    # Check if user exists
-    user_exists = await is_user_exists(email)
-    if not user_exists:
-        raise BusinessException(
-            message=f"User with email '{email}' not found",
-            error_code=sc.ENTITY_NOT_FOUND
-        )
-
-    # Update roles
+@traced("repository")
+async def assign_roles(email: str, roles: list[str],admin_user:str) -> dict:
+    """Returns the roles replaced, with who last updated the user and when"""
+    # Update roles, the comma separated column is kept in sync for older readers
     roles_str = ','.join(roles) if roles else ''
-    update_query = """
-        UPDATE app_user 
-        SET roles = :roles, last_updated_by = :updatedBy, last_updated_on = NOW()
-        WHERE email_id = :email
-    """
 
     values = {
         'roles': roles_str,
+        'roleList': roles or [],
         'updatedBy': admin_user,
         'email': email
     }
-    await postgre_manager.execute(query=update_query,values=values)
-
-
-async def assign_permissions(email: str, permissions: list[str],admin_user:str) -> None:
-    # Check if user exists
-    user_exists = await is_user_exists(email)
-    if not user_exists:
+    record = await postgre_manager.fetch_one(query=UPDATE_ROLES_QUERY,values=values)
+    if not record:
         raise BusinessException(
             message=f"User with email '{email}' not found",
             error_code=sc.ENTITY_NOT_FOUND
         )
+    _app_user_flight.forget(email)
+    user_snapshot_cache.invalidate(email)
+    return _previous_grants(record, "roles")
+
 
-    # Update permissions
+@traced("repository")
+async def assign_permissions(email: str, permissions: list[str],admin_user:str) -> dict:
+    """Returns the permissions replaced, with who last updated the user and when"""
+    # Update permissions, the comma separated column is kept in sync for older readers
     permissions_str = ','.join(permissions) if permissions else ''
-    update_query = """
-        UPDATE app_user 
-        SET permissions = :permissions, last_updated_by = :updatedBy, last_updated_on = NOW()
-        WHERE email_id = :email
-    """
 
     values = {
         'permissions': permissions_str,
+        'permissionList': permissions or [],
         'updatedBy': admin_user,
         'email': email
     }
-    await postgre_manager.execute(query=update_query,values=values)
+    record = await postgre_manager.fetch_one(query=UPDATE_PERMISSIONS_QUERY,values=values)
+    if not record:
+        raise BusinessException(
+            message=f"User with email '{email}' not found",
+            error_code=sc.ENTITY_NOT_FOUND
+        )
+    _app_user_flight.forget(email)
+    user_snapshot_cache.invalidate(email)
+    return _previous_grants(record, "permissions")
+
+def _previous_grants(record, name: str) -> dict:
+    updated_on = record['previous_updated_on']
+    return {
+        name: list(record['previous_list']),
+        'lastUpdatedBy': record['previous_updated_by'],
+        'lastUpdatedOn': updated_on.isoformat() if updated_on else None
+    }
+
+@traced("repository")
+async def get_users_with_role(role: str, after: str, limit: int) -> list[UserSummary]:
+    values = {"roles": [role], "after": after, "limit": limit}
+    records = await postgre_manager.fetch_all(query=USERS_WITH_ROLE_QUERY, values=values)
+    return [_to_user_summary(record) for record in records]
+
+@traced("repository")
+async def get_users_with_permission(permission: str, after: str, limit: int) -> list[UserSummary]:
+    values = {"permissions": [permission], "after": after, "limit": limit}
+    records = await postgre_manager.fetch_all(query=USERS_WITH_PERMISSION_QUERY, values=values)
+    return [_to_user_summary(record) for record in records]
+
+@traced("repository")
+async def get_user_directory_page(
+    prefix: Optional[str],
+    roles: list[str],
+    after: Optional[tuple[datetime, str]],
+    limit: int
+) -> list[UserDirectoryEntry]:
+    """
+    Returns users ordered by (last_updated_on, email_id) descending, starting after the given key.
+    prefix is matched against the start of the email, first name and last name, case insensitive.
+    """
+    values = {"limit": limit}
+    if prefix:
+        escaped = prefix.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        values["prefix"] = f"{escaped}%"
+    if roles:
+        values["roles"] = roles
+    if after:
+        values["afterUpdatedOn"], values["afterEmail"] = after
+
+    query = _user_directory_query(search=bool(prefix), roles=bool(roles), after=bool(after))
+    records = await postgre_manager.fetch_all(query=query, values=values)
+    return [
+        UserDirectoryEntry(
+            **_to_user_summary(record).model_dump(),
+            lastUpdatedOn=record['last_updated_on'].isoformat()
+        )
+        for record in records
+    ]
+
+def _to_user_summary(record) -> UserSummary:
+    return UserSummary(
+        firstName=record['first_name'],
+        lastName=record['last_name'],
+        email=record['email_id'],
+        roles=record['role_list'],
+        permissions=record['permission_list']
+    )
 
 def get_all_roles() -> list[str]:
-    roles_str = settings.ALLOWED_ROLES
-    if not roles_str or roles_str.strip() == '':
-        return []
-    
-    # Split by comma and clean up whitespace
-    roles = [role.strip() for role in roles_str.split(',') if role.strip()]
-    return roles
+    return split_comma_separated(settings.ALLOWED_ROLES)
 
 def get_all_permissions() -> list[str]:
-    permissions_str = settings.ALLOWED_PERMISSIONS
-    if not permissions_str or permissions_str.strip() == '':
-        return []
-    
-    # Split by comma and clean up whitespace
-    permissions = [permission.strip() for permission in permissions_str.split(',') if permission.strip()]
-    return permissions
+    return split_comma_separated(settings.ALLOWED_PERMISSIONS)
 
+@traced("repository")
 async def update_password(email: str, new_password: str) -> None:
     # Check if user exists
     user_exists = await is_user_exists(email)
@@ -164,22 +347,71 @@ async def update_password(email: str, new_password: str) -> None:
         )
 
     # Hash the new password before storing
-    hashed_password = _hash_password(new_password)
+    hashed_password = await asyncio.to_thread(_hash_password, new_password)
 
     # Update password
-    update_query = """
-        UPDATE app_user 
-        SET password = :password, last_updated_by = :updatedBy, last_updated_on = NOW()
-        WHERE email_id = :email
-    """
-
     values = {
         'password': hashed_password,
         'updatedBy': 'system',
         'email': email
     }
-    await postgre_manager.execute(query=update_query, values=values)
+    await postgre_manager.execute(query=UPDATE_PASSWORD_QUERY, values=values)
+    _app_user_flight.forget(email)
+    user_snapshot_cache.invalidate(email)
+
+
+def hash_passwords(passwords: list[str], rounds: int) -> list[str]:
+    """Hashes a chunk of passwords, run in the job process pool (so rounds is passed, not read from settings)"""
+    return [bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8') for password in passwords]
+
+@traced("repository")
+async def import_users(rows: list[tuple], role: str, created_by: str) -> set[str]:
+    """
+    Loads (line, first name, last name, email, hashed password) rows into a staging table through
+    the COPY protocol, then inserts them into app_user in one statement, skipping the emails that
+    already have an account. Returns the emails inserted.
+    """
+    async with postgre_manager.connection() as connection:
+        async with connection.transaction():
+            await postgre_manager.execute(query=CREATE_IMPORT_STAGING_QUERY)
+            # Whole import at once, bounded by its own deadline rather than by the usual one
+            await postgre_manager.copy_records(
+                "app_user_import", rows, IMPORT_STAGING_COLUMNS, timeout=settings.USER_IMPORT_LOAD_TIMEOUT_SECONDS
+            )
+            values = {'roles': role, 'roleList': [role], 'createdBy': created_by}
+            records = await postgre_manager.fetch_all(
+                query=MERGE_IMPORTED_USERS_QUERY, values=values, timeout=settings.USER_IMPORT_LOAD_TIMEOUT_SECONDS
+            )
+    return {record['email_id'] for record in records}
 
 
 def verify_password(user_password: str, password_in_db: str) -> bool:
     return bcrypt.checkpw(user_password.encode('utf-8'), password_in_db.encode('utf-8'))
+
+def needs_rehash(password_in_db: str) -> bool:
+    """Tells if the hash was made with another cost factor than BCRYPT_ROUNDS"""
+    # $2b$12$<salt and hash>
+    parts = password_in_db.split('$')
+    return len(parts) < 4 or not parts[2].isdigit() or int(parts[2]) != settings.BCRYPT_ROUNDS
+
+def schedule_rehash(email: str, password: str, password_in_db: str) -> None:
+    """
+    Rehashes the password with BCRYPT_ROUNDS in the background, once per user at a time.
+    Called after the password was verified, the only time the plain password is at hand.
+    """
+    if email in _rehash_tasks:
+        return
+    task = asyncio.create_task(_rehash_password(email, password, password_in_db))
+    _rehash_tasks[email] = task
+    task.add_done_callback(lambda _: _rehash_tasks.pop(email, None))
+
+async def _rehash_password(email: str, password: str, password_in_db: str) -> None:
+    try:
+        hashed_password = await asyncio.to_thread(_hash_password, password)
+        values = {'password': hashed_password, 'email': email, 'oldPassword': password_in_db}
+        await postgre_manager.execute(query=REHASH_PASSWORD_QUERY, values=values)
+        _app_user_flight.forget(email)
+        logger.info(f"Password hash of {email} upgraded to cost {settings.BCRYPT_ROUNDS}")
+    except Exception as error:
+        # The old hash still works, the next sign in tries again
+        logger.warning(f"Failed to rehash the password of {email}: {str(error)}")
@@ -1,6 +1,8 @@
-from fastapi import APIRouter,  Depends
+from fastapi import APIRouter,  Depends, Query, Request, UploadFile, File
+from typing import List, Literal, Optional
 from utils.commons import to_json_response
-from .auth_models import SignInRequest, SignUpRequest, AuthenticatedUser, AssignRolesRequest,AssignPermissionsRequest
+from utils.conditional_get import make_etag, is_not_modified, not_modified_response, to_conditional_json_response, REVALIDATE_PRIVATE
+from .auth_models import SignInRequest, SignUpRequest, AuthenticatedUser, AssignRolesRequest,AssignPermissionsRequest, IntrospectionRequest
 from .auth_service import auth_service
 from auth.auth_middleware import auth_middleware
 from utils.logger import logger
@@ -32,10 +34,24 @@ async def signout(current_user: AuthenticatedUser = Depends(auth_middleware.get_
 
 
 @auth_router.get("/permissions")
-async def get_permissions(current_user: AuthenticatedUser = Depends(auth_middleware.get_current_user)):
+async def get_permissions(request: Request, current_user: AuthenticatedUser = Depends(auth_middleware.get_current_user)):
     """Get current user's permissions and roles"""
-    result = await auth_service.get_user_permissions(current_user.token)
+    # Built from what the response contains, already loaded with the user
+    etag = make_etag(current_user.token, current_user.email, current_user.firstName, current_user.roles, current_user.permissions)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag, REVALIDATE_PRIVATE)
+
+    result = auth_service.get_current_user_permissions(current_user)
     logger.debug(f"Permissions retrieved for: {current_user.email}")
+    return to_conditional_json_response(request, result, REVALIDATE_PRIVATE, etag=etag)
+
+@auth_router.post("/introspect")
+async def introspect_tokens(
+    introspection_request: IntrospectionRequest,
+    current_user: AuthenticatedUser = Depends(auth_middleware.require_roles(["admin", "gateway"]))
+):
+    """Validate a batch of tokens in one call, returning the user of every active one (gateway or admin only)"""
+    result = await auth_service.introspect_tokens(introspection_request.tokens)
     return to_json_response(result)
 
 @auth_router.post("/assign-roles")
@@ -44,7 +60,7 @@ async def assign_roles(
     current_user: AuthenticatedUser = Depends(auth_middleware.require_roles(["admin"]))
 ):
     """Assign roles to a user (admin only)"""
-    result = await auth_service.assign_roles(assign_roles_request.email, assign_roles_request.roles,current_user.firstName)
+    result = await auth_service.assign_roles(assign_roles_request.email, assign_roles_request.roles, current_user)
     logger.info(f"Roles assigned by admin {current_user.firstName} to user: {assign_roles_request.email}")
     return to_json_response(result)
 
@@ -54,6 +70,52 @@ async def assign_permissions(
     current_user: AuthenticatedUser = Depends(auth_middleware.require_admin())
 ):
     """Assign permissions to a user (admin only)"""
-    result = await auth_service.assign_permissions(assign_permissions_request.email, assign_permissions_request.permissions,current_user.firstName)
+    result = await auth_service.assign_permissions(assign_permissions_request.email, assign_permissions_request.permissions, current_user)
     logger.info(f"Permissions assigned by admin {current_user.firstName} to user: {assign_permissions_request.email}")
     return to_json_response(result)
+
+@auth_router.get("/users")
+async def get_user_directory(
+    search: Optional[str] = Query(None, min_length=1, description="prefix of the email, first name or last name"),
+    role: List[str] = Query([], description="only users having any of these roles"),
+    cursor: Optional[str] = Query(None, description="nextCursor of the previous page"),
+    limit: int = Query(50, ge=1, le=500),
+    current_user: AuthenticatedUser = Depends(auth_middleware.require_admin())
+):
+    """List users, most recently updated first (admin only)"""
+    result = await auth_service.get_user_directory(search, role, cursor, limit)
+    return to_json_response(result)
+
+@auth_router.post("/users/import")
+async def import_users(
+    file: UploadFile = File(..., description="CSV with a firstName,lastName,email,password header line, or NDJSON objects with these fields"),
+    format: Literal["csv", "ndjson"] = Query("csv"),
+    current_user: AuthenticatedUser = Depends(auth_middleware.require_admin())
+):
+    """Create users in bulk in the background, the job reports progress and the rows not imported (admin only)"""
+    content = await file.read()
+    result = await auth_service.import_users(content, format, current_user)
+    logger.info(f"User import of {len(content)} bytes submitted by admin {current_user.firstName}")
+    return to_json_response(result)
+
+@auth_router.get("/roles/{role}/users")
+async def get_users_with_role(
+    role: str,
+    after: str = Query("", description="email of the last user of the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: AuthenticatedUser = Depends(auth_middleware.require_admin())
+):
+    """List users having a role, ordered by email (admin only)"""
+    result = await auth_service.get_users_with_role(role, after, limit)
+    return to_json_response(result)
+
+@auth_router.get("/permissions/{permission}/users")
+async def get_users_with_permission(
+    permission: str,
+    after: str = Query("", description="email of the last user of the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: AuthenticatedUser = Depends(auth_middleware.require_admin())
+):
+    """List users having a permission, ordered by email (admin only)"""
+    result = await auth_service.get_users_with_permission(permission, after, limit)
+    return to_json_response(result)
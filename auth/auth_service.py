@@ -1,14 +1,30 @@
-from typing import Optional, Dict, Any
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
 from business_exception import BusinessException
 from utils.logger import logger
+from utils.tracing import traced
 from .auth_models import (
     SignInRequest, SignUpRequest, AuthenticatedUser,
-    AccessPermissions
+    AccessPermissions, UserSummary, UserDirectoryPage, TokenIntrospection
 )
 from models.api_responses import SuccessResponse
+from models.job_models import JobSubmission
 from models.status_code import sc
-from .auth_repository import create_user, get_users_count,get_app_user, verify_password, is_user_exists, assign_roles, assign_permissions
+from utils.config import settings
+from utils.job_runner import job_runner, job_accepted
+from utils.cache_factory import create_cache
+from utils.ttl_cache import MISSING
+from utils.audit_log import audit_log
+from .auth_repository import create_user, get_users_count,get_app_user, verify_password, needs_rehash, schedule_rehash, is_user_exists, assign_roles, assign_permissions, get_users_with_role, get_users_with_permission, get_user_directory_page
 from .jwt_util import JwtUtil
+from .jwt_exception import JwtException
+from .user_snapshot_cache import user_snapshot_cache
+from .user_import import run_user_import
 
 
 class AuthenticationService:
@@ -16,7 +32,16 @@ class AuthenticationService:
     
     def __init__(self):
         self.jwt_util = JwtUtil()
+        # sha256 of a token -> its claims, or None for an invalid or expired token
+        self.verified_tokens = create_cache(
+            name="verified_token",
+            max_entries=settings.VERIFIED_TOKEN_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.VERIFIED_TOKEN_CACHE_TTL_SECONDS,
+            negative_ttl_seconds=settings.VERIFIED_TOKEN_CACHE_TTL_SECONDS,
+            value_type=Optional[Dict[str, Any]]
+        )
     
+    @traced("service")
     async def sign_up(self, signup_request: SignUpRequest) -> SuccessResponse[Dict[str, Any]]:
         # Check if user already exists
         if await is_user_exists(signup_request.email):
@@ -41,24 +66,25 @@ class AuthenticationService:
             status_code=sc.ENTITY_CREATION_SUCCESSFUL
         )
 
+    @traced("service")
     async def sign_in(self, signin_request: SignInRequest) -> SuccessResponse[AuthenticatedUser]:
         # First, get user details from database
         app_user = await get_app_user(signin_request.email)
 
-        # Verify user password using the retrieved password hash
-        if not  verify_password(signin_request.password, app_user.password):
+        # Verify user password using the retrieved password hash, off the event loop as bcrypt is slow on purpose
+        if not await asyncio.to_thread(verify_password, signin_request.password, app_user.password):
             logger.warning(f"User authentication failed - invalid credentials: {signin_request.email}")
             raise BusinessException(
                 message="Invalid credentials",
                 error_code=sc.UNAUTHORIZED
             )
 
-        # Split comma-separated roles and permissions into arrays
-        roles = app_user.roles.split(',') if app_user.roles else []
-        roles = [role.strip() for role in roles if role.strip()]
-        
-        permissions = app_user.permissions.split(',') if app_user.permissions else []
-        permissions = [permission.strip() for permission in permissions if permission.strip()]
+        # Hashes made with an outdated cost factor migrate as their users sign in
+        if needs_rehash(app_user.password):
+            schedule_rehash(signin_request.email, signin_request.password, app_user.password)
+
+        roles = app_user.roles
+        permissions = app_user.permissions
 
         # Generate JWT token
         token = self.jwt_util.generate_token(
@@ -79,40 +105,128 @@ class AuthenticationService:
             message="Login successful",
             status_code=sc.SUCCESS)
 
+    @traced("service")
     async def sign_out(self, token: str) -> SuccessResponse[Dict[str, Any]]:
       logger.info("User signout successful")
       return SuccessResponse(
           data={"message": "user logout successful", "status": "success"},
           status_code=sc.SUCCESS)
     
+    @traced("service")
     async def get_user_permissions(self, token: str) -> SuccessResponse[AccessPermissions]:
         # Validate JWT token
-        if not self.jwt_util.is_token_valid(token):
+        claims = self._verify_token(token)
+        if claims is None:
             logger.warning("Invalid JWT token provided for permissions request")
             raise BusinessException(
                 message="Invalid or expired token",
                 error_code=sc.UNAUTHORIZED,
             )
 
-        # Extract user information from JWT token
-        email = self.jwt_util.extract_username(token)
-        first_name = self.jwt_util.extract_first_name(token)
-        roles = self.jwt_util.extract_roles(token)
-        permissions = self.jwt_util.extract_permissions(token)
+        # Roles and permissions in the token may be outdated, authorize against app_user instead
+        email = claims.get("sub")
+        snapshot = await user_snapshot_cache.get(email)
+        if snapshot is None:
+            logger.warning(f"Valid JWT token presented for unknown user: {email}")
+            raise BusinessException(
+                message="Invalid or expired token",
+                error_code=sc.UNAUTHORIZED,
+            )
 
         logger.debug(f"Retrieved permissions for user: {email}")
         return SuccessResponse(
             data=AccessPermissions(
-                    firstName=first_name,
-                    email=email,
-                    roles=roles,
-                    permissions=permissions
+                    firstName=snapshot.firstName,
+                    email=snapshot.email,
+                    roles=snapshot.roles,
+                    permissions=snapshot.permissions
                 ),
             status_code=sc.SUCCESS)
 
-    async def assign_roles(self, email: str, roles: list[str],admin_user:str) -> SuccessResponse[Dict[str, Any]]:
+    @traced("service")
+    async def import_users(self, content: bytes, import_format: str, admin: AuthenticatedUser) -> SuccessResponse[JobSubmission]:
+        """Queues the import of the users of a CSV or NDJSON upload, see user_import.run_user_import"""
+        # Header line and trailing newline included
+        if content.count(b"\n") > settings.USER_IMPORT_MAX_ROWS + 1:
+            raise BusinessException(
+                message=f"A user import takes at most {settings.USER_IMPORT_MAX_ROWS} rows, split the file",
+                error_code=sc.VALIDATION_ERROR
+            )
+        job_id = await job_runner.submit(
+            "user_import",
+            lambda ctx: run_user_import(ctx, content, import_format, admin.firstName),
+            submitted_by=admin.email
+        )
+        return job_accepted(job_id)
+
+    @traced("service")
+    async def introspect_tokens(self, tokens: List[str]) -> SuccessResponse[List[TokenIntrospection]]:
+        """
+        Validates a batch of tokens, e.g. for a gateway, answering in the order of the request.
+        Each distinct token is verified once, mostly from the verified token cache, and the
+        users of the batch are looked up together, roles and permissions being taken from
+        app_user as for get_user_permissions.
+        """
+        if len(tokens) > settings.INTROSPECTION_MAX_TOKENS:
+            raise BusinessException(
+                message=f"At most {settings.INTROSPECTION_MAX_TOKENS} tokens can be introspected at once",
+                error_code=sc.VALIDATION_ERROR
+            )
+
+        claims_by_token = {token: self._verify_token(token) for token in dict.fromkeys(tokens)}
+        emails = list({claims.get("sub") for claims in claims_by_token.values() if claims})
+        snapshots = dict(zip(emails, await asyncio.gather(*(user_snapshot_cache.get(email) for email in emails))))
 
-        await assign_roles(email, roles,admin_user)
+        inactive = TokenIntrospection(active=False)
+        introspections = {}
+        for token, claims in claims_by_token.items():
+            snapshot = snapshots.get(claims.get("sub")) if claims else None
+            introspections[token] = TokenIntrospection(
+                active=True,
+                email=snapshot.email,
+                firstName=snapshot.firstName,
+                roles=snapshot.roles,
+                permissions=snapshot.permissions,
+                expiresAt=claims.get("exp")
+            ) if snapshot else inactive
+
+        active = sum(introspection.active for introspection in introspections.values())
+        logger.debug(f"Introspected {len(tokens)} tokens, {len(introspections)} distinct, {active} active")
+        return SuccessResponse(data=[introspections[token] for token in tokens], status_code=sc.SUCCESS)
+
+    def _verify_token(self, token: str) -> Optional[Dict[str, Any]]:
+        """Claims of a token with a valid signature that has not expired, or None"""
+        # Keyed by digest, so that the cache never holds usable tokens
+        key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        claims = self.verified_tokens.get(key)
+        if claims is MISSING:
+            try:
+                claims = self.jwt_util.decode_claims(token)
+            except JwtException:
+                claims = None
+            self.verified_tokens.put(key, claims)
+
+        # Cached for a while, but never served past the expiry of the token
+        if claims is not None and claims.get("exp", 0) <= time.time():
+            return None
+        return claims
+
+    def get_current_user_permissions(self, current_user: AuthenticatedUser) -> SuccessResponse[AccessPermissions]:
+        """Permissions of a user already authenticated by get_current_user, without decoding the token again"""
+        return SuccessResponse(
+            data=AccessPermissions(
+                    firstName=current_user.firstName,
+                    email=current_user.email,
+                    roles=current_user.roles,
+                    permissions=current_user.permissions
+                ),
+            status_code=sc.SUCCESS)
+
+    @traced("service")
+    async def assign_roles(self, email: str, roles: list[str], admin: AuthenticatedUser) -> SuccessResponse[Dict[str, Any]]:
+
+        previous = await assign_roles(email, roles, admin.firstName)
+        audit_log.record("assign_roles", actor=admin.email, target=email, before=previous, after={"roles": roles})
 
         logger.info(f"Roles assigned successfully for user: {email}, roles: {roles}")
         return SuccessResponse(
@@ -120,8 +234,10 @@ class AuthenticationService:
             status_code=sc.SUCCESS
         )
 
-    async def assign_permissions(self, email: str, permissions: list[str],admin_user:str) -> SuccessResponse[Dict[str, Any]]:
-        await assign_permissions(email, permissions,admin_user)
+    @traced("service")
+    async def assign_permissions(self, email: str, permissions: list[str], admin: AuthenticatedUser) -> SuccessResponse[Dict[str, Any]]:
+        previous = await assign_permissions(email, permissions, admin.firstName)
+        audit_log.record("assign_permissions", actor=admin.email, target=email, before=previous, after={"permissions": permissions})
 
         logger.info(f"Permissions assigned successfully for user: {email}, permissions: {permissions}")
         return SuccessResponse(
@@ -129,5 +245,55 @@ class AuthenticationService:
             status_code=sc.SUCCESS
         )
 
+    @traced("service")
+    async def get_users_with_role(self, role: str, after: str, limit: int) -> SuccessResponse[List[UserSummary]]:
+        users = await get_users_with_role(role, after, limit)
+        logger.debug(f"Found {len(users)} users with role: {role}")
+        return SuccessResponse(data=users, status_code=sc.SUCCESS)
+
+    @traced("service")
+    async def get_users_with_permission(self, permission: str, after: str, limit: int) -> SuccessResponse[List[UserSummary]]:
+        users = await get_users_with_permission(permission, after, limit)
+        logger.debug(f"Found {len(users)} users with permission: {permission}")
+        return SuccessResponse(data=users, status_code=sc.SUCCESS)
+
+    @traced("service")
+    async def get_user_directory(
+        self,
+        search: Optional[str],
+        roles: List[str],
+        cursor: Optional[str],
+        limit: int
+    ) -> SuccessResponse[UserDirectoryPage]:
+        after = self._decode_directory_cursor(cursor) if cursor else None
+
+        # One extra row tells whether there is a next page
+        users = await get_user_directory_page(search, roles, after, limit + 1)
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            next_cursor = self._encode_directory_cursor(users[-1].lastUpdatedOn, users[-1].email)
+
+        return SuccessResponse(
+            data=UserDirectoryPage(users=users, nextCursor=next_cursor),
+            status_code=sc.SUCCESS
+        )
+
+    @staticmethod
+    def _encode_directory_cursor(last_updated_on: str, email: str) -> str:
+        return base64.urlsafe_b64encode(json.dumps([last_updated_on, email]).encode('utf-8')).decode('utf-8')
+
+    @staticmethod
+    def _decode_directory_cursor(cursor: str) -> Tuple[datetime, str]:
+        try:
+            last_updated_on, email = json.loads(base64.urlsafe_b64decode(cursor.encode('utf-8')))
+            return datetime.fromisoformat(last_updated_on), email
+        except Exception as error:
+            raise BusinessException(
+                message="Invalid cursor",
+                error_code=sc.VALIDATION_ERROR,
+                original_exception=error
+            )
+
 #Global instance
 auth_service = AuthenticationService()
\ No newline at end of file
@@ -0,0 +1,59 @@
+"""
+Benchmarks bcrypt on this machine and recommends the cost factor (BCRYPT_ROUNDS)
+whose hash time stays within the target.
+
+$ python -m auth.bcrypt_calibration --target-ms 250
+"""
+import argparse
+import statistics
+import sys
+import time
+from typing import Optional
+import bcrypt
+
+MIN_ROUNDS = 4
+MAX_ROUNDS = 20
+
+
+def hash_time(rounds: int, samples: int) -> float:
+    """Median seconds to hash a password with the given cost"""
+    timings = []
+    for _ in range(samples):
+        salt = bcrypt.gensalt(rounds=rounds)
+        started = time.perf_counter()
+        bcrypt.hashpw(b"calibration password", salt)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def calibrate(target_seconds: float, samples: int) -> Optional[int]:
+    """Prints the hash time of each cost and returns the highest cost within the target, None if none is"""
+    recommended = None
+    print(f"{'rounds':>6}{'median ms':>12}")
+    for rounds in range(MIN_ROUNDS, MAX_ROUNDS + 1):
+        seconds = hash_time(rounds, samples)
+        print(f"{rounds:>6}{seconds * 1000:>12.1f}")
+        if seconds > target_seconds:
+            # Every round doubles the time, the next ones are over the target too
+            break
+        recommended = rounds
+    return recommended
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recommend a bcrypt cost factor for this machine")
+    parser.add_argument("--target-ms", type=float, default=250.0,
+                        help="longest acceptable time to hash (and so to verify) one password")
+    parser.add_argument("--samples", type=int, default=5, help="hashes timed per cost factor")
+    args = parser.parse_args()
+
+    recommended = calibrate(args.target_ms / 1000, args.samples)
+    if recommended is None:
+        print(f"even the minimum cost {MIN_ROUNDS} takes longer than {args.target_ms:.0f}ms", file=sys.stderr)
+        return 1
+    print(f"recommended BCRYPT_ROUNDS={recommended} (target {args.target_ms:.0f}ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
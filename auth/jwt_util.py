@@ -97,6 +97,10 @@ class JwtUtil:
     def extract_expiration(self, token: str) -> datetime:
         return self._extract_claim(token, lambda claims: datetime.fromtimestamp(claims.get('exp', 0), tz=timezone.utc))
     
+    def decode_claims(self, token: str) -> Dict[str, Any]:
+        """All claims of a token whose signature and expiry are valid, raises JwtException otherwise"""
+        return self._extract_all_claims(token)
+    
     def _generate_token(self, extra_claims: Dict[str, Any], username: str) -> str:
         """
         Generate JWT token with claims and username.
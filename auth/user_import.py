@@ -0,0 +1,114 @@
+import asyncio
+import csv
+import io
+import json
+from typing import Any, Dict, List, Tuple
+from pydantic import ValidationError
+from utils.config import settings
+from utils.job_runner import JobContext
+from utils.logger import logger
+from .auth_models import SignUpRequest, UserImportRejection, UserImportReport
+from .auth_repository import hash_passwords, import_users
+
+# Passwords hashed per process pool call
+HASH_CHUNK_SIZE = 200
+# Rejected rows listed in the job result, the others are only counted
+MAX_REPORTED_REJECTIONS = 1000
+# Imported users get the role of a sign up
+IMPORTED_USER_ROLE = "user"
+
+
+def parse_user_import(content: bytes, import_format: str) -> Tuple[List[tuple], List[tuple]]:
+    """
+    Validates the rows of a CSV upload (with a header line) or an NDJSON upload, having the fields
+    of a sign up: firstName, lastName, email and password. Returns the valid rows as
+    (line, first name, last name, email, password) and the rejected ones as (line, email, reason).
+    A row repeating the email of an earlier row is rejected. Runs in the job process pool.
+    """
+    rows: List[tuple] = []
+    rejections: List[tuple] = []
+    first_lines: Dict[str, int] = {}
+
+    for line, record in _records(content.decode("utf-8-sig"), import_format, rejections):
+        try:
+            request = SignUpRequest(**record)
+        except ValidationError as error:
+            reason = "; ".join(f"{'.'.join(map(str, detail['loc']))}: {detail['msg']}" for detail in error.errors())
+            rejections.append((line, record.get("email"), f"invalid row: {reason}"))
+            continue
+        if request.email in first_lines:
+            rejections.append((line, request.email, f"duplicate of line {first_lines[request.email]}"))
+            continue
+        first_lines[request.email] = line
+        rows.append((line, request.firstName, request.lastName, request.email, request.password))
+    return rows, rejections
+
+
+def _records(text: str, import_format: str, rejections: List[tuple]):
+    """(line number, fields) of every row, rows that are not even a record are rejected here"""
+    if import_format == "csv":
+        reader = csv.DictReader(io.StringIO(text))
+        for record in reader:
+            # values beyond the header columns are gathered under None
+            yield reader.line_num, {key: value for key, value in record.items() if key is not None}
+        return
+
+    for line, raw in enumerate(text.splitlines(), start=1):
+        if not raw.strip():
+            continue
+        try:
+            record = json.loads(raw)
+        except ValueError:
+            rejections.append((line, None, "invalid row: not valid JSON"))
+            continue
+        if not isinstance(record, dict):
+            rejections.append((line, None, "invalid row: not a JSON object"))
+            continue
+        yield line, record
+
+
+async def run_user_import(ctx: JobContext, content: bytes, import_format: str, created_by: str) -> Dict[str, Any]:
+    """
+    Job importing the users of an upload: validation and password hashing run in the job process
+    pool (chunks of passwords hashed in parallel), then the rows go to app_user through COPY.
+    Returns the UserImportReport as the job result.
+    """
+    await ctx.report_progress(0, "Validating rows")
+    rows, rejections = await ctx.run_cpu_bound(parse_user_import, content, import_format)
+    total_rows = len(rows) + len(rejections)
+
+    chunks = [rows[start:start + HASH_CHUNK_SIZE] for start in range(0, len(rows), HASH_CHUNK_SIZE)]
+    await ctx.report_progress(5, f"Hashing {len(rows)} passwords")
+    # All chunks are queued at once, so that every worker of the pool gets some
+    hashing = [
+        asyncio.ensure_future(ctx.run_cpu_bound(hash_passwords, [row[4] for row in chunk], settings.BCRYPT_ROUNDS))
+        for chunk in chunks
+    ]
+    report_every = max(1, len(chunks) // 20)
+    staged: List[tuple] = []
+    try:
+        for done, (chunk, future) in enumerate(zip(chunks, hashing), start=1):
+            hashed_passwords = await future
+            staged.extend((line, first_name, last_name, email, hashed_password)
+                          for (line, first_name, last_name, email, _), hashed_password in zip(chunk, hashed_passwords))
+            if done % report_every == 0:
+                await ctx.report_progress(5 + 80 * done / len(chunks), f"Hashed {len(staged)} of {len(rows)} passwords")
+    finally:
+        for future in hashing:
+            future.cancel()
+
+    await ctx.report_progress(85, f"Loading {len(staged)} users")
+    inserted = await import_users(staged, IMPORTED_USER_ROLE, created_by) if staged else set()
+    rejections.extend((line, email, "user already exists") for line, _, _, email, _ in staged if email not in inserted)
+    rejections.sort(key=lambda rejection: rejection[0])
+
+    logger.info(f"User import by {created_by}: {len(inserted)} imported, {len(rejections)} rejected")
+    return UserImportReport(
+        rows=total_rows,
+        imported=len(inserted),
+        rejected=len(rejections),
+        rejections=[
+            UserImportRejection(line=line, email=email, reason=reason)
+            for line, email, reason in rejections[:MAX_REPORTED_REJECTIONS]
+        ]
+    ).model_dump()
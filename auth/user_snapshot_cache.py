@@ -0,0 +1,193 @@
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any
+from utils.postgre_db_manager import postgre_manager
+from utils.config import settings
+from utils.logger import logger
+from utils.metrics import metrics_registry
+from utils.single_flight import SingleFlight
+from .auth_models import UserSnapshot
+
+# Rows whose last_updated_on falls this far behind the watermark are fetched again,
+# so that transactions committing after a refresh (NOW() is the transaction start time) are not missed
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+SNAPSHOT_QUERY = """
+    SELECT first_name, email_id, role_list, permission_list
+    FROM app_user
+    WHERE email_id = :email
+"""
+
+DELTA_QUERY = """
+    SELECT first_name, email_id, role_list, permission_list, last_updated_on
+    FROM app_user
+    WHERE last_updated_on > :since
+"""
+
+postgre_manager.register_hot_query("user_snapshot", SNAPSHOT_QUERY, {"email": "someone@example.com"})
+postgre_manager.register_hot_query("user_snapshot_delta", DELTA_QUERY, {"since": datetime(2000, 1, 1)})
+
+
+class UserSnapshotCache:
+    """
+    Bounded, lazily loaded in-process cache of email -> (roles, permissions, firstName).
+
+    Entries are invalidated by the write paths of auth_repository and reconciled
+    periodically against app_user.last_updated_on to pick up changes made elsewhere
+    (other instances, manual updates).
+    """
+
+    def __init__(self, max_entries: int, refresh_seconds: int):
+        self._entries: "OrderedDict[str, UserSnapshot]" = OrderedDict()
+        self._max_entries = max_entries
+        self._refresh_seconds = refresh_seconds
+        self._watermark: Optional[datetime] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        # Concurrent misses for the same user share one load
+        self._loads = SingleFlight("user_snapshot")
+
+        # Bumped whenever a cached snapshot is dropped or replaced
+        self.version = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get(self, email: str) -> Optional[UserSnapshot]:
+        """
+        Returns the snapshot of the given user, loading it from app_user on a miss.
+        Returns None if the user does not exist.
+        """
+        snapshot = self._entries.get(email)
+        if snapshot is not None:
+            self._entries.move_to_end(email)
+            self.hits += 1
+            return snapshot
+
+        self.misses += 1
+        return await self._loads.do(email, lambda: self._load(email))
+
+    async def _load(self, email: str) -> Optional[UserSnapshot]:
+        version = self.version
+        record = await postgre_manager.fetch_one(query=SNAPSHOT_QUERY, values={"email": email})
+        if not record:
+            return None
+
+        snapshot = self._to_snapshot(record)
+        # Don't cache what was read while an invalidation happened, it may already be stale
+        if version == self.version:
+            self._put(email, snapshot)
+        return snapshot
+
+    def invalidate(self, email: str) -> None:
+        """Drops the cached snapshot of the given user"""
+        self._entries.pop(email, None)
+        self._loads.forget(email)
+        self.version += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.version += 1
+
+    async def refresh(self) -> int:
+        """
+        Reconciles cached snapshots with rows updated since the last refresh.
+        Returns the number of cached snapshots that changed.
+        """
+        if self._watermark is None:
+            self._watermark = await self._current_watermark()
+            return 0
+
+        records = await postgre_manager.fetch_all(
+            query=DELTA_QUERY,
+            values={"since": self._watermark - REFRESH_OVERLAP}
+        )
+
+        changed = 0
+        for record in records:
+            if record['last_updated_on'] and record['last_updated_on'] > self._watermark:
+                self._watermark = record['last_updated_on']
+
+            email = record['email_id']
+            cached = self._entries.get(email)
+            if cached is None:
+                continue
+
+            snapshot = self._to_snapshot(record)
+            if snapshot != cached:
+                self._entries[email] = snapshot
+                self.version += 1
+                changed += 1
+
+        if changed:
+            logger.info(f"User snapshot refresh updated {changed} cached users")
+        return changed
+
+    async def start(self) -> None:
+        """Establishes the refresh watermark and starts the periodic delta refresh"""
+        self._watermark = await self._current_watermark()
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+        logger.info(f"User snapshot cache started (max entries: {self._max_entries}, refresh every {self._refresh_seconds}s)")
+
+    async def stop(self) -> None:
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+        self.clear()
+        logger.info("User snapshot cache stopped")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self._max_entries,
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "watermark": self._watermark.isoformat() if self._watermark else None
+        }
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._refresh_seconds)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"User snapshot refresh failed: {str(e)}")
+
+    async def _current_watermark(self) -> datetime:
+        return await postgre_manager.fetch_value(
+            "SELECT COALESCE(MAX(last_updated_on), NOW()::timestamp) FROM app_user"
+        )
+
+    def _put(self, email: str, snapshot: UserSnapshot) -> None:
+        self._entries[email] = snapshot
+        self._entries.move_to_end(email)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    @staticmethod
+    def _to_snapshot(record) -> UserSnapshot:
+        return UserSnapshot(
+            firstName=record['first_name'],
+            email=record['email_id'],
+            roles=record['role_list'],
+            permissions=record['permission_list']
+        )
+
+
+# Global instance
+user_snapshot_cache = UserSnapshotCache(
+    max_entries=settings.USER_CACHE_MAX_ENTRIES,
+    refresh_seconds=settings.USER_CACHE_REFRESH_SECONDS
+)
+metrics_registry.register("user_snapshot_cache", user_snapshot_cache.stats)
@@ -0,0 +1,94 @@
+"""
+Bandwidth vs CPU of response compression on the payload shapes the API produces.
+
+$ python -m benchmarks.compression_benchmark
+"""
+import argparse
+import time
+import zlib
+from datetime import datetime, timedelta
+from fastapi.responses import JSONResponse
+from auth.auth_models import AccessPermissions, UserDirectoryEntry, UserDirectoryPage
+from models.api_responses import SuccessResponse, ErrorResponse
+from models.status_code import sc
+from utils.compression_middleware import WBITS
+
+
+def user_directory_page(size: int) -> bytes:
+    now = datetime(2025, 1, 1)
+    users = [
+        UserDirectoryEntry(
+            firstName=f"First{i}",
+            lastName=f"Last{i}",
+            email=f"user.{i}@example.com",
+            roles=["user", "admin"] if i % 20 == 0 else ["user"],
+            permissions=["read", "update"] if i % 3 == 0 else ["read"],
+            lastUpdatedOn=(now - timedelta(seconds=i * 37)).isoformat()
+        )
+        for i in range(size)
+    ]
+    page = UserDirectoryPage(users=users, nextCursor="WyIyMDI1LTAxLTAxVDAwOjAwOjAwIiwgInVzZXJAZXhhbXBsZS5jb20iXQ==")
+    result = SuccessResponse(data=page, status_code=sc.SUCCESS)
+    return JSONResponse(content=result.model_dump(exclude_none=True)).body
+
+
+def validation_error(errors: int) -> bytes:
+    details = [
+        {
+            "type": "value_error",
+            "loc": ["body", "users", i, "weight"],
+            "msg": "Value error, Weight must be at least 20 kg for safety",
+            "input": 12.5,
+            "ctx": {"error": {}},
+            "url": "https://errors.pydantic.dev/2.5/v/value_error"
+        }
+        for i in range(errors)
+    ]
+    error = ErrorResponse(error="Input validation failed", status_code=sc.UNPROCESSABLE_ENTITY, details=details)
+    return JSONResponse(content=error.model_dump(exclude_none=True)).body
+
+
+def permissions() -> bytes:
+    data = AccessPermissions(firstName="Demo", email="demo11@email.com", roles=["admin"], permissions=["create", "read"])
+    return JSONResponse(content=SuccessResponse(data=data, status_code=sc.SUCCESS).model_dump(exclude_none=True)).body
+
+
+def measure(body: bytes, encoding: str, level: int, duration: float):
+    compressed = b""
+    iterations = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, WBITS[encoding])
+        compressed = compressor.compress(body) + compressor.flush()
+        iterations += 1
+    elapsed = (time.perf_counter() - started) / iterations
+    return len(compressed), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=float, default=0.5, help="seconds spent measuring each combination")
+    parser.add_argument("--link-mbps", type=float, default=20.0, help="client bandwidth used to estimate transfer time")
+    args = parser.parse_args()
+
+    payloads = {
+        "permissions": permissions(),
+        "directory_50": user_directory_page(50),
+        "directory_500": user_directory_page(500),
+        "validation_20": validation_error(20),
+        "validation_500": validation_error(500),
+    }
+    bytes_per_second = args.link_mbps * 1_000_000 / 8
+
+    print(f"{'payload':<16}{'coding':<9}{'level':>5}{'raw B':>10}{'out B':>10}{'ratio':>7}{'cpu us':>9}{'MB/s':>8}{'net saved us':>14}")
+    for name, body in payloads.items():
+        for encoding in ("gzip", "deflate"):
+            for level in (1, 6, 9):
+                size, seconds = measure(body, encoding, level, args.duration)
+                saved = (len(body) - size) / bytes_per_second
+                print(f"{name:<16}{encoding:<9}{level:>5}{len(body):>10}{size:>10}{len(body) / size:>7.1f}"
+                      f"{seconds * 1e6:>9.0f}{len(body) / seconds / 1e6:>8.1f}{saved * 1e6:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Throughput of the error path: exception handlers of app.py against the previous handler,
+which logged every error with its stack trace and serialized every body.
+Needs the same environment (.env) as the app; log records go to a temporary file.
+
+$ python -m benchmarks.error_path_benchmark
+"""
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from app import business_exception_handler, generic_exception_handler
+from business_exception import BusinessException
+from models.api_responses import ErrorResponse
+from models.status_code import sc
+from utils.logger import logger, formatter
+
+
+async def legacy_business_exception_handler(request: Request, exc: BusinessException):
+    logger.error(f"Business violation exception in {request.method} {request.url.path}", exc_info=True)
+    error_response = ErrorResponse(error=str(exc), status_code=exc.error_code)
+    return JSONResponse(status_code=error_response.status_code, content=error_response.model_dump(exclude_none=True))
+
+
+async def legacy_generic_exception_handler(request: Request, exc: Exception):
+    logger.error(f"Unhandled exception in {request.method} {request.url.path}", exc_info=True)
+    error_response = ErrorResponse(error=str(exc), status_code=sc.INTERNAL_SERVER_ERROR)
+    return JSONResponse(status_code=error_response.status_code, content=error_response.model_dump(exclude_none=True))
+
+
+def make_request(path: str) -> Request:
+    return Request({"type": "http", "method": "POST", "path": path, "headers": [], "query_string": b""})
+
+
+def raise_and_catch(exc: Exception) -> Exception:
+    # Exceptions reaching the handlers carry a traceback, make the stack realistic
+    def repository():
+        raise exc
+
+    def service():
+        repository()
+
+    try:
+        service()
+    except Exception as caught:
+        return caught
+
+
+async def measure(handler, request: Request, exc: Exception, duration: float) -> float:
+    iterations = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        await handler(request, exc)
+        iterations += 1
+    return iterations / (time.perf_counter() - started)
+
+
+async def run(duration: float):
+    scenarios = [
+        ("401 invalid credentials", "/api/v1/auth/signin",
+         BusinessException(message="Invalid credentials", error_code=sc.UNAUTHORIZED)),
+        ("404 user not found", "/api/v1/auth/assign-roles",
+         BusinessException(message="User with email 'nobody@example.com' not found", error_code=sc.ENTITY_NOT_FOUND)),
+        ("500 unexpected", "/api/v1/user", ValueError("Something unexpected happened for weight 200")),
+    ]
+
+    print(f"{'scenario':<26}{'legacy req/s':>14}{'current req/s':>15}{'speedup':>9}")
+    for name, path, exc in scenarios:
+        exc = raise_and_catch(exc)
+        request = make_request(path)
+        if isinstance(exc, BusinessException):
+            legacy_handler, current_handler = legacy_business_exception_handler, business_exception_handler
+        else:
+            legacy_handler, current_handler = legacy_generic_exception_handler, generic_exception_handler
+        legacy = await measure(legacy_handler, request, exc, duration)
+        current = await measure(current_handler, request, exc, duration)
+        print(f"{name:<26}{legacy:>14.0f}{current:>15.0f}{current / legacy:>8.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Error path throughput")
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds spent measuring each handler")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as log_directory:
+        handler = logging.FileHandler(f"{log_directory}/benchmark.log", encoding='utf-8')
+        handler.setFormatter(formatter)
+        original_handlers = logger.handlers[:]
+        logger.handlers = [handler]
+        try:
+            asyncio.run(run(args.duration))
+        finally:
+            logger.handlers = original_handlers
+            handler.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,11 @@ async def create_user(request: UserRequest):
   result = await user_service.create_user(request)
   return to_json_response(result)
 
+@dummy_router.get("/{email}")
+async def get_user(email: str):
+  result = await user_service.get_user(email)
+  return to_json_response(result)
+
 @dummy_router.delete("/{email}")
 async def delete_user(email: str):
   result = await user_service.delete_user(email)
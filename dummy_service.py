@@ -1,14 +1,37 @@
-from models.dummy_models import User,UserRequest
+from typing import Optional
+from models.dummy_models import User,UserRequest,UserProfile
 from models.api_responses import SuccessResponse,ErrorResponse
 from models.status_code import sc
 from business_exception import BusinessException
 from utils.mongo_db_manager import mongodb_manager
+from utils.mongo_insert_batcher import MongoInsertBatcher
+from utils.cache_factory import create_cache
+from utils.config import settings
+from utils.tracing import traced
 from mongo_collection_names import CollectionNames
 from pymongo.errors import DuplicateKeyError
 
 
 class UserService:
-  
+
+  def __init__(self):
+    self.insert_batcher = None
+    if settings.USER_PROFILE_WRITE_BATCHING:
+      self.insert_batcher = MongoInsertBatcher(
+        collection_name=CollectionNames.USER_PROFILE,
+        max_delay_ms=settings.WRITE_BATCH_MAX_DELAY_MS,
+        max_batch_size=settings.WRITE_BATCH_MAX_SIZE
+      )
+    # email -> UserProfile, or None for an email without profile
+    self.profile_cache = create_cache(
+      name="user_profile",
+      max_entries=settings.USER_PROFILE_CACHE_MAX_ENTRIES,
+      ttl_seconds=settings.USER_PROFILE_CACHE_TTL_SECONDS,
+      negative_ttl_seconds=settings.USER_PROFILE_CACHE_NEGATIVE_TTL_SECONDS,
+      value_type=UserProfile
+    )
+
+  @traced("service")
   async def create_user(self,request: UserRequest) -> SuccessResponse[User]:
 
     try:
@@ -20,11 +43,18 @@ class UserService:
       elif request.weight == 200: #simulate unexpected exception
         raise ValueError("Something unexpected happened for weight 200")
 
-      user_profile_collection = mongodb_manager.get_collection(CollectionNames.USER_PROFILE)
-      result = await user_profile_collection.insert_one(request.model_dump(exclude_none=True))
+      document = request.model_dump(exclude_none=True)
+      if self.insert_batcher:
+        inserted_id = await self.insert_batcher.insert(document)
+      else:
+        user_profile_collection = mongodb_manager.get_collection(CollectionNames.USER_PROFILE)
+        result = await user_profile_collection.insert_one(document)
+        inserted_id = result.inserted_id
+      # Drops a cached "no such profile"
+      self.profile_cache.invalidate(request.email)
 
       return SuccessResponse[User](
-              data=User(id=str(result.inserted_id),name=request.name,email=request.email),
+              data=User(id=str(inserted_id),name=request.name,email=request.email),
               message="User creation successful",
               status_code=sc.ENTITY_CREATION_SUCCESSFUL
       )
@@ -35,10 +65,12 @@ class UserService:
         error_code=sc.VALIDATION_ERROR
       )
 
+  @traced("service")
   async def delete_user(self,email: str) -> SuccessResponse[None]:
 
     user_profile_collection = mongodb_manager.get_collection(CollectionNames.USER_PROFILE)
     result = await user_profile_collection.delete_one({"email": email})
+    self.profile_cache.invalidate(email)
 
     if result.deleted_count == 0:
       raise BusinessException(
@@ -53,5 +85,31 @@ class UserService:
       )
 
 
+  @traced("service")
+  async def get_user(self, email: str) -> SuccessResponse[UserProfile]:
+
+    profile = await self.profile_cache.get_or_load(email, lambda: self._load_profile(email))
+    if profile is None:
+      raise BusinessException(
+        message=f"User {email} not found",
+        error_code=sc.ENTITY_NOT_FOUND
+      )
+    return SuccessResponse[UserProfile](data=profile, status_code=sc.SUCCESS)
+
+  async def _load_profile(self, email: str) -> Optional[UserProfile]:
+
+    user_profile_collection = mongodb_manager.get_collection(CollectionNames.USER_PROFILE)
+    document = await user_profile_collection.find_one({"email": email})
+    if document is None:
+      return None
+    return UserProfile(
+      id=str(document["_id"]),
+      name=document["name"],
+      email=document["email"],
+      weight=document["weight"],
+      goal_weight=document["goal_weight"]
+    )
+
+
 #Global instance
 user_service = UserService()
\ No newline at end of file
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends
+from auth.auth_middleware import auth_middleware
+from auth.auth_models import AuthenticatedUser
+from business_exception import BusinessException
+from models.api_responses import SuccessResponse
+from models.job_models import JobStatus
+from models.status_code import sc
+from utils.commons import to_json_response
+from utils.job_runner import job_runner
+
+job_router = APIRouter(prefix="/api/v1/jobs", tags=["jobs"])
+
+@job_router.get("/{job_id}")
+async def get_job_status(job_id: str, current_user: AuthenticatedUser = Depends(auth_middleware.get_current_user)):
+  """Status, progress and result of a background job (submitter or admin only)"""
+  job = await job_runner.get_job(job_id)
+  if job is None or (job.submittedBy != current_user.email and "admin" not in current_user.roles):
+    raise BusinessException(
+      message=f"Job {job_id} not found",
+      error_code=sc.ENTITY_NOT_FOUND
+    )
+  return to_json_response(SuccessResponse[JobStatus](data=job, status_code=sc.SUCCESS))
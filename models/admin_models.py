@@ -0,0 +1,20 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+class QueryStatsEntry(BaseModel):
+  source: str = Field(..., description="postgresql or mongodb")
+  fingerprint: str = Field(..., description="normalized SQL text, or collection, operation and query shape")
+  count: int
+  errors: int = Field(..., description="executions that raised, timeouts included")
+  totalMs: float
+  meanMs: float
+  p50Ms: float = Field(..., description="approximate, within 25%")
+  p99Ms: float = Field(..., description="approximate, within 25%")
+  maxMs: float
+
+class AllocationGrowth(BaseModel):
+  site: List[str] = Field(..., description="file:line of the allocation, innermost frame first")
+  sizeKb: float = Field(..., description="allocated by the site now")
+  sizeDiffKb: float = Field(..., description="growth since the baseline snapshot")
+  count: int
+  countDiff: int
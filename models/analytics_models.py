@@ -0,0 +1,35 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+class WeightSummary(BaseModel):
+  users: int = Field(..., description="profiles with a weight and a goal weight")
+  averageWeight: Optional[float] = None
+  minWeight: Optional[float] = None
+  maxWeight: Optional[float] = None
+  weightStdDev: Optional[float] = None
+  averageGoalWeight: Optional[float] = None
+  averageGoalGapKg: Optional[float] = Field(None, description="average of weight - goal weight")
+  computedOn: str = Field(..., description="when the figures were computed, they are cached for a while")
+
+class HistogramBucket(BaseModel):
+  lowerKg: float = Field(..., description="inclusive")
+  upperKg: float = Field(..., description="exclusive")
+  count: int
+
+class WeightDistribution(BaseModel):
+  users: int
+  # metric (weight, goalWeight, goalGap) -> percentile (p50...) -> kg
+  percentiles: Dict[str, Dict[str, float]]
+  weightHistogram: List[HistogramBucket]
+  computedOn: str
+
+class GoalGapCohort(BaseModel):
+  minGapPercent: float = Field(..., description="inclusive, weight to lose as a percentage of the current weight")
+  maxGapPercent: float = Field(..., description="exclusive")
+  users: int
+  averageWeight: float
+  averageGoalGapKg: float
+
+class GoalGapCohorts(BaseModel):
+  cohorts: List[GoalGapCohort]
+  computedOn: str
@@ -0,0 +1,16 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+
+class AuditEvent(BaseModel):
+  id: str
+  occurredOn: str
+  action: str = Field(..., description="what was done, e.g. assign_roles")
+  actor: str = Field(..., description="email of the admin who did it")
+  target: str = Field(..., description="what it was done to, e.g. the email of a user")
+  before: Dict[str, Any] = Field({}, description="values overwritten by the change")
+  after: Dict[str, Any] = Field({}, description="values set by the change")
+  requestId: Optional[str] = None
+
+class AuditPage(BaseModel):
+  events: List[AuditEvent] = []
+  nextCursor: Optional[str] = None
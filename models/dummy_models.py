@@ -6,6 +6,13 @@ class User(BaseModel):
   name: str = Field(...,description="full name")
   email: str = Field(...,description="email")
 
+class UserProfile(BaseModel):
+  id: str = Field(...,description="unique user id")
+  name: str = Field(...,description="full name")
+  email: str = Field(...,description="email")
+  weight: float = Field(..., description="Current weight in kg")
+  goal_weight: float = Field(..., description="Target weight in kg")
+
 class UserRequest(BaseModel):
   name: str = Field(...,description="full name")
   email: str = Field(...,description="email")
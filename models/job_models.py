@@ -0,0 +1,19 @@
+from pydantic import BaseModel, Field
+from typing import Optional, Any
+
+class JobStatus(BaseModel):
+  id: str = Field(..., description="job id")
+  type: str = Field(..., description="kind of work the job does")
+  status: str = Field(..., description="queued, running, succeeded, failed or cancelled")
+  progress: float = Field(0, description="percentage of work done (0-100)")
+  message: Optional[str] = Field(None, description="latest progress message")
+  result: Optional[Any] = Field(None, description="result of a succeeded job")
+  error: Optional[str] = Field(None, description="reason a job failed")
+  submittedBy: str = Field(..., description="email of the user who submitted the job")
+  submittedOn: str
+  startedOn: Optional[str] = None
+  finishedOn: Optional[str] = None
+
+class JobSubmission(BaseModel):
+  jobId: str = Field(..., description="job id")
+  statusUrl: str = Field(..., description="where to poll the job status")
@@ -1,3 +1,26 @@
-from typing import Final
+from typing import Final, Dict, List
+from pymongo import IndexModel, ASCENDING, DESCENDING
+
 class CollectionNames:
-    USER_PROFILE: Final[str] = "user_profile"
\ No newline at end of file
+    USER_PROFILE: Final[str] = "user_profile"
+    JOB: Final[str] = "job"
+    AUDIT_EVENT: Final[str] = "audit_event"
+
+    # Declarative index definitions per collection, reconciled with the database on startup.
+    # Indexes are matched on key pattern and options. To change an index, declare it under
+    # a new name (e.g. with a _v2 suffix); the old one is then reported as drift until dropped.
+    INDEXES: Final[Dict[str, List[IndexModel]]] = {
+        USER_PROFILE: [
+            IndexModel([("email", ASCENDING)], name="email_1", unique=True),
+        ],
+        JOB: [
+            # finished jobs are kept for a week
+            IndexModel([("finished_on", ASCENDING)], name="finished_on_ttl_v1", expireAfterSeconds=7 * 24 * 3600),
+        ],
+        AUDIT_EVENT: [
+            # pages of the audit trail, newest first, optionally of one target or actor
+            IndexModel([("occurred_on", DESCENDING), ("_id", DESCENDING)], name="occurred_on_-1__id_-1"),
+            IndexModel([("target", ASCENDING), ("occurred_on", DESCENDING), ("_id", DESCENDING)], name="target_1_occurred_on_-1__id_-1"),
+            IndexModel([("actor", ASCENDING), ("occurred_on", DESCENDING), ("_id", DESCENDING)], name="actor_1_occurred_on_-1__id_-1"),
+        ],
+    }
@@ -0,0 +1,191 @@
+import argparse
+import asyncio
+import sys
+from typing import Final, List
+from utils.postgre_migration_runner import Migration, MigrationRunner
+from utils.postgre_db_manager import postgre_manager
+
+# Versioned Postgre schema. Never edit an applied migration, append a new one instead.
+MIGRATIONS: Final[List[Migration]] = [
+    Migration(
+        version=1,
+        description="create app_user",
+        statements=[
+            """
+            CREATE TABLE IF NOT EXISTS app_user(
+                user_id BIGSERIAL NOT NULL,
+                first_name VARCHAR(201) NOT NULL,
+                last_name VARCHAR(201) NOT NULL,
+                email_id VARCHAR(201) NOT NULL,
+                password VARCHAR(1000) NOT NULL,
+                roles VARCHAR(500) DEFAULT ' ',
+                permissions VARCHAR(500) DEFAULT ' ',
+                social_login_ids VARCHAR(1000) DEFAULT ' ',
+                created_by VARCHAR(100),
+                created_on TIMESTAMP,
+                last_updated_by VARCHAR(100),
+                last_updated_on TIMESTAMP,
+                PRIMARY KEY (user_id),
+                CONSTRAINT app_user_emailid_uk UNIQUE (email_id)
+            )
+            """,
+            "COMMENT ON TABLE app_user IS 'maintains user accounts'",
+            "COMMENT ON COLUMN app_user.user_id IS 'Running sequence number'",
+            "COMMENT ON COLUMN app_user.email_id IS 'User email address - must be unique'",
+            "COMMENT ON COLUMN app_user.social_login_ids IS 'comma separated unique social ids. Used to map social id to app user id'",
+            "COMMENT ON COLUMN app_user.roles IS 'User roles (e.g., admin, user, moderator)'",
+            "COMMENT ON COLUMN app_user.permissions IS 'User permissions (e.g, create,read,update,delete)'",
+        ]
+    ),
+    Migration(
+        version=2,
+        description="index app_user lookups by email_id and last_updated_on",
+        statements=[
+            # no-op where the table was created with the app_user_emailid_uk constraint
+            "CREATE UNIQUE INDEX IF NOT EXISTS app_user_emailid_uk ON app_user (email_id)",
+            # delta refresh of the user snapshot cache
+            "CREATE INDEX IF NOT EXISTS app_user_last_updated_on_idx ON app_user (last_updated_on)",
+        ]
+    ),
+    Migration(
+        version=3,
+        description="add array columns for app_user roles and permissions",
+        statements=[
+            # constant defaults don't rewrite the table
+            "ALTER TABLE app_user ADD COLUMN IF NOT EXISTS role_list TEXT[] NOT NULL DEFAULT '{}'",
+            "ALTER TABLE app_user ADD COLUMN IF NOT EXISTS permission_list TEXT[] NOT NULL DEFAULT '{}'",
+            "COMMENT ON COLUMN app_user.role_list IS 'User roles, authoritative over the comma separated roles column'",
+            "COMMENT ON COLUMN app_user.permission_list IS 'User permissions, authoritative over the comma separated permissions column'",
+            """
+            CREATE OR REPLACE FUNCTION app_user_split_csv(value TEXT) RETURNS TEXT[] AS $$
+                SELECT COALESCE(ARRAY(
+                    SELECT btrim(item) FROM unnest(string_to_array(value, ',')) AS item WHERE btrim(item) <> ''
+                ), '{}')
+            $$ LANGUAGE SQL IMMUTABLE
+            """,
+            # keeps the arrays in sync when a writer only knows about the comma separated columns
+            """
+            CREATE OR REPLACE FUNCTION app_user_sync_grant_lists() RETURNS TRIGGER AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    IF NEW.role_list = '{}' THEN NEW.role_list := app_user_split_csv(NEW.roles); END IF;
+                    IF NEW.permission_list = '{}' THEN NEW.permission_list := app_user_split_csv(NEW.permissions); END IF;
+                ELSE
+                    IF NEW.roles IS DISTINCT FROM OLD.roles AND NEW.role_list = OLD.role_list THEN
+                        NEW.role_list := app_user_split_csv(NEW.roles);
+                    END IF;
+                    IF NEW.permissions IS DISTINCT FROM OLD.permissions AND NEW.permission_list = OLD.permission_list THEN
+                        NEW.permission_list := app_user_split_csv(NEW.permissions);
+                    END IF;
+                END IF;
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+            """,
+            "DROP TRIGGER IF EXISTS app_user_sync_grant_lists_trg ON app_user",
+            """
+            CREATE TRIGGER app_user_sync_grant_lists_trg
+            BEFORE INSERT OR UPDATE ON app_user
+            FOR EACH ROW EXECUTE FUNCTION app_user_sync_grant_lists()
+            """,
+        ]
+    ),
+    Migration(
+        version=4,
+        description="backfill app_user role_list and permission_list",
+        transactional=False,
+        statements=[
+            # batches of 1000 rows, each committed on its own so that rows are never locked for long
+            """
+            DO $$
+            DECLARE
+                last_id BIGINT := 0;
+                batch_last_id BIGINT;
+            BEGIN
+                LOOP
+                    SELECT MAX(user_id) INTO batch_last_id FROM (
+                        SELECT user_id FROM app_user WHERE user_id > last_id ORDER BY user_id LIMIT 1000
+                    ) AS batch;
+                    EXIT WHEN batch_last_id IS NULL;
+
+                    UPDATE app_user
+                    SET role_list = app_user_split_csv(roles), permission_list = app_user_split_csv(permissions)
+                    WHERE user_id > last_id AND user_id <= batch_last_id;
+
+                    last_id := batch_last_id;
+                    COMMIT;
+                END LOOP;
+            END
+            $$
+            """,
+        ]
+    ),
+    Migration(
+        version=5,
+        description="index app_user role_list and permission_list",
+        transactional=False,
+        statements=[
+            "DROP INDEX CONCURRENTLY IF EXISTS app_user_role_list_idx",
+            "CREATE INDEX CONCURRENTLY app_user_role_list_idx ON app_user USING GIN (role_list)",
+            "DROP INDEX CONCURRENTLY IF EXISTS app_user_permission_list_idx",
+            "CREATE INDEX CONCURRENTLY app_user_permission_list_idx ON app_user USING GIN (permission_list)",
+        ]
+    ),
+    Migration(
+        version=6,
+        description="make app_user.last_updated_on always set",
+        statements=[
+            # keyset pagination of the user directory can't page over NULLs
+            "UPDATE app_user SET last_updated_on = COALESCE(created_on, NOW()) WHERE last_updated_on IS NULL",
+            "ALTER TABLE app_user ALTER COLUMN last_updated_on SET DEFAULT NOW()",
+        ]
+    ),
+    Migration(
+        version=7,
+        description="index app_user for the user directory",
+        transactional=False,
+        statements=[
+            # keyset pagination on (last_updated_on, email_id), also serves the snapshot delta refresh
+            "DROP INDEX CONCURRENTLY IF EXISTS app_user_last_updated_on_email_idx",
+            "CREATE INDEX CONCURRENTLY app_user_last_updated_on_email_idx ON app_user (last_updated_on, email_id)",
+            "DROP INDEX CONCURRENTLY IF EXISTS app_user_last_updated_on_idx",
+            # prefix search on email and name
+            "DROP INDEX CONCURRENTLY IF EXISTS app_user_email_prefix_idx",
+            "CREATE INDEX CONCURRENTLY app_user_email_prefix_idx ON app_user (lower(email_id) text_pattern_ops)",
+            "DROP INDEX CONCURRENTLY IF EXISTS app_user_first_name_prefix_idx",
+            "CREATE INDEX CONCURRENTLY app_user_first_name_prefix_idx ON app_user (lower(first_name) text_pattern_ops)",
+            "DROP INDEX CONCURRENTLY IF EXISTS app_user_last_name_prefix_idx",
+            "CREATE INDEX CONCURRENTLY app_user_last_name_prefix_idx ON app_user (lower(last_name) text_pattern_ops)",
+        ]
+    ),
+]
+
+
+async def _main(check: bool) -> int:
+    # Importing the modules that run the hot queries registers them with postgre_manager
+    import auth.auth_repository  # noqa: F401
+    import auth.user_snapshot_cache  # noqa: F401
+
+    await postgre_manager.connect()
+    try:
+        runner = MigrationRunner(postgre_manager, MIGRATIONS)
+        if check:
+            failures = await runner.check_query_plans()
+            for name, relations in failures.items():
+                print(f"FAILED {name}: sequential scan on {', '.join(relations)}")
+            print(f"{len(postgre_manager.hot_queries) - len(failures)}/{len(postgre_manager.hot_queries)} hot queries use indexes")
+            return 1 if failures else 0
+
+        applied = await runner.migrate()
+        print(f"applied migrations: {applied}" if applied else "schema is up to date")
+        return 0
+    finally:
+        await postgre_manager.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply Postgre migrations")
+    parser.add_argument("--check", action="store_true",
+                        help="EXPLAIN the registered hot queries and fail if any of them uses a sequential scan")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_main(args.check)))
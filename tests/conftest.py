@@ -0,0 +1,24 @@
+import os
+
+# Settings are read when the application modules are imported. The tests never reach the
+# databases, these only have to make the settings valid.
+TEST_SETTINGS = {
+    "APP_PORT": "8000",
+    "DEV_MODE": "false",
+    "MONGO_PORT": "27017",
+    "MONGO_USER": "test",
+    "MONGO_PASSWORD": "test",
+    "MONGODB_DATABASE": "test",
+    "POSTGRE_PORT": "5432",
+    "POSTGRE_USER": "test",
+    "POSTGRE_PASSWORD": "test",
+    "POSTGRE_DATABASE": "test",
+    "JWT_SECRET_KEY": "dGVzdF9zZWNyZXRfa2V5X2Zvcl90ZXN0cw==",
+    "ALLOWED_ROLES": "user,admin",
+    "ALLOWED_PERMISSIONS": "create,read,update,delete",
+    "TRACE_EXPORTER": "none",
+    "JOB_PROCESS_WORKERS": "0",
+}
+
+for name, value in TEST_SETTINGS.items():
+    os.environ.setdefault(name, value)
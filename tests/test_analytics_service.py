@@ -0,0 +1,134 @@
+import numpy as np
+import pytest
+import analytics_service as module
+from analytics_service import AnalyticsService
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = list(documents)
+        self.reads = 0
+
+    def batch_size(self, size):
+        return self
+
+    async def to_list(self, length):
+        self.reads += 1
+        if length is None:
+            length = len(self.documents)
+        chunk, self.documents = self.documents[:length], self.documents[length:]
+        return chunk
+
+
+class FakeProfiles:
+    """Answers aggregations with canned results by first stage after $match, find with the profiles"""
+
+    def __init__(self, profiles=(), grouped=(), bucketed=()):
+        self.profiles = list(profiles)
+        self.results = {"$group": list(grouped), "$bucket": list(bucketed)}
+        self.pipelines = []
+        self.finds = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        stage = next(iter(pipeline[1]))
+        return FakeCursor(self.results[stage])
+
+    def find(self, query, projection):
+        cursor = FakeCursor(self.profiles)
+        self.finds.append(cursor)
+        return cursor
+
+
+@pytest.fixture
+def service_over(monkeypatch):
+    def with_profiles(profiles):
+        monkeypatch.setattr(module.mongodb_manager, "get_collection", lambda name, timeout=None: profiles)
+        monkeypatch.setattr(module.settings, "ANALYTICS_CHUNK_SIZE", 2)
+        return AnalyticsService()
+    return with_profiles
+
+
+@pytest.mark.asyncio
+async def test_summary_figures_are_rounded(service_over):
+    profiles = FakeProfiles(grouped=[{"_id": None, "users": 3, "averageWeight": 81.23456, "minWeight": 60, "weightStdDev": 12.3456}])
+
+    summary = (await service_over(profiles).get_summary()).data
+
+    assert summary.users == 3
+    assert summary.averageWeight == 81.23
+    assert summary.minWeight == 60
+    assert summary.weightStdDev == 12.35
+    assert profiles.pipelines[0][0] == {"$match": module.VALID_PROFILE}
+
+
+@pytest.mark.asyncio
+async def test_summary_without_profiles_has_no_figures(service_over):
+    summary = (await service_over(FakeProfiles()).get_summary()).data
+
+    assert summary.users == 0
+    assert summary.averageWeight is None
+
+
+@pytest.mark.asyncio
+async def test_summary_is_cached(service_over):
+    profiles = FakeProfiles(grouped=[{"_id": None, "users": 3}])
+    service = service_over(profiles)
+
+    first = (await service.get_summary()).data
+
+    assert (await service.get_summary()).data is first
+    assert len(profiles.pipelines) == 1
+
+
+@pytest.mark.asyncio
+async def test_distribution_fills_the_empty_buckets_and_reads_weights_in_chunks(service_over):
+    weights = [(61, 60), (72, 60), (75, 70), (99, 80), (100, 90)]
+    profiles = FakeProfiles(
+        profiles=[{"weight": weight, "goal_weight": goal} for weight, goal in weights],
+        bucketed=[{"_id": 45, "count": 2}, {"_id": 70, "count": 2}, {"_id": 95, "count": 1}]
+    )
+
+    distribution = (await service_over(profiles).get_weight_distribution(25)).data
+
+    boundaries = profiles.pipelines[0][1]["$bucket"]["boundaries"]
+    assert boundaries[0] == module.MIN_WEIGHT_KG and boundaries[-1] >= module.MAX_WEIGHT_KG
+    counts = [bucket.count for bucket in distribution.weightHistogram]
+    assert len(counts) == len(boundaries) - 1
+    assert counts[1] == 2 and counts[2] == 2 and counts[3] == 1 and sum(counts) == 5
+    assert distribution.users == 5
+    assert distribution.percentiles["weight"]["p50"] == 75.0
+    assert distribution.percentiles["goalGap"]["p50"] == 10.0
+    # Two profiles per chunk, and the empty read that ends the cursor
+    assert profiles.finds[0].reads == 4
+
+
+@pytest.mark.asyncio
+async def test_goal_gap_cohorts_cover_every_range(service_over):
+    profiles = FakeProfiles(bucketed=[
+        {"_id": 0, "users": 1, "averageWeight": 100.0, "averageGoalGapKg": 3.0},
+        {"_id": 10, "users": 2, "averageWeight": 90.555, "averageGoalGapKg": 12.345},
+    ])
+
+    cohorts = (await service_over(profiles).get_goal_gap_cohorts()).data.cohorts
+
+    assert [cohort.minGapPercent for cohort in cohorts] == module.GOAL_GAP_COHORT_BOUNDARIES[:-1]
+    assert [cohort.users for cohort in cohorts] == [1, 0, 2, 0, 0, 0, 0]
+    assert cohorts[2].averageWeight == 90.56
+    assert cohorts[2].averageGoalGapKg == 12.35
+    assert cohorts[1].averageWeight == 0.0
+
+
+def test_percentiles_per_metric():
+    weights = np.array([[float(weight), 50.0] for weight in range(60, 161)])
+
+    percentiles = AnalyticsService._percentiles(weights)
+
+    assert set(percentiles) == {"weight", "goalWeight", "goalGap"}
+    assert list(percentiles["weight"]) == [f"p{percent}" for percent in module.PERCENTILES]
+    assert percentiles["weight"]["p90"] == 150.0
+    assert percentiles["goalGap"]["p10"] == 20.0
+
+
+def test_percentiles_of_no_profiles_are_empty():
+    assert AnalyticsService._percentiles(np.empty((0, 2))) == {}
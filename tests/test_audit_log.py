@@ -0,0 +1,172 @@
+import fcntl
+import glob
+import json
+import os
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError
+from business_exception import BusinessException
+from models.status_code import sc
+from utils import audit_log as module
+from utils.audit_log import AuditLog
+
+
+class FakeAuditCollection:
+    """Keeps the events by _id, failing while unavailable and on duplicates like an unordered insert_many"""
+
+    def __init__(self):
+        self.events = {}
+        self.available = True
+        self.batches = []
+
+    async def insert_many(self, events, ordered):
+        if not self.available:
+            raise AutoReconnect("connection refused")
+        self.batches.append(len(events))
+        duplicates = []
+        for index, event in enumerate(events):
+            if event["_id"] in self.events:
+                duplicates.append({"index": index, "code": 11000, "errmsg": "E11000 duplicate key"})
+            else:
+                self.events[event["_id"]] = event
+        if duplicates:
+            raise BulkWriteError({"writeErrors": duplicates})
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = FakeAuditCollection()
+    monkeypatch.setattr(module.mongodb_manager, "get_collection", lambda name: collection)
+    return collection
+
+
+@pytest.fixture
+def spill_file(tmp_path):
+    return str(tmp_path / "spill" / "audit.ndjson")
+
+
+def audit(spill_file, batch_size=2, max_queue=4):
+    return AuditLog("audit_event", flush_interval_ms=10, batch_size=batch_size, max_queue=max_queue, spill_file=spill_file)
+
+
+def record(log, count):
+    for index in range(count):
+        log.record("assign_roles", "admin@t.com", f"u{index}@t.com", {"roles": []}, {"roles": ["user"]})
+
+
+def spill_files(spill_file):
+    return sorted(glob.glob(spill_file.replace(".ndjson", ".*")))
+
+
+@pytest.mark.asyncio
+async def test_queued_events_are_written_in_batches(collection, spill_file):
+    log = audit(spill_file)
+    record(log, 3)
+
+    await log._flush()
+
+    assert collection.batches == [2, 1]
+    assert log.stats()["written"] == 3 and log.stats()["queued"] == 0
+    assert spill_files(spill_file) == []
+
+
+@pytest.mark.asyncio
+async def test_events_are_spilled_while_mongo_is_down_and_written_back_once(collection, spill_file):
+    log = audit(spill_file)
+    collection.available = False
+    record(log, 3)
+
+    await log._flush()
+    assert log.stats()["spilled"] == 3
+    assert os.path.basename(log.spill_file).startswith(f"audit.{os.getpid()}-")
+    assert log.stats()["spill_pending"] is True
+
+    collection.available = True
+    await log._flush()
+
+    assert len(collection.events) == 3
+    assert log.stats()["replayed"] == 3
+    assert log.stats()["spill_pending"] is False
+    assert spill_files(spill_file) == []
+
+
+@pytest.mark.asyncio
+async def test_record_never_spills_and_drops_beyond_the_overflow(collection, spill_file):
+    log = audit(spill_file, max_queue=2)
+
+    record(log, 5)
+
+    assert log.stats()["queued"] == 2 and log.stats()["overflow"] == 2 and log.stats()["dropped"] == 1
+    assert spill_files(spill_file) == []
+
+    await log._flush()
+
+    assert log.stats()["spilled"] == 2
+    assert len(collection.events) == 4
+
+
+@pytest.mark.asyncio
+async def test_spill_file_of_a_stopped_process_is_written_back(collection, spill_file):
+    stopped = audit(spill_file)
+    collection.available = False
+    record(stopped, 2)
+    await stopped.stop()
+    assert len(spill_files(spill_file)) == 1
+
+    collection.available = True
+    await audit(spill_file)._flush()
+
+    assert len(collection.events) == 2
+    assert spill_files(spill_file) == []
+
+
+@pytest.mark.asyncio
+async def test_spill_file_held_by_a_running_process_is_left_alone(collection, spill_file):
+    os.makedirs(os.path.dirname(spill_file))
+    held = spill_file.replace(".ndjson", ".1-abcdef12.ndjson")
+    with open(held, "w") as other_process:
+        other_process.write(json.dumps({"_id": "e1", "occurred_on": "2024-03-01T00:00:00+00:00"}) + "\n")
+        other_process.flush()
+        fcntl.flock(other_process.fileno(), fcntl.LOCK_EX)
+
+        await audit(spill_file)._flush()
+        assert collection.events == {}
+
+    await audit(spill_file)._flush()
+    assert list(collection.events) == ["e1"]
+
+
+@pytest.mark.asyncio
+async def test_replay_skips_the_torn_last_line_and_duplicates(collection, spill_file):
+    os.makedirs(os.path.dirname(spill_file))
+    collection.events["e1"] = {"_id": "e1"}
+    with open(spill_file.replace(".ndjson", ".1-abcdef12.ndjson"), "w") as crashed:
+        for event_id in ("e1", "e2"):
+            crashed.write(json.dumps({"_id": event_id, "occurred_on": "2024-03-01T00:00:00+00:00"}) + "\n")
+        crashed.write('{"_id": "e3", "occ')
+
+    await audit(spill_file)._flush()
+
+    assert sorted(collection.events) == ["e1", "e2"]
+    assert spill_files(spill_file) == []
+
+
+@pytest.mark.asyncio
+async def test_stop_writes_the_queue_and_leaves_no_empty_spill_file(collection, spill_file):
+    log = audit(spill_file)
+    await log.start()
+    record(log, 3)
+
+    await log.stop()
+
+    assert len(collection.events) == 3
+    assert spill_files(spill_file) == []
+
+
+def test_cursor_round_trip_and_invalid_cursor():
+    cursor = AuditLog._encode_cursor("2024-03-01T00:00:00+00:00", "e1")
+
+    occurred_on, event_id = AuditLog._decode_cursor(cursor)
+    assert (occurred_on.isoformat(), event_id) == ("2024-03-01T00:00:00+00:00", "e1")
+    with pytest.raises(BusinessException) as raised:
+        AuditLog._decode_cursor("not a cursor")
+    assert raised.value.error_code == sc.VALIDATION_ERROR
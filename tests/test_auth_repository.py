@@ -0,0 +1,153 @@
+import asyncio
+from datetime import datetime
+import bcrypt
+import pytest
+from auth import auth_repository
+from business_exception import BusinessException
+from models.status_code import sc
+
+
+class FakePostgre:
+    """Answers the queries of auth_repository with canned records, keeping the values it was given"""
+
+    def __init__(self, monkeypatch):
+        self.calls = []
+        self.one = None
+        self.all = []
+        monkeypatch.setattr(auth_repository.postgre_manager, "fetch_one", self.fetch_one)
+        monkeypatch.setattr(auth_repository.postgre_manager, "fetch_all", self.fetch_all)
+        monkeypatch.setattr(auth_repository.postgre_manager, "execute", self.execute)
+
+    async def fetch_one(self, query, values=None, timeout=None):
+        self.calls.append((query, values))
+        return self.one
+
+    async def fetch_all(self, query, values=None, timeout=None):
+        self.calls.append((query, values))
+        return self.all
+
+    async def execute(self, query, values=None, timeout=None):
+        self.calls.append((query, values))
+
+
+@pytest.fixture
+def postgre(monkeypatch):
+    return FakePostgre(monkeypatch)
+
+
+def user_record(email, roles=(), permissions=()):
+    return {
+        "first_name": "F", "last_name": "L", "email_id": email,
+        "role_list": list(roles), "permission_list": list(permissions)
+    }
+
+
+@pytest.mark.asyncio
+async def test_assign_roles_writes_the_array_and_the_legacy_column(postgre):
+    postgre.one = {"previous_list": ["user"], "previous_updated_by": "Ad", "previous_updated_on": datetime(2024, 1, 1)}
+
+    previous = await auth_repository.assign_roles("a@t.com", ["admin", "user"], "Ad")
+
+    query, values = postgre.calls[0]
+    assert query == auth_repository.UPDATE_ROLES_QUERY
+    assert values == {"roles": "admin,user", "roleList": ["admin", "user"], "updatedBy": "Ad", "email": "a@t.com"}
+    assert previous == {"roles": ["user"], "lastUpdatedBy": "Ad", "lastUpdatedOn": "2024-01-01T00:00:00"}
+
+
+@pytest.mark.asyncio
+async def test_assign_permissions_of_unknown_user_is_not_found(postgre):
+    with pytest.raises(BusinessException) as raised:
+        await auth_repository.assign_permissions("nobody@t.com", ["read"], "Ad")
+
+    assert raised.value.error_code == sc.ENTITY_NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_clearing_permissions_writes_empty_values(postgre):
+    postgre.one = {"previous_list": ["read"], "previous_updated_by": None, "previous_updated_on": None}
+
+    previous = await auth_repository.assign_permissions("a@t.com", [], "Ad")
+
+    assert postgre.calls[0][1]["permissions"] == ""
+    assert postgre.calls[0][1]["permissionList"] == []
+    assert previous == {"permissions": ["read"], "lastUpdatedBy": None, "lastUpdatedOn": None}
+
+
+@pytest.mark.asyncio
+async def test_users_with_role_match_the_array(postgre):
+    postgre.all = [user_record("a@t.com", roles=["admin"])]
+
+    users = await auth_repository.get_users_with_role("admin", "", 10)
+
+    assert postgre.calls[0] == (auth_repository.USERS_WITH_ROLE_QUERY, {"roles": ["admin"], "after": "", "limit": 10})
+    assert [user.email for user in users] == ["a@t.com"]
+    assert users[0].roles == ["admin"]
+
+
+def test_user_directory_query_has_only_the_conditions_in_use():
+    plain = auth_repository._user_directory_query(search=False, roles=False, after=False)
+    everything = auth_repository._user_directory_query(search=True, roles=True, after=True)
+
+    assert "WHERE" not in plain
+    assert everything.count(" AND ") == 2
+    assert ":prefix" in everything and ":roles" in everything and ":afterEmail" in everything
+
+
+@pytest.mark.asyncio
+async def test_user_directory_prefix_is_escaped_for_like(postgre):
+    await auth_repository.get_user_directory_page("A_b%c", [], None, 10)
+
+    assert postgre.calls[0][1] == {"limit": 10, "prefix": "a\\_b\\%c%"}
+
+
+@pytest.mark.asyncio
+async def test_user_directory_pages_after_the_cursor_key(postgre):
+    updated_on = datetime(2024, 3, 1, 12, 0)
+    postgre.all = [{**user_record("b@t.com"), "last_updated_on": updated_on}]
+
+    page = await auth_repository.get_user_directory_page(None, ["admin"], (updated_on, "c@t.com"), 10)
+
+    assert postgre.calls[0][1] == {"limit": 10, "roles": ["admin"], "afterUpdatedOn": updated_on, "afterEmail": "c@t.com"}
+    assert page[0].lastUpdatedOn == updated_on.isoformat()
+
+
+@pytest.mark.asyncio
+async def test_grant_changes_forget_the_app_user_load_in_flight(postgre, monkeypatch):
+    forgotten = []
+    monkeypatch.setattr(auth_repository._app_user_flight, "forget", forgotten.append)
+    monkeypatch.setattr(auth_repository.user_snapshot_cache, "invalidate", forgotten.append)
+    postgre.one = {"previous_list": [], "previous_updated_by": None, "previous_updated_on": None}
+
+    await auth_repository.assign_roles("a@t.com", ["admin"], "Ad")
+    await auth_repository.assign_permissions("b@t.com", ["read"], "Ad")
+
+    assert forgotten == ["a@t.com", "a@t.com", "b@t.com", "b@t.com"]
+
+
+@pytest.mark.parametrize("password_in_db, expected", [
+    ("$2b$04$abcdefghijklmnopqrstuv", False),
+    ("$2b$12$abcdefghijklmnopqrstuv", True),
+    ("$2b$xx$abcdefghijklmnopqrstuv", True),
+    ("plain", True),
+])
+def test_needs_rehash_compares_the_cost_with_the_setting(password_in_db, expected, monkeypatch):
+    monkeypatch.setattr(auth_repository.settings, "BCRYPT_ROUNDS", 4)
+
+    assert auth_repository.needs_rehash(password_in_db) is expected
+
+
+@pytest.mark.asyncio
+async def test_rehash_runs_once_per_user_at_a_time(postgre, monkeypatch):
+    monkeypatch.setattr(auth_repository.settings, "BCRYPT_ROUNDS", 4)
+    old_hash = bcrypt.hashpw(b"secret", bcrypt.gensalt(rounds=5)).decode()
+
+    auth_repository.schedule_rehash("a@t.com", "secret", old_hash)
+    auth_repository.schedule_rehash("a@t.com", "secret", old_hash)
+    await asyncio.gather(*auth_repository._rehash_tasks.values())
+
+    assert len(postgre.calls) == 1
+    query, values = postgre.calls[0]
+    assert query == auth_repository.REHASH_PASSWORD_QUERY
+    assert values["oldPassword"] == old_hash
+    assert not auth_repository.needs_rehash(values["password"])
+    assert auth_repository.verify_password("secret", values["password"])
@@ -0,0 +1,116 @@
+import hashlib
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from auth import auth_service as module
+from auth.auth_models import UserDirectoryEntry, UserSnapshot
+from auth.auth_service import auth_service
+from business_exception import BusinessException
+from models.status_code import sc
+from utils.ttl_cache import TTLCache
+
+
+def entry(email, updated_on):
+    return UserDirectoryEntry(firstName="F", lastName="L", email=email, roles=[], permissions=[], lastUpdatedOn=updated_on)
+
+
+def test_directory_cursor_round_trip():
+    cursor = auth_service._encode_directory_cursor("2024-03-01T12:00:00", "a@t.com")
+
+    assert auth_service._decode_directory_cursor(cursor) == (datetime(2024, 3, 1, 12, 0), "a@t.com")
+
+
+def test_invalid_directory_cursor_is_a_validation_error():
+    with pytest.raises(BusinessException) as raised:
+        auth_service._decode_directory_cursor("not a cursor")
+
+    assert raised.value.error_code == sc.VALIDATION_ERROR
+
+
+@pytest.mark.asyncio
+async def test_directory_reads_one_extra_row_to_tell_there_is_a_next_page(monkeypatch):
+    requested = []
+
+    async def page(search, roles, after, limit):
+        requested.append(limit)
+        return [entry(f"u{i}@t.com", f"2024-03-0{9 - i}T00:00:00") for i in range(min(limit, 3))]
+    monkeypatch.setattr(module, "get_user_directory_page", page)
+
+    full = (await auth_service.get_user_directory(None, [], None, 2)).data
+    last = (await auth_service.get_user_directory(None, [], None, 3)).data
+
+    assert requested == [3, 4]
+    assert [user.email for user in full.users] == ["u0@t.com", "u1@t.com"]
+    assert auth_service._decode_directory_cursor(full.nextCursor) == (datetime(2024, 3, 8), "u1@t.com")
+    assert last.nextCursor is None
+
+
+class FakeSnapshots:
+    def __init__(self, *snapshots):
+        self.snapshots = {snapshot.email: snapshot for snapshot in snapshots}
+        self.requested = []
+
+    async def get(self, email):
+        self.requested.append(email)
+        return self.snapshots.get(email)
+
+
+@pytest.fixture
+def verified_tokens(monkeypatch):
+    cache = TTLCache("test_verified_token", max_entries=100, ttl_seconds=60, negative_ttl_seconds=60)
+    monkeypatch.setattr(auth_service, "verified_tokens", cache)
+    return cache
+
+
+def token_for(email, roles=("user",)):
+    return auth_service.jwt_util.generate_token(email, "F", list(roles), [])
+
+
+def test_verified_token_is_cached_by_digest(verified_tokens, monkeypatch):
+    token = token_for("a@t.com")
+    decodes = []
+    decode = auth_service.jwt_util.decode_claims
+    monkeypatch.setattr(auth_service.jwt_util, "decode_claims", lambda raw: decodes.append(raw) or decode(raw))
+
+    assert auth_service._verify_token(token)["sub"] == "a@t.com"
+    assert auth_service._verify_token(token)["sub"] == "a@t.com"
+    assert auth_service._verify_token("not a token") is None
+    assert auth_service._verify_token("not a token") is None
+
+    assert decodes == [token, "not a token"]
+    assert verified_tokens.get(hashlib.sha256(token.encode()).hexdigest())["sub"] == "a@t.com"
+    assert verified_tokens.get(token) is module.MISSING
+
+
+def test_cached_claims_are_not_served_past_the_expiry(verified_tokens, monkeypatch):
+    token = token_for("a@t.com")
+    claims = auth_service._verify_token(token)
+
+    monkeypatch.setattr(module, "time", SimpleNamespace(time=lambda: claims["exp"]))
+
+    assert auth_service._verify_token(token) is None
+
+
+@pytest.mark.asyncio
+async def test_introspection_answers_in_request_order_with_the_current_grants(verified_tokens, monkeypatch):
+    snapshots = FakeSnapshots(UserSnapshot(firstName="Ann", email="a@t.com", roles=["admin"], permissions=["read"]))
+    monkeypatch.setattr(module, "user_snapshot_cache", snapshots)
+    known, unknown = token_for("a@t.com", roles=["user"]), token_for("gone@t.com")
+
+    result = (await auth_service.introspect_tokens([known, "invalid", unknown, known])).data
+
+    assert [introspection.active for introspection in result] == [True, False, False, True]
+    assert result[0].roles == ["admin"] and result[0].permissions == ["read"]
+    assert result[0].expiresAt == auth_service._verify_token(known)["exp"]
+    assert result[1].email is None
+    assert sorted(snapshots.requested) == ["a@t.com", "gone@t.com"]
+
+
+@pytest.mark.asyncio
+async def test_introspection_batch_is_bounded(verified_tokens, monkeypatch):
+    monkeypatch.setattr(module.settings, "INTROSPECTION_MAX_TOKENS", 2)
+
+    with pytest.raises(BusinessException) as raised:
+        await auth_service.introspect_tokens(["a", "b", "c"])
+
+    assert raised.value.error_code == sc.VALIDATION_ERROR
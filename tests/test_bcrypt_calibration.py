@@ -0,0 +1,9 @@
+from auth import bcrypt_calibration
+
+
+def test_calibration_recommends_the_highest_cost_within_the_target(monkeypatch):
+    # Every round doubles the time, 1ms at the minimum cost
+    monkeypatch.setattr(bcrypt_calibration, "hash_time", lambda rounds, samples: 0.001 * 2 ** (rounds - bcrypt_calibration.MIN_ROUNDS))
+
+    assert bcrypt_calibration.calibrate(0.1, samples=1) == 10
+    assert bcrypt_calibration.calibrate(0.0005, samples=1) is None
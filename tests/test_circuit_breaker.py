@@ -0,0 +1,206 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from pymongo.errors import AutoReconnect, DuplicateKeyError, OperationFailure
+from business_exception import BusinessException
+from models.status_code import sc
+from utils import circuit_breaker as module
+from utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from utils.mongo_db_manager import is_mongo_failure
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    # Only the module's clock, the event loop keeps the real one
+    monkeypatch.setattr(module, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def breaker(name, half_open_probes=2):
+    return CircuitBreaker(name, window_seconds=10, minimum_calls=4, failure_ratio=0.5, slow_call_seconds=1.0,
+                          slow_call_ratio=0.5, open_seconds=30, half_open_probes=half_open_probes)
+
+
+def is_connection_error(e):
+    return isinstance(e, ConnectionError)
+
+
+async def succeed():
+    return "ok"
+
+
+async def fail():
+    raise ConnectionError("refused")
+
+
+async def call(circuit, operation, timeout=None):
+    try:
+        return await circuit.call(operation, timeout, is_connection_error)
+    except (BusinessException, ValueError) as e:
+        return e
+
+
+async def open_circuit(circuit):
+    for operation in (succeed, succeed, fail, fail):
+        await call(circuit, operation)
+    assert circuit.state == OPEN
+
+
+@pytest.mark.asyncio
+async def test_failure_ratio_opens_the_circuit_once_there_are_enough_calls(clock):
+    circuit = breaker("test_failures")
+
+    for operation in (fail, fail, succeed):
+        await call(circuit, operation)
+    assert circuit.state == CLOSED
+
+    result = await call(circuit, fail)
+    assert circuit.state == OPEN
+    assert result.error_code == sc.DB_CONNECTION_ERROR
+
+
+@pytest.mark.asyncio
+async def test_slow_calls_open_the_circuit(clock):
+    circuit = breaker("test_slow")
+
+    async def slow():
+        clock.now += 1.5
+        return "ok"
+
+    for operation in (succeed, succeed, slow, slow):
+        assert await call(circuit, operation) == "ok"
+    assert circuit.state == OPEN
+
+
+@pytest.mark.asyncio
+async def test_errors_of_the_request_do_not_count(clock):
+    circuit = breaker("test_request_errors")
+
+    async def invalid():
+        raise ValueError("bad request")
+
+    for _ in range(5):
+        assert isinstance(await call(circuit, invalid), ValueError)
+    assert circuit.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_failures_leave_the_window(clock):
+    circuit = breaker("test_window")
+    await call(circuit, fail)
+    await call(circuit, fail)
+
+    clock.now += 10
+    for operation in (succeed, succeed, fail):
+        await call(circuit, operation)
+
+    assert circuit.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_rejects_calls_without_running_them(clock):
+    circuit = breaker("test_open")
+    await open_circuit(circuit)
+    ran = []
+
+    async def operation():
+        ran.append(True)
+
+    result = await call(circuit, operation)
+
+    assert ran == []
+    assert result.error_code == sc.DB_CONNECTION_ERROR
+    assert circuit.stats()["rejected"] == 1
+    with pytest.raises(BusinessException):
+        circuit.check()
+
+
+@pytest.mark.asyncio
+async def test_half_open_circuit_closes_after_the_probes_succeed(clock):
+    circuit = breaker("test_probes")
+    await open_circuit(circuit)
+    clock.now += 30
+
+    assert await call(circuit, succeed) == "ok"
+    assert circuit.state == HALF_OPEN
+    assert await call(circuit, succeed) == "ok"
+    assert circuit.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_half_open_circuit_limits_the_concurrent_probes(clock):
+    circuit = breaker("test_probe_limit", half_open_probes=1)
+    await open_circuit(circuit)
+    clock.now += 30
+    release = asyncio.Event()
+
+    async def waiting():
+        await release.wait()
+        return "ok"
+
+    probe = asyncio.create_task(call(circuit, waiting))
+    await asyncio.sleep(0)
+    rejected = await call(circuit, succeed)
+    release.set()
+
+    assert isinstance(rejected, BusinessException)
+    assert await probe == "ok"
+    assert circuit.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_failed_probe_opens_the_circuit_again(clock):
+    circuit = breaker("test_failed_probe")
+    await open_circuit(circuit)
+    clock.now += 30
+
+    await call(circuit, fail)
+
+    assert circuit.state == OPEN
+    assert circuit.stats()["opened"] == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_probe_frees_its_slot(clock):
+    circuit = breaker("test_cancelled_probe", half_open_probes=1)
+    await open_circuit(circuit)
+    clock.now += 30
+
+    probe = asyncio.create_task(call(circuit, asyncio.Event().wait))
+    await asyncio.sleep(0)
+    probe.cancel()
+    await asyncio.gather(probe, return_exceptions=True)
+
+    assert await call(circuit, succeed) == "ok"
+    assert circuit.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_timeout_is_a_failure(clock):
+    circuit = breaker("test_timeout")
+
+    result = await call(circuit, asyncio.Event().wait, timeout=0.01)
+
+    assert result.error_code == sc.DB_CONNECTION_ERROR
+    assert circuit.stats()["timeouts"] == 1
+    assert circuit.stats()["window_failures"] == 1
+
+
+@pytest.mark.parametrize("error, expected", [
+    (AutoReconnect("primary stepped down"), True),
+    (OperationFailure("operation exceeded time limit", code=50), True),
+    (DuplicateKeyError("E11000 duplicate key", code=11000), False),
+    (OperationFailure("not authorized", code=13), False),
+    (ValueError("bad"), False),
+])
+def test_is_mongo_failure(error, expected):
+    assert bool(is_mongo_failure(error)) is expected
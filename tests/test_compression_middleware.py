@@ -0,0 +1,99 @@
+import gzip
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+from utils.compression_middleware import CompressionMiddleware, negotiate_encoding
+
+BODY = b"x" * 4096
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    (None, None),
+    ("", None),
+    ("gzip", "gzip"),
+    ("deflate", "deflate"),
+    ("gzip, deflate", "gzip"),
+    ("gzip;q=0.5, deflate", "deflate"),
+    ("br", None),
+    ("*", "gzip"),
+    ("*;q=0, deflate;q=0.1", "deflate"),
+    ("gzip;q=0", None),
+    ("GZIP;q=bad, deflate;q=0.2", "deflate"),
+])
+def test_negotiate_encoding(accept_encoding, expected):
+    assert negotiate_encoding(accept_encoding) == expected
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    # Bodies of BODY's size are compressed in a thread
+    app.add_middleware(CompressionMiddleware, minimum_size=1024, offload_size=len(BODY))
+
+    @app.get("/large")
+    async def large():
+        return Response(BODY, headers={"ETag": '"v1"'})
+
+    @app.get("/small")
+    async def small():
+        return Response(b"small")
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for _ in range(3):
+                yield BODY
+        return StreamingResponse(chunks())
+
+    @app.get("/not-modified")
+    async def not_modified():
+        return Response(status_code=304, headers={"ETag": '"v1"'})
+
+    return TestClient(app)
+
+
+def test_large_body_is_compressed_with_a_weak_etag(client):
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == 'W/"v1"'
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.content == BODY
+
+
+def test_deflate_body_decompresses(client):
+    response = client.get("/large", headers={"Accept-Encoding": "deflate"})
+
+    assert response.headers["content-encoding"] == "deflate"
+    assert response.content == BODY
+
+
+def test_identity_response_keeps_the_strong_etag(client):
+    response = client.get("/large", headers={"Accept-Encoding": "identity"})
+
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"] == '"v1"'
+
+
+def test_small_body_is_sent_as_is(client):
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert response.content == b"small"
+
+
+def test_streamed_chunks_are_compressed(client):
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        raw = b"".join(response.iter_raw())
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert gzip.decompress(raw) == BODY * 3
+
+
+def test_not_modified_gets_the_weak_etag(client):
+    response = client.get("/not-modified", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == 'W/"v1"'
@@ -0,0 +1,56 @@
+import pytest
+from fastapi import Request
+from models.api_responses import SuccessResponse
+from utils.conditional_get import (
+    REVALIDATE_PRIVATE, content_etag, is_not_modified, make_etag, to_conditional_json_response
+)
+
+
+def request_with(if_none_match=None):
+    headers = [] if if_none_match is None else [(b"if-none-match", if_none_match.encode())]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_make_etag_is_a_stable_quoted_digest_of_its_parts():
+    etag = make_etag("token", 3)
+
+    assert etag == make_etag("token", 3)
+    assert etag != make_etag("token", 4)
+    assert etag != make_etag("token3")
+    assert etag.startswith('"') and etag.endswith('"') and len(etag) == 34
+
+
+@pytest.mark.parametrize("if_none_match, expected", [
+    (None, False),
+    ('"v1"', True),
+    ('W/"v1"', True),
+    ('"v0", W/"v1"', True),
+    ('"v2"', False),
+    (" * ", True),
+])
+def test_is_not_modified_uses_the_weak_comparison(if_none_match, expected):
+    assert is_not_modified(request_with(if_none_match), '"v1"') is expected
+
+
+def test_version_etag_answers_304_without_a_body():
+    response = to_conditional_json_response(request_with('"v1"'), SuccessResponse(data=[1]), REVALIDATE_PRIVATE, etag='"v1"')
+
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == '"v1"'
+    assert response.headers["cache-control"] == REVALIDATE_PRIVATE
+
+
+def test_changed_resource_is_sent_with_its_etag():
+    response = to_conditional_json_response(request_with('"v0"'), SuccessResponse(data=[1]), REVALIDATE_PRIVATE, etag='"v1"')
+
+    assert response.status_code == 200
+    assert response.headers["etag"] == '"v1"'
+
+
+def test_without_a_version_the_etag_is_derived_from_the_body():
+    first = to_conditional_json_response(request_with(), SuccessResponse(data=[1]), REVALIDATE_PRIVATE)
+    assert first.headers["etag"] == content_etag(first.body)
+
+    again = to_conditional_json_response(request_with(first.headers["etag"]), SuccessResponse(data=[1]), REVALIDATE_PRIVATE)
+    assert again.status_code == 304
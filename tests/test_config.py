@@ -0,0 +1,13 @@
+import pytest
+from pydantic import ValidationError
+from utils.config import Settings
+
+
+@pytest.mark.parametrize("rounds", [3, 32])
+def test_bcrypt_rounds_outside_the_bcrypt_range_are_rejected(rounds):
+    with pytest.raises(ValidationError):
+        Settings(BCRYPT_ROUNDS=rounds)
+
+
+def test_bcrypt_rounds_in_the_range_are_accepted():
+    assert Settings(BCRYPT_ROUNDS=4).BCRYPT_ROUNDS == 4
@@ -0,0 +1,67 @@
+import json
+from types import SimpleNamespace
+from utils import error_handling as module
+from utils.error_handling import ErrorBodyCache, StackTraceSampler, to_error_response
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_sampler_allows_the_limit_per_interval(monkeypatch):
+    clock = Clock()
+    # Only the module's clock, the event loop keeps the real one
+    monkeypatch.setattr(module, "time", SimpleNamespace(monotonic=clock))
+    sampler = StackTraceSampler(max_per_interval=2, interval_seconds=60)
+
+    assert [sampler.allow() for _ in range(3)] == [True, True, False]
+    assert sampler.suppressed == 1
+
+    clock.now += 60
+    assert sampler.allow() is True
+
+
+def test_sampled_out_error_is_logged_without_the_stack(monkeypatch):
+    logged = []
+    monkeypatch.setattr(module.logger, "error", lambda message, **kwargs: logged.append((message, kwargs)))
+    sampler = StackTraceSampler(max_per_interval=1)
+
+    sampler.log_unexpected("Unexpected error", ValueError("a"))
+    sampler.log_unexpected("Unexpected error", ValueError("b"))
+
+    assert "exc_info" in logged[0][1]
+    assert logged[1] == ("Unexpected error: ValueError('b') (stack trace sampled out, 1 suppressed so far)", {})
+
+
+def test_error_body_is_serialized_once_per_status_and_message():
+    cache = ErrorBodyCache(max_entries=2)
+
+    body = cache.get(401, "Invalid credentials")
+
+    assert cache.get(401, "Invalid credentials") is body
+    assert json.loads(body) == {"error": "Invalid credentials", "status_code": 401}
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+
+def test_error_body_cache_evicts_the_least_recently_used():
+    cache = ErrorBodyCache(max_entries=2)
+    cache.get(400, "a")
+    cache.get(400, "b")
+    cache.get(400, "a")
+    cache.get(400, "c")
+
+    cache.get(400, "a")
+    cache.get(400, "b")
+
+    assert cache.stats() == {"size": 2, "hits": 2, "misses": 4}
+
+
+def test_error_response_with_details_is_built_each_time():
+    response = to_error_response("Invalid input", 422, details={"field": "email"})
+
+    assert response.status_code == 422
+    assert json.loads(response.body)["details"] == {"field": "email"}
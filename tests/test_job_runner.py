@@ -0,0 +1,136 @@
+import asyncio
+import pytest
+from business_exception import BusinessException
+from models.status_code import sc
+from utils import job_runner as module
+from utils.job_runner import JobRunner
+
+
+class FakeJobs:
+    """In-memory job collection, insert_one waits for release when held"""
+
+    def __init__(self):
+        self.records = {}
+        self.release = asyncio.Event()
+        self.release.set()
+        self.unstorable = []
+
+    async def insert_one(self, record):
+        await self.release.wait()
+        self.records[record["_id"]] = dict(record)
+
+    async def update_one(self, query, update):
+        changes = update["$set"]
+        if any(changes.get("result") == value for value in self.unstorable):
+            raise ValueError("cannot encode object")
+        self.records[query["_id"]].update(changes)
+
+    async def find_one(self, query):
+        return self.records.get(query["_id"])
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    jobs = FakeJobs()
+    monkeypatch.setattr(module.mongodb_manager, "get_collection", lambda name: jobs)
+    return jobs
+
+
+async def started_runner(queue_size=10, workers=1):
+    runner = JobRunner(workers=workers, queue_size=queue_size, process_workers=0, shutdown_timeout=0.1)
+    await runner.start()
+    return runner
+
+
+def returning(value):
+    async def job(context):
+        await context.report_progress(50)
+        return value
+    return job
+
+
+@pytest.mark.asyncio
+async def test_job_runs_and_records_its_result(jobs):
+    runner = await started_runner()
+
+    job_id = await runner.submit("test", returning({"count": 3}), "Ad")
+    await runner.stop()
+
+    status = await runner.get_job(job_id)
+    assert status.status == "succeeded"
+    assert status.result == {"count": 3}
+    assert status.progress == 100
+    assert runner.stats()["succeeded"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failing_job_records_its_error(jobs):
+    runner = await started_runner()
+
+    async def failing(context):
+        raise ValueError("bad input")
+
+    job_id = await runner.submit("test", failing, "Ad")
+    await runner.stop()
+
+    status = await runner.get_job(job_id)
+    assert status.status == "failed"
+    assert status.error == "bad input"
+
+
+@pytest.mark.asyncio
+async def test_result_that_cannot_be_recorded_fails_the_job(jobs):
+    jobs.unstorable.append("unstorable")
+    runner = await started_runner()
+
+    job_id = await runner.submit("test", returning("unstorable"), "Ad")
+    await runner.stop()
+
+    status = await runner.get_job(job_id)
+    assert status.status == "failed"
+    assert status.finishedOn is not None
+    assert runner.stats()["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_submits_cannot_overfill_the_queue(jobs):
+    runner = await started_runner(queue_size=2, workers=0)
+    jobs.release.clear()
+
+    submits = [asyncio.create_task(runner.submit("test", returning(None), "Ad")) for _ in range(3)]
+    await asyncio.sleep(0)
+    jobs.release.set()
+    results = await asyncio.gather(*submits, return_exceptions=True)
+
+    rejected = [result for result in results if isinstance(result, BusinessException)]
+    assert len(rejected) == 1
+    assert rejected[0].error_code == sc.SERVICE_UNAVAILABLE
+    assert runner.stats()["queued"] == 2
+    await runner.stop()
+
+
+@pytest.mark.asyncio
+async def test_stop_cancels_the_jobs_that_never_started(jobs):
+    runner = await started_runner(workers=0)
+
+    job_id = await runner.submit("test", returning(None), "Ad")
+    await runner.stop()
+
+    assert jobs.records[job_id]["status"] == "cancelled"
+    with pytest.raises(BusinessException):
+        await runner.submit("test", returning(None), "Ad")
+
+
+@pytest.mark.asyncio
+async def test_submit_in_progress_when_stopped_is_cancelled(jobs):
+    runner = await started_runner(workers=0)
+    jobs.release.clear()
+
+    submit = asyncio.create_task(runner.submit("test", returning(None), "Ad"))
+    await asyncio.sleep(0)
+    await runner.stop()
+    jobs.release.set()
+
+    with pytest.raises(BusinessException):
+        await submit
+    assert [record["status"] for record in jobs.records.values()] == ["cancelled"]
@@ -0,0 +1,61 @@
+import pytest
+from utils.latency_histogram import DEFAULT_BOUNDS, LatencyHistogram
+
+
+def test_default_bounds_grow_by_a_quarter_up_to_two_minutes():
+    assert DEFAULT_BOUNDS[0] == 0.00005
+    assert DEFAULT_BOUNDS[-1] == 120.0
+    assert all(upper / lower <= 1.25 + 1e-9 for lower, upper in zip(DEFAULT_BOUNDS, DEFAULT_BOUNDS[1:]))
+
+
+def test_latencies_fall_in_the_bucket_of_their_upper_bound():
+    histogram = LatencyHistogram([0.1, 0.2, 0.4])
+    for seconds in (0.05, 0.1, 0.15, 0.3, 1.0):
+        histogram.add(seconds)
+
+    assert histogram.counts == [2, 1, 1, 1]
+    assert histogram.count == 5
+    assert histogram.max == 1.0
+    assert histogram.mean == pytest.approx(0.32)
+
+
+def test_percentile_is_the_upper_bound_of_its_bucket():
+    histogram = LatencyHistogram([0.1, 0.2, 0.4])
+    for seconds in [0.05] * 90 + [0.15] * 9 + [0.3]:
+        histogram.add(seconds)
+
+    assert histogram.percentile(50) == 0.1
+    assert histogram.percentile(90) == 0.1
+    assert histogram.percentile(99) == 0.2
+    assert histogram.percentile(100) == 0.3
+
+
+def test_percentile_of_the_top_buckets_is_capped_by_the_max():
+    histogram = LatencyHistogram([0.1, 0.2])
+    histogram.add(0.12)
+    assert histogram.percentile(99) == 0.12
+
+    histogram.add(5.0)
+    assert histogram.percentile(50) == 0.2
+    assert histogram.percentile(99) == 5.0
+
+
+def test_empty_histogram_has_no_percentile_or_mean():
+    histogram = LatencyHistogram()
+
+    assert histogram.percentile(99) is None
+    assert histogram.mean is None
+
+
+def test_merged_histogram_adds_up_both():
+    first, second = LatencyHistogram([0.1, 0.2]), LatencyHistogram([0.1, 0.2])
+    first.add(0.05)
+    second.add(0.15)
+    second.add(0.5)
+
+    first.merge(second)
+
+    assert first.counts == [1, 1, 1]
+    assert first.count == 3
+    assert first.total == pytest.approx(0.7)
+    assert first.max == 0.5
@@ -0,0 +1,115 @@
+import asyncio
+import pytest
+from utils.load_shedding_middleware import LoadSheddingMiddleware, RouteGroup
+
+
+class BlockingApp:
+    """Holds every request until released"""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.served = []
+
+    async def __call__(self, scope, receive, send):
+        self.served.append(scope["path"])
+        await self.release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+def middleware_with(app, shared_capacity=10):
+    return LoadSheddingMiddleware(
+        app,
+        groups=[
+            RouteGroup("health", ("/health",), 2, reserved=True),
+            RouteGroup("admin", ("/api/v1/admin", "/api/v1/auth/users"), 5, admit_below=0.5),
+            RouteGroup("auth", ("/api/v1/auth",), 3),
+            RouteGroup("user", ("/api/v1/user",), 10, admit_below=0.8),
+        ],
+        default_group="user",
+        shared_capacity=shared_capacity,
+    )
+
+
+async def request(middleware, path):
+    """Sends a request and returns its status and headers"""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware({"type": "http", "method": "GET", "path": path, "headers": []}, receive, send)
+    start = sent[0]
+    return start["status"], dict(start["headers"])
+
+
+async def in_flight(middleware, path, count):
+    tasks = [asyncio.create_task(request(middleware, path)) for _ in range(count)]
+    await asyncio.sleep(0)
+    return tasks
+
+
+@pytest.mark.asyncio
+async def test_requests_go_to_the_first_group_whose_prefix_matches():
+    app = BlockingApp()
+    app.release.set()
+    middleware = middleware_with(app)
+
+    for path in ("/api/v1/auth/users", "/api/v1/auth/sign-in", "/other"):
+        await request(middleware, path)
+
+    groups = middleware.stats()["groups"]
+    assert groups["admin"]["admitted"] == 1
+    assert groups["auth"]["admitted"] == 1
+    assert groups["user"]["admitted"] == 1
+    assert middleware.stats()["shared_in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_request_over_the_group_limit_gets_429():
+    app = BlockingApp()
+    middleware = middleware_with(app)
+    held = await in_flight(middleware, "/api/v1/auth/sign-in", 3)
+
+    status, headers = await request(middleware, "/api/v1/auth/sign-in")
+    app.release.set()
+    await asyncio.gather(*held)
+
+    assert status == 429
+    assert headers[b"retry-after"] == b"1"
+    assert len(app.served) == 3
+
+
+@pytest.mark.asyncio
+async def test_lower_priority_groups_are_shed_first():
+    app = BlockingApp()
+    middleware = middleware_with(app, shared_capacity=10)
+    held = await in_flight(middleware, "/api/v1/user/profile", 5)
+
+    admin_status, _ = await request(middleware, "/api/v1/admin/queries")
+    held += await in_flight(middleware, "/api/v1/user/profile", 1)
+    app.release.set()
+    await asyncio.gather(*held)
+
+    assert admin_status == 503
+    assert middleware.stats()["groups"]["admin"]["shed_overload"] == 1
+    assert middleware.stats()["groups"]["user"]["admitted"] == 6
+
+
+@pytest.mark.asyncio
+async def test_reserved_group_is_answered_when_the_shared_capacity_is_full():
+    app = BlockingApp()
+    middleware = middleware_with(app, shared_capacity=3)
+    held = await in_flight(middleware, "/api/v1/auth/sign-in", 3)
+
+    user_status, _ = await request(middleware, "/api/v1/user/profile")
+    health = asyncio.create_task(request(middleware, "/health"))
+    await asyncio.sleep(0)
+    app.release.set()
+
+    assert user_status == 503
+    assert (await health)[0] == 200
+    await asyncio.gather(*held)
@@ -0,0 +1,49 @@
+import asyncio
+import time
+import pytest
+from utils.loop_monitor import LoopMonitor
+
+
+def block_the_loop(seconds):
+    time.sleep(seconds)
+
+
+@pytest.mark.asyncio
+async def test_lag_is_sampled_while_the_loop_is_free():
+    monitor = LoopMonitor(interval_seconds=0.01, threshold_seconds=1.0)
+    monitor.start()
+    await asyncio.sleep(0.1)
+    await monitor.stop()
+
+    stats = monitor.stats()
+    assert stats["samples"] > 0
+    assert stats["lag_p50_ms"] is not None
+    assert sum(stats["lag_histogram_ms"].values()) == stats["samples"]
+    assert stats["blocking_episodes"] == 0
+
+
+@pytest.mark.asyncio
+async def test_blocking_code_is_captured_once_per_episode():
+    monitor = LoopMonitor(interval_seconds=0.01, threshold_seconds=0.05)
+    monitor.start()
+    await asyncio.sleep(0.02)
+
+    block_the_loop(0.4)
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+
+    assert monitor.blocking_episodes == 1
+    capture = monitor.recent_captures()[0]
+    assert capture["blockedMs"] >= 50
+    assert any("block_the_loop" in line for line in capture["stack"])
+    assert monitor.stats()["lag_max_ms"] >= 300
+
+
+@pytest.mark.asyncio
+async def test_captures_are_bounded_and_newest_first():
+    monitor = LoopMonitor(interval_seconds=0.01, threshold_seconds=0.05, max_captures=2)
+    for stuck_for in (0.1, 0.2, 0.3):
+        monitor._capture(stuck_for, ["stack\n"])
+
+    assert [capture["blockedMs"] for capture in monitor.recent_captures()] == [300.0, 200.0]
+    assert monitor.blocking_episodes == 3
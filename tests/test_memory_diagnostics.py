@@ -0,0 +1,111 @@
+import asyncio
+import gc
+import tracemalloc
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from business_exception import BusinessException
+from models.status_code import sc
+from utils.memory_diagnostics import AllocationTrackingMiddleware, MemoryDiagnostics, RouteAllocations
+
+
+@pytest.fixture
+def diagnostics():
+    diagnostics = MemoryDiagnostics()
+    yield diagnostics
+    gc.callbacks.remove(diagnostics._on_gc)
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def test_route_allocations_figures():
+    allocations = RouteAllocations()
+    allocations.record(4096, 1024)
+    allocations.record(2048, 0)
+
+    assert allocations.stats() == {"samples": 2, "mean_peak_kb": 3.0, "max_peak_kb": 4.0, "mean_retained_kb": 0.5}
+
+
+def test_tracing_is_started_once(diagnostics):
+    diagnostics.start(1)
+
+    with pytest.raises(BusinessException) as raised:
+        diagnostics.start(1)
+    assert raised.value.error_code == sc.CONFLICT
+    assert diagnostics.stats()["tracing"] is True
+
+    diagnostics.stop()
+    assert diagnostics.stats()["tracing"] is False
+    with pytest.raises(BusinessException):
+        diagnostics.stop()
+
+
+@pytest.mark.asyncio
+async def test_top_growth_shows_the_line_that_allocated(diagnostics):
+    diagnostics.start(1)
+    retained = [bytearray(1024) for _ in range(200)]
+
+    growth = await diagnostics.top_growth(limit=5, group_by="lineno", rebase=True)
+
+    assert growth[0]["site"][0].startswith(__file__)
+    assert growth[0]["sizeDiffKb"] >= 200 and growth[0]["countDiff"] >= 200
+    rebased = await diagnostics.top_growth(limit=5, group_by="lineno", rebase=False)
+    assert all(item["sizeDiffKb"] < 200 for item in rebased)
+    del retained
+
+
+@pytest.mark.asyncio
+async def test_top_growth_without_a_baseline_is_a_conflict(diagnostics):
+    with pytest.raises(BusinessException) as raised:
+        await diagnostics.top_growth(limit=5, group_by="lineno", rebase=False)
+    assert raised.value.error_code == sc.CONFLICT
+
+    diagnostics.start(1)
+    diagnostics.baseline = None
+    with pytest.raises(BusinessException) as raised:
+        await diagnostics.top_growth(limit=5, group_by="lineno", rebase=False)
+    assert raised.value.error_code == sc.CONFLICT
+
+
+@pytest.mark.asyncio
+async def test_tracing_stopped_during_the_snapshot_is_a_conflict(diagnostics, monkeypatch):
+    diagnostics.start(1)
+
+    def stopped_meanwhile():
+        tracemalloc.stop()
+        raise RuntimeError("the tracemalloc module must be tracing memory allocations to take a snapshot")
+    monkeypatch.setattr(diagnostics, "_snapshot", stopped_meanwhile)
+
+    with pytest.raises(BusinessException) as raised:
+        await diagnostics.top_growth(limit=5, group_by="lineno", rebase=False)
+    assert raised.value.error_code == sc.CONFLICT
+
+
+def test_middleware_measures_routes_while_tracing(diagnostics):
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str):
+        return {"payload": "x" * 100_000}
+
+    app.add_middleware(AllocationTrackingMiddleware, diagnostics=diagnostics, sample_rate=1.0)
+    client = TestClient(app)
+
+    client.get("/items/1")
+    assert diagnostics.route_allocations() == {}
+
+    diagnostics.start(1)
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/missing")
+
+    allocations = diagnostics.route_allocations()
+    assert allocations["GET /items/{item_id}"]["samples"] == 2
+    assert allocations["GET /items/{item_id}"]["max_peak_kb"] >= 97
+    assert allocations["unmatched"]["samples"] == 1
+
+
+def test_gc_pauses_are_recorded(diagnostics):
+    gc.collect(0)
+
+    assert diagnostics.stats()["gc"]["generation_0"]["max_pause_ms"] > 0
@@ -0,0 +1,80 @@
+import pytest
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from utils.mongo_db_manager import MongoDBManager
+
+
+class FakeCollection:
+    def __init__(self, indexes):
+        self.indexes = indexes
+        self.created = []
+        self.fail_creating = False
+
+    async def list_indexes(self):
+        for index in self.indexes:
+            yield index
+
+    async def create_indexes(self, models):
+        if self.fail_creating:
+            raise RuntimeError("index build failed")
+        self.created.extend(model.document["name"] for model in models)
+
+
+def manager_with(collection):
+    manager = MongoDBManager()
+    manager.database = {"things": collection}
+    manager.index_states["things"] = {}
+    return manager
+
+
+EXISTING_ID = {"name": "_id_", "key": {"_id": 1}}
+
+
+@pytest.mark.asyncio
+async def test_only_missing_indexes_are_created():
+    collection = FakeCollection([EXISTING_ID, {"name": "email_1", "key": {"email": 1}, "unique": True}])
+    manager = manager_with(collection)
+
+    await manager._ensure_collection_indexes("things", [
+        IndexModel([("email", ASCENDING)], name="email_1", unique=True),
+        IndexModel([("created_on", DESCENDING)], name="created_on_-1"),
+    ])
+
+    assert collection.created == ["created_on_-1"]
+    assert manager.index_states["things"] == {"email_1": "present", "created_on_-1": "created"}
+    assert (await manager.index_report())["status"] == "ok"
+
+
+@pytest.mark.asyncio
+async def test_same_key_with_other_options_is_a_conflict():
+    collection = FakeCollection([EXISTING_ID, {"name": "email_1", "key": {"email": 1}}])
+    manager = manager_with(collection)
+
+    await manager._ensure_collection_indexes("things", [IndexModel([("email", ASCENDING)], name="email_1", unique=True)])
+
+    assert collection.created == []
+    assert manager.index_states["things"] == {"email_1": "conflict"}
+    assert (await manager.index_report())["status"] == "failed"
+
+
+@pytest.mark.asyncio
+async def test_key_order_matters():
+    collection = FakeCollection([EXISTING_ID, {"name": "b_1_a_1", "key": {"b": 1, "a": 1}}])
+    manager = manager_with(collection)
+
+    await manager._ensure_collection_indexes("things", [IndexModel([("a", ASCENDING), ("b", ASCENDING)], name="a_1_b_1")])
+
+    assert collection.created == ["a_1_b_1"]
+    assert manager.undeclared_indexes["things"] == ["b_1_a_1"]
+    assert (await manager.index_report())["status"] == "drift"
+
+
+@pytest.mark.asyncio
+async def test_failed_build_is_reported():
+    collection = FakeCollection([EXISTING_ID])
+    collection.fail_creating = True
+    manager = manager_with(collection)
+
+    await manager._ensure_collection_indexes("things", [IndexModel([("a", ASCENDING)], name="a_1")])
+
+    assert manager.index_states["things"] == {"a_1": "failed"}
+    assert (await manager.index_report())["status"] == "failed"
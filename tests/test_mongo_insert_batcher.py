@@ -0,0 +1,82 @@
+import asyncio
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from utils import mongo_insert_batcher as module
+from utils.mongo_insert_batcher import MongoInsertBatcher
+
+
+class FakeCollection:
+    def __init__(self, write_errors=None, failure=None):
+        self.write_errors = write_errors or []
+        self.failure = failure
+        self.batches = []
+
+    async def insert_many(self, documents, ordered):
+        for document in documents:
+            document.setdefault("_id", ObjectId())
+        self.batches.append(len(documents))
+        if self.failure is not None:
+            raise self.failure
+        if self.write_errors:
+            raise BulkWriteError({"writeErrors": self.write_errors})
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(module.mongodb_manager, "get_collection", lambda name: collection)
+    return collection
+
+
+@pytest.mark.asyncio
+async def test_concurrent_inserts_are_written_as_one_batch(collection):
+    batcher = MongoInsertBatcher("test_batch", max_delay_ms=5, max_batch_size=100)
+
+    ids = await asyncio.gather(*(batcher.insert({"n": n}) for n in range(3)))
+
+    assert collection.batches == [3]
+    assert len(set(ids)) == 3
+    assert batcher.stats()["average_batch_size"] == 3.0
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_written_without_waiting_for_the_delay(collection):
+    batcher = MongoInsertBatcher("test_full", max_delay_ms=60_000, max_batch_size=2)
+
+    await asyncio.wait_for(asyncio.gather(batcher.insert({"n": 1}), batcher.insert({"n": 2})), timeout=1)
+
+    assert collection.batches == [2]
+
+
+@pytest.mark.asyncio
+async def test_duplicate_key_fails_only_its_own_caller(collection):
+    collection.write_errors = [{"index": 1, "code": 11000, "errmsg": "E11000 duplicate key"}]
+    batcher = MongoInsertBatcher("test_duplicate", max_delay_ms=5, max_batch_size=100)
+
+    results = await asyncio.gather(batcher.insert({"n": 1}), batcher.insert({"n": 2}), return_exceptions=True)
+
+    assert isinstance(results[0], ObjectId)
+    assert isinstance(results[1], DuplicateKeyError)
+
+
+@pytest.mark.asyncio
+async def test_failed_write_fails_every_caller(collection):
+    collection.failure = RuntimeError("connection lost")
+    batcher = MongoInsertBatcher("test_failure", max_delay_ms=5, max_batch_size=100)
+
+    results = await asyncio.gather(batcher.insert({"n": 1}), batcher.insert({"n": 2}), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_drain_writes_the_pending_documents(collection):
+    batcher = MongoInsertBatcher("test_drain", max_delay_ms=60_000, max_batch_size=100)
+
+    insert = asyncio.create_task(batcher.insert({"n": 1}))
+    await asyncio.sleep(0)
+    await batcher.drain()
+
+    assert isinstance(await insert, ObjectId)
+    assert batcher.stats()["pending"] == 0
@@ -0,0 +1,75 @@
+from contextlib import asynccontextmanager
+import pytest
+from utils.postgre_migration_runner import Migration, MigrationRunner
+
+
+@asynccontextmanager
+async def nothing():
+    yield
+
+
+class FakeManager:
+    """Records the statements a runner executes, schema_migration being a set of versions"""
+
+    def __init__(self, applied=()):
+        self.applied = set(applied)
+        self.statements = []
+
+    def connection(self):
+        return nothing()
+
+    def transaction(self):
+        return nothing()
+
+    async def execute(self, query, values=None, timeout=None):
+        if query.startswith("INSERT INTO schema_migration"):
+            self.applied.add(values["version"])
+        elif "pg_advisory" not in query and "CREATE TABLE IF NOT EXISTS schema_migration" not in query:
+            self.statements.append(query)
+
+    async def fetch_all(self, query, values=None, timeout=None):
+        return [{"version": version} for version in self.applied]
+
+
+MIGRATIONS = [
+    Migration(version=3, description="three", statements=["S3"]),
+    Migration(version=1, description="one", statements=["S1a", "S1b"]),
+    Migration(version=2, description="two", statements=["S2"], transactional=False),
+]
+
+
+@pytest.mark.asyncio
+async def test_pending_migrations_are_applied_in_version_order():
+    manager = FakeManager()
+
+    assert await MigrationRunner(manager, MIGRATIONS).migrate() == [1, 2, 3]
+    assert manager.statements == ["S1a", "S1b", "S2", "S3"]
+
+
+@pytest.mark.asyncio
+async def test_applied_migrations_are_skipped():
+    manager = FakeManager(applied={1, 2})
+
+    assert await MigrationRunner(manager, MIGRATIONS).migrate() == [3]
+    assert manager.statements == ["S3"]
+
+
+@pytest.mark.asyncio
+async def test_transactional_only_stops_before_the_first_non_transactional_migration():
+    manager = FakeManager()
+
+    assert await MigrationRunner(manager, MIGRATIONS).migrate(transactional_only=True) == [1]
+    assert manager.applied == {1}
+    assert await MigrationRunner(manager, MIGRATIONS).migrate() == [2, 3]
+
+
+def test_sequential_scans_are_found_in_nested_plans():
+    plan = {
+        "Node Type": "Nested Loop",
+        "Plans": [
+            {"Node Type": "Index Scan", "Relation Name": "app_user"},
+            {"Node Type": "Hash", "Plans": [{"Node Type": "Seq Scan", "Relation Name": "app_user_import"}]},
+        ]
+    }
+
+    assert MigrationRunner(FakeManager(), [])._seq_scans(plan) == ["app_user_import"]
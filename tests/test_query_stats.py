@@ -0,0 +1,94 @@
+from types import SimpleNamespace
+import pytest
+from utils import query_stats as module
+from utils.query_stats import QueryStats, mongo_fingerprint, redact_params, sql_fingerprint
+
+
+class Clock:
+    def __init__(self):
+        self.now = 6000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(module, "time", SimpleNamespace(time=clock))
+    return clock
+
+
+def test_sql_fingerprint_replaces_literals_and_keeps_bind_parameters():
+    query = """
+        SELECT * FROM app_user
+        WHERE email = 'it''s@t.com' AND id > 42 AND roles && :roles LIMIT 1.5
+    """
+
+    assert sql_fingerprint(query) == "SELECT * FROM app_user WHERE email = ? AND id > ? AND roles && :roles LIMIT ?"
+
+
+def test_mongo_fingerprint_keeps_the_shape_of_the_filter():
+    fingerprint = mongo_fingerprint("user_profile", "find", ({"email": "a@t.com", "age": {"$gt": 3}}, {"_id": 0}))
+
+    assert fingerprint == 'user_profile.find {"email": "?", "age": {"$gt": "?"}} {"_id": "?"}'
+
+
+def test_mongo_fingerprint_of_pipelines_distinct_and_writes():
+    assert mongo_fingerprint("c", "aggregate", ([{"$match": {"a": 1}}, {"$limit": 5}],)) == \
+        'c.aggregate [{"$match": {"a": "?"}}, {"$limit": "?"}]'
+    assert mongo_fingerprint("c", "find", ({"tags": {"$in": ["a", "b"]}},)) == 'c.find {"tags": {"$in": ["?"]}}'
+    assert mongo_fingerprint("c", "distinct", ("email", {"active": True})) == 'c.distinct(email) {"active": "?"}'
+    assert mongo_fingerprint("c", "insert_one", ({"email": "a@t.com"},)) == "c.insert_one"
+
+
+def test_redact_params_keeps_only_names_and_types():
+    assert redact_params({"email": "a@t.com", "roles": ["admin", "user"], "limit": 5}) == \
+        {"email": "<str>", "roles": "<list[2]>", "limit": "<int>"}
+    assert redact_params(None) is None
+
+
+def test_top_ranks_fingerprints_over_the_window(clock):
+    stats = QueryStats(window_seconds=120, slow_threshold_seconds=10, max_fingerprints=10)
+    stats.record("postgre", "fast", 0.001)
+    stats.record("postgre", "fast", 0.001)
+    stats.record("postgre", "slow", 0.5, failed=True)
+    stats.record("mongo", "other", 0.01)
+
+    by_total = stats.top(10)
+    assert [entry.fingerprint for entry in by_total] == ["slow", "other", "fast"]
+    assert by_total[0].errors == 1
+    assert [entry.fingerprint for entry in stats.top(1, order_by="count")] == ["fast"]
+    assert [entry.fingerprint for entry in stats.top(10, source="mongo")] == ["other"]
+
+
+def test_old_buckets_leave_the_window(clock):
+    stats = QueryStats(window_seconds=120, slow_threshold_seconds=10, max_fingerprints=10)
+    stats.record("postgre", "old", 0.001)
+
+    clock.now += 180
+    stats.record("postgre", "new", 0.001)
+
+    assert [entry.fingerprint for entry in stats.top(10)] == ["new"]
+
+
+def test_least_recently_seen_fingerprint_is_evicted(clock):
+    stats = QueryStats(window_seconds=120, slow_threshold_seconds=10, max_fingerprints=2)
+    stats.record("postgre", "a", 0.001)
+    stats.record("postgre", "b", 0.001)
+    stats.record("postgre", "a", 0.001)
+    stats.record("postgre", "c", 0.001)
+
+    assert {entry.fingerprint for entry in stats.top(10)} == {"a", "c"}
+    assert stats.stats()["evicted"] == 1
+
+
+def test_slow_query_is_logged_with_redacted_params(clock, monkeypatch):
+    logged = []
+    monkeypatch.setattr(module.logger, "warning", logged.append)
+    stats = QueryStats(window_seconds=120, slow_threshold_seconds=0.1, max_fingerprints=10)
+
+    stats.record("postgre", "SELECT ?", 0.2, params={"email": "a@t.com"})
+
+    assert logged == ["Slow postgre query took 200.0ms: SELECT ? params={'email': '<str>'}"]
+    assert "a@t.com" not in logged[0]
@@ -0,0 +1,79 @@
+import asyncio
+import sys
+import threading
+import time
+import pytest
+from business_exception import BusinessException
+from models.status_code import sc
+from utils.sampling_profiler import SamplingProfiler
+
+
+def spin_in_a_thread(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def collapse_here():
+    return SamplingProfiler._collapse(sys._getframe(), include_idle=False)
+
+
+def test_collapse_lists_the_frames_outermost_first():
+    stack = collapse_here()
+
+    assert stack.endswith(f"{__name__}.test_collapse_lists_the_frames_outermost_first;{__name__}.collapse_here")
+
+
+def test_collapse_leaves_out_idle_threads_unless_asked():
+    idle = threading.Event()
+    waiter = threading.Thread(target=idle.wait, daemon=True)
+    waiter.start()
+    time.sleep(0.01)
+    frame = sys._current_frames()[waiter.ident]
+
+    assert SamplingProfiler._collapse(frame, include_idle=False) is None
+    assert SamplingProfiler._collapse(frame, include_idle=True).endswith("threading.Condition.wait")
+    idle.set()
+
+
+@pytest.mark.asyncio
+async def test_profile_counts_the_stacks_of_busy_threads():
+    profiler = SamplingProfiler()
+    stop = threading.Event()
+    spinner = threading.Thread(target=spin_in_a_thread, args=(stop,), name="spinner")
+    spinner.start()
+    try:
+        profile = await profiler.profile(0.1, 0.005)
+    finally:
+        stop.set()
+        spinner.join()
+
+    lines = profile.splitlines()
+    assert any(line.startswith("spinner;") and "spin_in_a_thread" in line for line in lines)
+    assert all(int(line.rsplit(" ", 1)[1]) > 0 for line in lines)
+    assert profiler.stats()["sessions"] == 1
+    assert profiler.stats()["busy"] is False
+
+
+@pytest.mark.asyncio
+async def test_one_session_runs_at_a_time():
+    profiler = SamplingProfiler()
+    first = asyncio.create_task(profiler.profile(0.1, 0.01))
+    await asyncio.sleep(0)
+
+    with pytest.raises(BusinessException) as raised:
+        await profiler.profile(0.1, 0.01)
+    assert raised.value.error_code == sc.CONFLICT
+    await first
+
+
+@pytest.mark.asyncio
+async def test_cancelled_request_keeps_the_session_until_the_sampler_ends():
+    profiler = SamplingProfiler()
+    request = asyncio.create_task(profiler.profile(0.2, 0.01))
+    await asyncio.sleep(0.05)
+    request.cancel()
+    await asyncio.gather(request, return_exceptions=True)
+
+    assert profiler.stats()["busy"] is True
+    await asyncio.sleep(0.3)
+    assert profiler.stats()["busy"] is False
@@ -0,0 +1,154 @@
+import asyncio
+import os
+from types import SimpleNamespace
+import pytest
+from pydantic import BaseModel
+from utils import cache_factory, shared_memory_cache as module
+from utils.shared_memory_cache import HEADER_SIZE, WAYS, SharedMemoryCache
+from utils.ttl_cache import MISSING
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    # Only the module's clock, the event loop keeps the real one
+    monkeypatch.setattr(module, "time", SimpleNamespace(time=clock))
+    return clock
+
+
+class Profile(BaseModel):
+    email: str
+    weight: float
+
+
+def segment(directory, name="test", max_entries=WAYS, slot_bytes=256, value_type=Profile, namespace="8000"):
+    return SharedMemoryCache(name, max_entries=max_entries, ttl_seconds=60, negative_ttl_seconds=5,
+                             directory=str(directory), namespace=namespace, slot_bytes=slot_bytes, value_type=value_type)
+
+
+def test_segment_is_named_after_the_namespace_and_geometry(tmp_path):
+    cache = segment(tmp_path, max_entries=20)
+
+    assert cache.slots == 3 * WAYS
+    assert os.path.basename(cache.path) == f"template-cache-8000-test-{3 * WAYS}x256.bin"
+    assert os.path.getsize(cache.path) == HEADER_SIZE + cache.slots * 256
+    assert segment(tmp_path, max_entries=20, namespace="8001").path != cache.path
+    assert segment(tmp_path, max_entries=20, slot_bytes=512).path != cache.path
+
+
+def test_entries_are_shared_by_the_processes_mapping_the_segment(tmp_path, clock):
+    writer, reader = segment(tmp_path), segment(tmp_path)
+
+    writer.put("a@t.com", Profile(email="a@t.com", weight=80))
+    writer.put("missing@t.com", None)
+
+    assert reader.get("a@t.com") == Profile(email="a@t.com", weight=80)
+    assert reader.get("missing@t.com") is None
+    assert reader.get("other@t.com") is MISSING
+    reader.invalidate("a@t.com")
+    assert writer.get("a@t.com") is MISSING
+
+
+def test_entries_and_misses_expire(tmp_path, clock):
+    cache = segment(tmp_path)
+    cache.put("a", Profile(email="a", weight=1))
+    cache.put("missing", None)
+
+    clock.now += 5
+    assert cache.get("missing") is MISSING
+    assert cache.get("a") is not MISSING
+    clock.now += 55
+    assert cache.get("a") is MISSING
+    assert cache.stats()["expirations"] == 2
+
+
+def test_full_set_evicts_its_least_recently_used_slot(tmp_path, clock):
+    # One set: every key competes for the same WAYS slots
+    cache = segment(tmp_path, max_entries=WAYS)
+    for index in range(WAYS):
+        clock.now += 1
+        cache.put(index, Profile(email=str(index), weight=index))
+    clock.now += 1
+    cache.get(0)
+
+    clock.now += 1
+    cache.put("new", Profile(email="new", weight=0))
+
+    assert cache.get(1) is MISSING
+    assert cache.get(0) is not MISSING
+    assert cache.get("new") is not MISSING
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == WAYS
+
+
+def test_expired_slot_is_reused_before_evicting(tmp_path, clock):
+    cache = segment(tmp_path, max_entries=WAYS)
+    cache.put("expiring", None)
+    clock.now += 1
+    for index in range(WAYS - 1):
+        cache.put(index, Profile(email=str(index), weight=index))
+
+    clock.now += 5
+    cache.put("new", Profile(email="new", weight=0))
+
+    assert cache.stats()["evictions"] == 0
+    assert all(cache.get(index) is not MISSING for index in range(WAYS - 1))
+
+
+def test_entry_larger_than_a_slot_is_not_cached(tmp_path, clock):
+    cache = segment(tmp_path, slot_bytes=64)
+
+    cache.put("a", Profile(email="x" * 100, weight=1))
+
+    assert cache.get("a") is MISSING
+    assert cache.stats()["oversized"] == 1
+
+
+def test_segment_without_the_layout_starts_empty(tmp_path, clock):
+    cache = segment(tmp_path)
+    cache.put("a", Profile(email="a", weight=1))
+    with open(cache.path, "r+b") as file:
+        file.write(b"garbage!")
+
+    assert segment(tmp_path).get("a") is MISSING
+
+
+@pytest.mark.asyncio
+async def test_load_overlapping_an_invalidation_by_another_process_is_not_cached(tmp_path, clock):
+    loading_worker, other_worker = segment(tmp_path), segment(tmp_path)
+    release = asyncio.Event()
+    started = asyncio.Event()
+
+    async def stale():
+        started.set()
+        await release.wait()
+        return Profile(email="a", weight=1)
+
+    loading = asyncio.create_task(loading_worker.get_or_load("a", stale))
+    await started.wait()
+    other_worker.invalidate("b")
+    release.set()
+
+    assert await loading == Profile(email="a", weight=1)
+    assert loading_worker.get("a") is MISSING
+
+
+def test_cache_backend_setting_selects_the_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_factory.settings, "SHARED_CACHE_DIR", str(tmp_path))
+
+    monkeypatch.setattr(cache_factory.settings, "CACHE_BACKEND", "shared")
+    shared = cache_factory.create_cache("test_factory", 16, 60, 5, value_type=Profile)
+    monkeypatch.setattr(cache_factory.settings, "CACHE_BACKEND", "memory")
+    memory = cache_factory.create_cache("test_factory", 16, 60, 5)
+
+    assert isinstance(shared, SharedMemoryCache)
+    assert os.path.dirname(shared.path) == str(tmp_path)
+    assert memory.stats()["backend"] == "memory"
@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+from utils.single_flight import SingleFlight
+
+
+class Call:
+    """A call that completes when released, counting how often it was issued"""
+
+    def __init__(self, result="value"):
+        self.result = result
+        self.issued = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.issued += 1
+        await self.release.wait()
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_for_a_key_share_one_execution():
+    flight = SingleFlight("test_share")
+    call = Call()
+
+    callers = [asyncio.create_task(flight.do("k", call)) for _ in range(5)]
+    await asyncio.sleep(0)
+    call.release.set()
+
+    assert await asyncio.gather(*callers) == ["value"] * 5
+    assert call.issued == 1
+    assert flight.stats()["merged"] == 4
+    assert flight.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_different_keys_execute_separately():
+    flight = SingleFlight("test_keys")
+    call = Call()
+    call.release.set()
+
+    await asyncio.gather(flight.do("a", call), flight.do("b", call))
+
+    assert call.issued == 2
+
+
+@pytest.mark.asyncio
+async def test_callers_share_the_exception():
+    flight = SingleFlight("test_exception")
+    call = Call(result=ValueError("boom"))
+
+    callers = [asyncio.create_task(flight.do("k", call)) for _ in range(2)]
+    await asyncio.sleep(0)
+    call.release.set()
+    results = await asyncio.gather(*callers, return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert call.issued == 1
+
+
+@pytest.mark.asyncio
+async def test_forget_makes_later_callers_issue_a_new_call():
+    flight = SingleFlight("test_forget")
+    stale, fresh = Call("stale"), Call("fresh")
+
+    waiting = asyncio.create_task(flight.do("k", stale))
+    await asyncio.sleep(0)
+    flight.forget("k")
+    later = asyncio.create_task(flight.do("k", fresh))
+    await asyncio.sleep(0)
+    stale.release.set()
+    fresh.release.set()
+
+    assert await waiting == "stale"
+    assert await later == "fresh"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_the_call_for_the_others():
+    flight = SingleFlight("test_cancel")
+    call = Call()
+
+    first = asyncio.create_task(flight.do("k", call))
+    second = asyncio.create_task(flight.do("k", call))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    call.release.set()
+
+    assert await second == "value"
+    assert first.cancelled()
@@ -0,0 +1,120 @@
+import json
+import logging
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from utils import tracing as module
+from utils.logger import request_id
+from utils.tracing import REQUEST_ID_HEADER, Tracer, TracingMiddleware, current_span, traced
+
+
+@pytest.fixture
+def spans(tmp_path, monkeypatch):
+    """Installs a tracer sampling every request, and returns a function reading the exported spans"""
+    file_path = tmp_path / "traces.jsonl"
+    tracer = Tracer(exporter="file", sample_rate=1.0, file_path=str(file_path))
+    monkeypatch.setattr(module, "tracer", tracer)
+
+    def exported():
+        # Stopping the listener writes the spans still queued
+        tracer.stop()
+        return [json.loads(line) for line in file_path.read_text().splitlines()]
+
+    yield exported
+    tracer.stop()
+    logging.getLogger("Template-Project.traces").handlers.clear()
+
+
+class Repository:
+    @traced("repository")
+    async def find(self):
+        span = current_span.get()
+        return span.name if span is not None else None
+
+
+@traced("service")
+async def handle():
+    return await Repository().find()
+
+
+async def fail():
+    raise RuntimeError("boom")
+
+
+async def answer_error(request, exc):
+    return JSONResponse({"error": str(exc), "requestId": request_id.get()}, status_code=500)
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str):
+        return {"span": await handle(), "requestId": request_id.get()}
+
+    @app.get("/fail")
+    async def failing():
+        await fail()
+
+    app.add_middleware(TracingMiddleware, error_handler=answer_error)
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_traced_call_outside_of_a_request_opens_no_span():
+    assert module.tracer.span("anything") is module.NO_SPAN
+
+
+@pytest.mark.asyncio
+async def test_traced_names_spans_after_the_method_or_module_function(spans):
+    root = module.tracer.start_trace("trace-1", "GET /")
+    token = current_span.set(root)
+    try:
+        assert await handle() == "Repository.find"
+    finally:
+        current_span.reset(token)
+
+    names = [(span["name"], span["kind"]) for span in spans()]
+    assert names == [("Repository.find", "repository"), ("test_tracing.handle", "service")]
+
+
+def test_request_spans_are_linked_and_named_after_the_route(client, spans):
+    response = client.get("/items/42")
+
+    assert response.json()["span"] == "Repository.find"
+    trace_id = response.headers[REQUEST_ID_HEADER]
+    assert response.json()["requestId"] == trace_id
+    by_name = {span["name"]: span for span in spans()}
+    root = by_name["GET /items/{item_id}"]
+    assert root["trace_id"] == trace_id and root["parent_id"] is None
+    assert root["attributes"]["status_code"] == 200
+    assert by_name["test_tracing.handle"]["parent_id"] == root["span_id"]
+    assert by_name["Repository.find"]["parent_id"] == by_name["test_tracing.handle"]["span_id"]
+
+
+@pytest.mark.parametrize("incoming, kept", [("gateway-123", True), ("not valid!", False), ("x" * 65, False)])
+def test_valid_request_id_of_the_caller_is_kept(client, spans, incoming, kept):
+    response = client.get("/items/1", headers={REQUEST_ID_HEADER: incoming})
+
+    assert (response.headers[REQUEST_ID_HEADER] == incoming) is kept
+
+
+def test_unhandled_exception_is_answered_with_the_request_id(client, spans):
+    response = client.get("/fail", headers={REQUEST_ID_HEADER: "req-1"})
+
+    assert response.status_code == 500
+    assert response.headers[REQUEST_ID_HEADER] == "req-1"
+    assert response.json() == {"error": "boom", "requestId": "req-1"}
+    assert spans()[-1]["error"] == "RuntimeError"
+
+
+def test_unsampled_requests_export_nothing(client, spans):
+    module.tracer.sample_rate = 0.0
+
+    response = client.get("/items/1")
+
+    assert response.json()["span"] is None
+    assert REQUEST_ID_HEADER in response.headers
+    assert spans() == []
+    assert module.tracer.stats()["requests"] == 1
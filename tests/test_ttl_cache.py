@@ -0,0 +1,133 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from utils import ttl_cache as module
+from utils.ttl_cache import MISSING, TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    # Only the module's clock, the event loop keeps the real one
+    monkeypatch.setattr(module, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def cache(name, max_entries=10):
+    return TTLCache(name, max_entries=max_entries, ttl_seconds=60, negative_ttl_seconds=5)
+
+
+class Loader:
+    def __init__(self, value):
+        self.value = value
+        self.loads = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self):
+        self.loads += 1
+        await self.release.wait()
+        return self.value
+
+
+async def started(loader):
+    while not loader.loads:
+        await asyncio.sleep(0)
+
+
+def test_entries_expire_after_the_ttl(clock):
+    entries = cache("test_ttl")
+    entries.put("a", "value")
+
+    clock.now += 59
+    assert entries.get("a") == "value"
+    clock.now += 1
+    assert entries.get("a") is MISSING
+    assert entries.stats()["expirations"] == 1
+
+
+def test_cached_miss_expires_after_the_negative_ttl(clock):
+    entries = cache("test_negative_ttl")
+    entries.put("missing", None)
+
+    assert entries.get("missing") is None
+    assert entries.stats()["negative_hits"] == 1
+    clock.now += 5
+    assert entries.get("missing") is MISSING
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    entries = cache("test_lru", max_entries=2)
+    entries.put("a", 1)
+    entries.put("b", 2)
+    entries.get("a")
+    entries.put("c", 3)
+
+    assert entries.get("b") is MISSING
+    assert entries.get("a") == 1
+    assert entries.stats()["evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_load_is_cached_and_shared_by_concurrent_misses(clock):
+    entries = cache("test_load")
+    loader = Loader("value")
+    loader.release.clear()
+
+    waiting = [asyncio.create_task(entries.get_or_load("a", loader)) for _ in range(3)]
+    await asyncio.sleep(0)
+    loader.release.set()
+
+    assert await asyncio.gather(*waiting) == ["value"] * 3
+    assert await entries.get_or_load("a", loader) == "value"
+    assert loader.loads == 1
+
+
+@pytest.mark.asyncio
+async def test_load_of_a_missing_entity_is_cached_as_a_miss(clock):
+    entries = cache("test_negative_load")
+    loader = Loader(None)
+
+    assert await entries.get_or_load("a", loader) is None
+    assert await entries.get_or_load("a", loader) is None
+    assert loader.loads == 1
+
+
+@pytest.mark.asyncio
+async def test_load_overlapping_an_invalidation_is_not_cached(clock):
+    entries = cache("test_version")
+    stale = Loader("stale")
+    stale.release.clear()
+
+    loading = asyncio.create_task(entries.get_or_load("a", stale))
+    await started(stale)
+    entries.invalidate("a")
+    stale.release.set()
+
+    assert await loading == "stale"
+    assert entries.get("a") is MISSING
+    assert await entries.get_or_load("a", Loader("fresh")) == "fresh"
+    assert entries.get("a") == "fresh"
+
+
+@pytest.mark.asyncio
+async def test_invalidation_of_another_key_also_skips_caching(clock):
+    entries = cache("test_other_key")
+    loader = Loader("value")
+    loader.release.clear()
+
+    loading = asyncio.create_task(entries.get_or_load("a", loader))
+    await started(loader)
+    entries.invalidate("b")
+    loader.release.set()
+
+    assert await loading == "value"
+    assert entries.get("a") is MISSING
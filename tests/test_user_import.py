@@ -0,0 +1,91 @@
+import json
+import bcrypt
+import pytest
+from auth import user_import as module
+from auth.user_import import parse_user_import, run_user_import
+
+CSV_UPLOAD = (
+    "﻿firstName,lastName,email,password\n"
+    "Ann,Lee,ann@t.com,secret1\n"
+    "Bob,Ray,not-an-email,secret2\n"
+    "Ann,Again,ann@t.com,secret3\n"
+    "Cid,Moe,cid@t.com,secret4,extra\n"
+).encode("utf-8")
+
+
+def ndjson(*records):
+    return "\n".join(record if isinstance(record, str) else json.dumps(record) for record in records).encode("utf-8")
+
+
+def user(email, password="secret"):
+    return {"firstName": "F", "lastName": "L", "email": email, "password": password}
+
+
+def test_csv_rows_are_validated_and_deduplicated():
+    rows, rejections = parse_user_import(CSV_UPLOAD, "csv")
+
+    assert rows == [(2, "Ann", "Lee", "ann@t.com", "secret1"), (5, "Cid", "Moe", "cid@t.com", "secret4")]
+    assert [(line, email) for line, email, _ in rejections] == [(3, "not-an-email"), (4, "ann@t.com")]
+    assert rejections[0][2].startswith("invalid row: email:")
+    assert rejections[1][2] == "duplicate of line 2"
+
+
+def test_ndjson_rows_that_are_not_records_are_rejected():
+    upload = ndjson(user("a@t.com"), "", "{not json", "[1, 2]", {"email": "b@t.com"}, user("a@T.COM"))
+
+    rows, rejections = parse_user_import(upload, "ndjson")
+
+    assert [row[:1] + row[3:4] for row in rows] == [(1, "a@t.com")]
+    assert rejections[0] == (3, None, "invalid row: not valid JSON")
+    assert rejections[1] == (4, None, "invalid row: not a JSON object")
+    assert rejections[2][:2] == (5, "b@t.com") and "firstName" in rejections[2][2]
+    # Emails are compared as normalized by the sign up model, the domain in lower case
+    assert rejections[3][2] == "duplicate of line 1"
+
+
+class FakeContext:
+    def __init__(self):
+        self.progress = []
+
+    async def report_progress(self, progress, message=None):
+        self.progress.append(progress)
+
+    async def run_cpu_bound(self, fn, *args):
+        return fn(*args)
+
+
+@pytest.mark.asyncio
+async def test_import_reports_imported_and_rejected_rows_in_line_order(monkeypatch):
+    monkeypatch.setattr(module.settings, "BCRYPT_ROUNDS", 4)
+    monkeypatch.setattr(module, "HASH_CHUNK_SIZE", 1)
+    loaded = []
+
+    async def import_users(rows, role, created_by):
+        loaded.extend(rows)
+        # b@t.com already has an account
+        return {row[3] for row in rows if row[3] != "b@t.com"}
+
+    monkeypatch.setattr(module, "import_users", import_users)
+    upload = ndjson(user("a@t.com", "pass-a"), user("b@t.com"), "oops", user("c@t.com"))
+    context = FakeContext()
+
+    report = await run_user_import(context, upload, "ndjson", "Ad")
+
+    assert report["rows"] == 4 and report["imported"] == 2 and report["rejected"] == 2
+    assert [(rejection["line"], rejection["reason"]) for rejection in report["rejections"]] == \
+        [(2, "user already exists"), (3, "invalid row: not valid JSON")]
+    assert [row[3] for row in loaded] == ["a@t.com", "b@t.com", "c@t.com"]
+    assert bcrypt.checkpw(b"pass-a", loaded[0][4].encode())
+    assert context.progress[0] == 0 and context.progress == sorted(context.progress)
+
+
+@pytest.mark.asyncio
+async def test_import_without_valid_rows_loads_nothing(monkeypatch):
+    async def import_users(rows, role, created_by):
+        raise AssertionError("nothing to load")
+
+    monkeypatch.setattr(module, "import_users", import_users)
+
+    report = await run_user_import(FakeContext(), ndjson("oops"), "ndjson", "Ad")
+
+    assert report["imported"] == 0 and report["rejected"] == 1
@@ -0,0 +1,124 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from auth import user_snapshot_cache as module
+from auth.user_snapshot_cache import UserSnapshotCache
+
+
+def record(email, roles=("user",), permissions=("read",), updated_on=None):
+    return {
+        "first_name": email.split("@")[0],
+        "email_id": email,
+        "role_list": list(roles),
+        "permission_list": list(permissions),
+        "last_updated_on": updated_on
+    }
+
+
+class FakeAppUser:
+    """app_user rows served through the postgre_manager calls of the cache"""
+
+    def __init__(self, monkeypatch):
+        self.rows = {}
+        self.loads = 0
+        self.delta = []
+        self.load_started = asyncio.Event()
+        self.release_load = None
+        monkeypatch.setattr(module.postgre_manager, "fetch_one", self.fetch_one)
+        monkeypatch.setattr(module.postgre_manager, "fetch_all", self.fetch_all)
+        monkeypatch.setattr(module.postgre_manager, "fetch_value", self.fetch_value)
+
+    async def fetch_one(self, query, values):
+        self.loads += 1
+        self.load_started.set()
+        if self.release_load is not None:
+            await self.release_load.wait()
+        return self.rows.get(values["email"])
+
+    async def fetch_all(self, query, values):
+        return [row for row in self.delta if row["last_updated_on"] > values["since"]]
+
+    async def fetch_value(self, query):
+        return datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def app_user(monkeypatch):
+    return FakeAppUser(monkeypatch)
+
+
+@pytest.mark.asyncio
+async def test_get_loads_once_then_hits(app_user):
+    cache = UserSnapshotCache(max_entries=10, refresh_seconds=60)
+    app_user.rows["a@t.com"] = record("a@t.com", roles=["admin"])
+
+    first = await cache.get("a@t.com")
+    second = await cache.get("a@t.com")
+
+    assert first.roles == ["admin"]
+    assert second is first
+    assert app_user.loads == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_missing_user_is_none_and_not_cached(app_user):
+    cache = UserSnapshotCache(max_entries=10, refresh_seconds=60)
+
+    assert await cache.get("nobody@t.com") is None
+    assert await cache.get("nobody@t.com") is None
+    assert app_user.loads == 2
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_entry_is_evicted(app_user):
+    cache = UserSnapshotCache(max_entries=2, refresh_seconds=60)
+    for email in ("a@t.com", "b@t.com", "c@t.com"):
+        app_user.rows[email] = record(email)
+
+    await cache.get("a@t.com")
+    await cache.get("b@t.com")
+    await cache.get("a@t.com")
+    await cache.get("c@t.com")
+
+    assert cache.evictions == 1
+    assert cache.stats()["size"] == 2
+    await cache.get("b@t.com")
+    assert app_user.loads == 4
+
+
+@pytest.mark.asyncio
+async def test_load_overlapping_an_invalidation_is_not_cached(app_user):
+    cache = UserSnapshotCache(max_entries=10, refresh_seconds=60)
+    app_user.rows["a@t.com"] = record("a@t.com", roles=["user"])
+    app_user.release_load = asyncio.Event()
+
+    loading = asyncio.create_task(cache.get("a@t.com"))
+    await app_user.load_started.wait()
+    app_user.rows["a@t.com"] = record("a@t.com", roles=["admin"])
+    cache.invalidate("a@t.com")
+    app_user.release_load.set()
+    await loading
+
+    app_user.release_load = None
+    assert (await cache.get("a@t.com")).roles == ["admin"]
+    assert app_user.loads == 2
+
+
+@pytest.mark.asyncio
+async def test_refresh_updates_cached_users_only(app_user):
+    cache = UserSnapshotCache(max_entries=10, refresh_seconds=60)
+    app_user.rows["a@t.com"] = record("a@t.com", roles=["user"])
+    await cache.get("a@t.com")
+    await cache.refresh()
+
+    later = datetime(2024, 1, 2)
+    app_user.delta = [
+        record("a@t.com", roles=["admin"], updated_on=later),
+        record("uncached@t.com", updated_on=later + timedelta(seconds=1)),
+    ]
+
+    assert await cache.refresh() == 1
+    assert (await cache.get("a@t.com")).roles == ["admin"]
+    assert cache.stats()["size"] == 1
+    assert cache.stats()["watermark"] == (later + timedelta(seconds=1)).isoformat()
@@ -0,0 +1,334 @@
+import asyncio
+import base64
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, IO, List, Optional, Tuple
+from pymongo.errors import BulkWriteError
+from business_exception import BusinessException
+from models.audit_models import AuditEvent, AuditPage
+from models.status_code import sc
+from mongo_collection_names import CollectionNames
+from .mongo_db_manager import mongodb_manager
+from .mongo_insert_batcher import DUPLICATE_KEY_ERROR_CODE
+from .metrics import metrics_registry
+from .config import settings
+from .logger import logger, request_id
+
+
+class AuditLog:
+    """
+    Append-only trail of administrative changes. record() only appends the event to an
+    in-memory queue, so it adds nothing measurable to the request; a background task writes
+    the queue to the audit collection with insert_many, every flush_interval_ms or as soon as
+    batch_size events wait.
+
+    While MongoDB can't take them, the events are appended to an NDJSON spill file instead
+    of piling up in memory, and written back once a flush succeeds again. Events carry their
+    own _id, so writing one twice (e.g. a replay interrupted by a shutdown) is harmless.
+    Events recorded while max_queue events are queued are spilled by the flush task as well,
+    never by record(); beyond another max_queue of them, events are dropped and counted.
+    Events recorded less than flush_interval_ms ago are not visible to queries yet.
+
+    Every process spills to a file of its own (spill_file with the PID and a random suffix
+    added), flocked as long as the process appends to it. Spill files nobody holds, those of
+    this process set aside for replay and those left by stopped or crashed processes, are
+    claimed with a flock by the first process flushing, so each is written back once.
+    """
+
+    def __init__(self, collection_name: str, flush_interval_ms: int, batch_size: int, max_queue: int, spill_file: str):
+        self.collection_name = collection_name
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self._spill_root, self._spill_extension = os.path.splitext(spill_file)
+        # Set when this process first spills
+        self.spill_file: Optional[str] = None
+        self._spill: Optional[IO[str]] = None
+        self._queue: List[Dict[str, Any]] = []
+        # Events recorded while the queue is full, on their way to the spill file
+        self._overflow: List[Dict[str, Any]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        # Spilling runs in threads and, when the queue is full, on the event loop
+        self._spill_lock = threading.Lock()
+
+        self.recorded = 0
+        self.written = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.failed_writes = 0
+        self.dropped = 0
+        metrics_registry.register("audit_log", self.stats)
+
+    def record(self, action: str, actor: str, target: str, before: Dict[str, Any], after: Dict[str, Any]):
+        """Queues an event for the next write, never waits"""
+        event = {
+            "_id": uuid.uuid4().hex,
+            "occurred_on": datetime.now(timezone.utc),
+            "action": action,
+            "actor": actor,
+            "target": target,
+            "before": before,
+            "after": after,
+            "request_id": request_id.get()
+        }
+        self.recorded += 1
+        if len(self._queue) < self.max_queue:
+            self._queue.append(event)
+            if len(self._queue) >= self.batch_size and self._wakeup is not None:
+                self._wakeup.set()
+            return
+
+        # The writer can't keep up: the flush task spills these to disk, off the event loop
+        if len(self._overflow) < self.max_queue:
+            self._overflow.append(event)
+        else:
+            self.dropped += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Writes the events still queued, or spills them if MongoDB can't take them"""
+        if self._task is not None:
+            # Not cancelled, a batch being written would be lost
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        # Spilled events are left for the next start, of this or another process
+        await self._flush(replay=False)
+        if self._spill is None:
+            return
+        with self._spill_lock:
+            if os.fstat(self._spill.fileno()).st_size == 0:
+                os.remove(self.spill_file)
+            self._spill.close()
+            self._spill = None
+
+    async def page(self, actor: Optional[str], target: Optional[str], action: Optional[str],
+                   cursor: Optional[str], limit: int) -> AuditPage:
+        """Events matching the filters, newest first, limit per page"""
+        query: Dict[str, Any] = {
+            field: value for field, value in (("actor", actor), ("target", target), ("action", action)) if value is not None
+        }
+        if cursor:
+            occurred_on, event_id = self._decode_cursor(cursor)
+            query["$or"] = [
+                {"occurred_on": {"$lt": occurred_on}},
+                {"occurred_on": occurred_on, "_id": {"$lt": event_id}}
+            ]
+
+        collection = mongodb_manager.get_collection(self.collection_name)
+        # One extra event tells whether there is a next page
+        documents = await collection.find(query).sort([("occurred_on", -1), ("_id", -1)]).limit(limit + 1).to_list(limit + 1)
+        events = [self._to_event(document) for document in documents[:limit]]
+        next_cursor = self._encode_cursor(events[-1].occurredOn, events[-1].id) if len(documents) > limit else None
+        return AuditPage(events=events, nextCursor=next_cursor)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": len(self._queue),
+            "overflow": len(self._overflow),
+            "recorded": self.recorded,
+            "written": self.written,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "failed_writes": self.failed_writes,
+            "dropped": self.dropped,
+            "spill_pending": any(self._has_events(path) for path in self._spilled_files())
+        }
+
+    async def _flush_loop(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self._flush()
+            except Exception as e:
+                logger.error(f"Failed to flush audit events: {str(e)}", exc_info=True)
+
+    async def _flush(self, replay: bool = True):
+        if self._overflow:
+            overflow, self._overflow = self._overflow, []
+            await asyncio.to_thread(self._append_spilled, overflow)
+        while self._queue:
+            batch, self._queue = self._queue[:self.batch_size], self._queue[self.batch_size:]
+            if not await self._write(batch):
+                pending, self._queue = batch + self._queue, []
+                await asyncio.to_thread(self._append_spilled, pending)
+                return
+        if replay:
+            await self._replay()
+
+    async def _write(self, events: List[Dict[str, Any]]) -> bool:
+        try:
+            await mongodb_manager.get_collection(self.collection_name).insert_many(events, ordered=False)
+        except BulkWriteError as e:
+            # Events written by an earlier attempt are fine, anything else is not
+            if any(error.get("code") != DUPLICATE_KEY_ERROR_CODE for error in e.details.get("writeErrors", [])):
+                self.failed_writes += 1
+                logger.error(f"Failed to write {len(events)} audit events: {str(e)}")
+                return False
+        except Exception as e:
+            self.failed_writes += 1
+            logger.warning(f"Failed to write {len(events)} audit events, they are kept on disk: {str(e)}")
+            return False
+        self.written += len(events)
+        return True
+
+    def _open_spill_file(self):
+        self.spill_file = f"{self._spill_root}.{os.getpid()}-{uuid.uuid4().hex[:8]}{self._spill_extension}"
+        os.makedirs(os.path.dirname(self.spill_file) or ".", exist_ok=True)
+        self._spill = open(self.spill_file, "a", encoding="utf-8")
+        # Held until the file is set aside or the process stops, other processes leave it alone meanwhile
+        fcntl.flock(self._spill.fileno(), fcntl.LOCK_EX)
+
+    def _append_spilled(self, events: List[Dict[str, Any]]):
+        lines = "".join(json.dumps({**event, "occurred_on": event["occurred_on"].isoformat()}) + "\n" for event in events)
+        with self._spill_lock:
+            if self._spill is None:
+                self._open_spill_file()
+            self._spill.write(lines)
+            self._spill.flush()
+        self.spilled += len(events)
+
+    def _spilled_files(self) -> List[str]:
+        """Spill files of every process, and the files set aside for replay"""
+        pattern = f"{glob.escape(self._spill_root)}.*{glob.escape(self._spill_extension)}"
+        return sorted(glob.glob(pattern) + glob.glob(f"{pattern}.*.replay"))
+
+    @staticmethod
+    def _has_events(path: str) -> bool:
+        try:
+            return os.path.getsize(path) > 0
+        except FileNotFoundError:
+            return False
+
+    def _set_aside_spilled(self):
+        """Moves the events this process spilled to a replay file, which any process may claim"""
+        with self._spill_lock:
+            if self._spill is None or os.fstat(self._spill.fileno()).st_size == 0:
+                return
+            os.replace(self.spill_file, f"{self.spill_file}.{time.time_ns()}.replay")
+            # Releases the flock of the file set aside, the next spill opens a new one
+            self._spill.close()
+            self._spill = None
+
+    async def _replay(self):
+        """Writes back the spilled events of the files no process holds"""
+        await asyncio.to_thread(self._set_aside_spilled)
+        for path in await asyncio.to_thread(self._spilled_files):
+            spilled = await asyncio.to_thread(self._claim, path)
+            if spilled is None:
+                continue
+            try:
+                if not await self._replay_file(spilled):
+                    # Retried from the start on the next flush
+                    return
+                os.remove(path)
+            finally:
+                spilled.close()
+            logger.info(f"Wrote back spilled audit events, {self.replayed} so far")
+
+    @staticmethod
+    def _claim(path: str) -> Optional[IO[str]]:
+        """The file opened and flocked, or None when a process holds it or it is already written back"""
+        try:
+            spilled = open(path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(spilled.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            spilled.close()
+            return None
+        try:
+            current = os.path.samestat(os.stat(path), os.fstat(spilled.fileno()))
+        except FileNotFoundError:
+            current = False
+        if not current:
+            # Written back and removed, or set aside by its process, since it was opened
+            spilled.close()
+            return None
+        return spilled
+
+    async def _replay_file(self, spilled: IO[str]) -> bool:
+        offset = 0
+        while True:
+            events, offset = await asyncio.to_thread(self._read_spilled, spilled, offset)
+            if not events:
+                return True
+            if not await self._write(events):
+                return False
+            self.replayed += len(events)
+
+    def _read_spilled(self, spilled: IO[str], offset: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Up to batch_size events of a spill file from offset, and the offset after them"""
+        events = []
+        spilled.seek(offset)
+        while len(events) < self.batch_size:
+            line = spilled.readline()
+            if not line:
+                break
+            if not line.endswith("\n"):
+                # Torn last line of a crash while spilling
+                logger.warning("Skipping an incomplete spilled audit event")
+                break
+            event = json.loads(line)
+            event["occurred_on"] = datetime.fromisoformat(event["occurred_on"])
+            events.append(event)
+        return events, spilled.tell()
+
+    @staticmethod
+    def _to_event(document: Dict[str, Any]) -> AuditEvent:
+        return AuditEvent(
+            id=document["_id"],
+            # MongoDB gives back naive UTC datetimes
+            occurredOn=document["occurred_on"].replace(tzinfo=timezone.utc).isoformat(),
+            action=document["action"],
+            actor=document["actor"],
+            target=document["target"],
+            before=document.get("before") or {},
+            after=document.get("after") or {},
+            requestId=document.get("request_id")
+        )
+
+    @staticmethod
+    def _encode_cursor(occurred_on: str, event_id: str) -> str:
+        return base64.urlsafe_b64encode(json.dumps([occurred_on, event_id]).encode("utf-8")).decode("utf-8")
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+        try:
+            occurred_on, event_id = json.loads(base64.urlsafe_b64decode(cursor.encode("utf-8")))
+            return datetime.fromisoformat(occurred_on), event_id
+        except Exception as error:
+            raise BusinessException(
+                message="Invalid cursor",
+                error_code=sc.VALIDATION_ERROR,
+                original_exception=error
+            )
+
+
+# Global instance
+audit_log = AuditLog(
+    collection_name=CollectionNames.AUDIT_EVENT,
+    flush_interval_ms=settings.AUDIT_FLUSH_INTERVAL_MS,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    max_queue=settings.AUDIT_MAX_QUEUE,
+    spill_file=settings.AUDIT_SPILL_FILE
+)
@@ -0,0 +1,27 @@
+import os
+import tempfile
+from typing import Any, Union
+from .config import settings
+from .shared_memory_cache import SharedMemoryCache
+from .ttl_cache import TTLCache
+
+
+def create_cache(name: str, max_entries: int, ttl_seconds: float, negative_ttl_seconds: float,
+                 value_type: Any = Any) -> Union[TTLCache, SharedMemoryCache]:
+    """
+    Cache of the backend chosen by CACHE_BACKEND: "memory" keeps the entries in each worker,
+    "shared" in a memory-mapped segment shared by the workers of the machine. Values of a
+    shared cache must be serializable as value_type (a pydantic model, or JSON compatible).
+    """
+    if settings.CACHE_BACKEND == "shared":
+        return SharedMemoryCache(
+            name=name,
+            max_entries=max_entries,
+            ttl_seconds=ttl_seconds,
+            negative_ttl_seconds=negative_ttl_seconds,
+            directory=settings.SHARED_CACHE_DIR if os.path.isdir(settings.SHARED_CACHE_DIR) else tempfile.gettempdir(),
+            namespace=str(settings.APP_PORT),
+            slot_bytes=settings.SHARED_CACHE_SLOT_BYTES,
+            value_type=value_type
+        )
+    return TTLCache(name=name, max_entries=max_entries, ttl_seconds=ttl_seconds, negative_ttl_seconds=negative_ttl_seconds)
@@ -0,0 +1,192 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, TypeVar
+from business_exception import BusinessException
+from models.status_code import sc
+from .metrics import metrics_registry
+from .config import settings
+from .logger import logger
+
+T = TypeVar('T')
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Guards the calls to one data source. Calls are counted in one second buckets over a
+    rolling window; once the window holds minimum_calls and the ratio of failed calls or of
+    calls slower than slow_call_seconds reaches its threshold, the circuit opens and calls
+    fail fast with DB_CONNECTION_ERROR for open_seconds. After that it is half open: up to
+    half_open_probes calls go through, the circuit closes when all of them succeed and opens
+    again on the first failure.
+
+    Only failures of the data source count (timeouts and those matched by is_failure),
+    errors caused by the request itself (e.g. a duplicate key) don't.
+    """
+
+    def __init__(self, name: str, window_seconds: int, minimum_calls: int, failure_ratio: float,
+                 slow_call_seconds: float, slow_call_ratio: float, open_seconds: float, half_open_probes: int):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.minimum_calls = minimum_calls
+        self.failure_ratio = failure_ratio
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_ratio = slow_call_ratio
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        # [second, calls, failures, slow calls]
+        self._buckets: Deque[List[int]] = deque()
+
+        self.opened = 0
+        self.rejected = 0
+        self.timeouts = 0
+        metrics_registry.register(f"circuit_breaker.{name}", self.stats)
+
+    async def call(self, operation: Callable[[], Awaitable[T]], timeout: Optional[float],
+                   is_failure: Callable[[BaseException], bool]) -> T:
+        """
+        Runs operation with a deadline of timeout seconds (None for no deadline).
+        Timeouts and failures of the data source are raised as BusinessException with DB_CONNECTION_ERROR.
+        """
+        probe = self._acquire()
+        started = time.monotonic()
+        try:
+            async with asyncio.timeout(timeout):
+                result = await operation()
+        except TimeoutError as e:
+            self.timeouts += 1
+            self._record(time.monotonic() - started, failed=True, probe=probe)
+            raise BusinessException(
+                message=f"{self.name} operation timed out after {timeout}s",
+                error_code=sc.DB_CONNECTION_ERROR
+            ) from e
+        except asyncio.CancelledError:
+            # The caller went away, that says nothing about the data source
+            if probe:
+                self._probes_in_flight -= 1
+            raise
+        except Exception as e:
+            if not is_failure(e):
+                self._record(time.monotonic() - started, failed=False, probe=probe)
+                raise
+            self._record(time.monotonic() - started, failed=True, probe=probe)
+            raise BusinessException(
+                message=f"{self.name} is not reachable: {str(e)}",
+                error_code=sc.DB_CONNECTION_ERROR
+            ) from e
+
+        self._record(time.monotonic() - started, failed=False, probe=probe)
+        return result
+
+    def check(self):
+        """Fails fast while the circuit is open, for calls whose outcome is not recorded"""
+        if self.state == OPEN and time.monotonic() - self._opened_at < self.open_seconds:
+            self._reject()
+
+    def _acquire(self) -> bool:
+        """Lets a call through or rejects it. Returns True when the call is a half open probe."""
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                self._reject()
+            self.state = HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+            logger.info(f"Circuit of {self.name} half open, probing")
+
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight + self._probe_successes >= self.half_open_probes:
+                self._reject()
+            self._probes_in_flight += 1
+            return True
+        return False
+
+    def _reject(self):
+        self.rejected += 1
+        raise BusinessException(
+            message=f"{self.name} is unavailable, try again later",
+            error_code=sc.DB_CONNECTION_ERROR
+        )
+
+    def _record(self, latency: float, failed: bool, probe: bool):
+        slow = latency >= self.slow_call_seconds
+        if probe:
+            self._probes_in_flight -= 1
+            if failed or slow:
+                self._open(f"probe {'failed' if failed else f'took {latency:.2f}s'}")
+            else:
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes and self.state == HALF_OPEN:
+                    self.state = CLOSED
+                    self._buckets.clear()
+                    logger.info(f"Circuit of {self.name} closed")
+            return
+
+        now = int(time.monotonic())
+        if not self._buckets or self._buckets[-1][0] != now:
+            self._buckets.append([now, 0, 0, 0])
+        bucket = self._buckets[-1]
+        bucket[1] += 1
+        bucket[2] += failed
+        bucket[3] += slow
+
+        if self.state == CLOSED and (failed or slow):
+            calls, failures, slow_calls = self._window()
+            if calls >= self.minimum_calls:
+                if failures / calls >= self.failure_ratio:
+                    self._open(f"{failures}/{calls} calls failed")
+                elif slow_calls / calls >= self.slow_call_ratio:
+                    self._open(f"{slow_calls}/{calls} calls took {self.slow_call_seconds}s or more")
+
+    def _window(self):
+        horizon = int(time.monotonic()) - self.window_seconds
+        while self._buckets and self._buckets[0][0] <= horizon:
+            self._buckets.popleft()
+        calls = failures = slow_calls = 0
+        for _, bucket_calls, bucket_failures, bucket_slow in self._buckets:
+            calls += bucket_calls
+            failures += bucket_failures
+            slow_calls += bucket_slow
+        return calls, failures, slow_calls
+
+    def _open(self, reason: str):
+        if self.state != OPEN:
+            self.opened += 1
+            logger.error(f"Circuit of {self.name} opened for {self.open_seconds}s: {reason}")
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._buckets.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        calls, failures, slow_calls = self._window()
+        return {
+            "state": self.state,
+            "window_calls": calls,
+            "window_failures": failures,
+            "window_slow_calls": slow_calls,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts
+        }
+
+
+def data_source_circuit_breaker(name: str) -> CircuitBreaker:
+    """Circuit breaker of a data source manager, configured from settings"""
+    return CircuitBreaker(
+        name=name,
+        window_seconds=settings.CIRCUIT_WINDOW_SECONDS,
+        minimum_calls=settings.CIRCUIT_MINIMUM_CALLS,
+        failure_ratio=settings.CIRCUIT_FAILURE_RATIO,
+        slow_call_seconds=settings.CIRCUIT_SLOW_CALL_SECONDS,
+        slow_call_ratio=settings.CIRCUIT_SLOW_CALL_RATIO,
+        open_seconds=settings.CIRCUIT_OPEN_SECONDS,
+        half_open_probes=settings.CIRCUIT_HALF_OPEN_PROBES
+    )
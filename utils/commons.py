@@ -1,6 +1,6 @@
 from fastapi.responses import JSONResponse,Response
 from models.api_responses import SuccessResponse,ErrorResponse
-from typing import Union
+from typing import Union, Optional, List
 from models.status_code import sc
 
 def to_json_response(result: Union[SuccessResponse, ErrorResponse]) -> Union[JSONResponse | Response]:
@@ -12,3 +12,8 @@ def to_json_response(result: Union[SuccessResponse, ErrorResponse]) -> Union[JSO
           content=result.model_dump(exclude_none=True),
           status_code=result.status_code)
 
+def split_comma_separated(value: Optional[str]) -> List[str]:
+  """Splits a comma separated string into a list of trimmed, non-empty items"""
+  if not value or value.strip() == '':
+    return []
+  return [item.strip() for item in value.split(',') if item.strip()]
@@ -0,0 +1,163 @@
+import asyncio
+import zlib
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# zlib window bits selecting the container format of each supported content coding
+WBITS = {"gzip": 16 + zlib.MAX_WBITS, "deflate": zlib.MAX_WBITS}
+
+# Codings preferred on equal quality, in order
+PREFERENCE = ("gzip", "deflate")
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Picks the supported content coding the client prefers, None if it accepts none of them"""
+    if not accept_encoding:
+        return None
+
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding] = quality
+
+    candidates = [
+        (qualities.get(coding, qualities.get("*", 0.0)), -rank, coding)
+        for rank, coding in enumerate(PREFERENCE)
+    ]
+    quality, _, coding = max(candidates)
+    return coding if quality > 0 else None
+
+
+def _weaken_etag(headers: MutableHeaders):
+    """
+    The identity and the compressed representations of a response share its ETag, which
+    is then only a weak validator (RFC 9110 8.8.1): If-None-Match uses the weak comparison
+    anyway, so 304s keep working
+    """
+    etag = headers.get("etag")
+    if etag is not None and not etag.startswith("W/"):
+        headers["ETag"] = f"W/{etag}"
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with the content coding negotiated from Accept-Encoding.
+
+    Bodies smaller than minimum_size are sent as is. Streaming responses are compressed
+    chunk by chunk, flushing after every chunk, so nothing is buffered. Compressing a body
+    or chunk of offload_size bytes or more runs in a thread (zlib releases the GIL) instead
+    of blocking the event loop.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, compress_level: int = 6, offload_size: int = 256 * 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compress_level = compress_level
+        self.offload_size = offload_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self._start_message: Optional[Message] = None
+        self._compressor = None
+        self._passthrough = False
+
+    async def send(self, message: Message):
+        message_type = message["type"]
+
+        if message_type == "http.response.start":
+            self._start_message = message
+            headers = Headers(raw=message["headers"])
+            if "content-encoding" in headers or message["status"] in (204, 304):
+                self._passthrough = True
+                if message["status"] == 304 and "content-encoding" not in headers:
+                    # Names the compressed representation the client has, as the 200 would
+                    _weaken_etag(MutableHeaders(scope=message))
+            return
+
+        if message_type != "http.response.body" or self._passthrough:
+            await self._flush_start()
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self._compressor is None:
+            if not more_body:
+                await self._send_whole(body)
+                return
+            self._start_stream()
+            await self._flush_start()
+
+        compressed = await self._compress(body, final=not more_body)
+        await self._send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+    async def _send_whole(self, body: bytes):
+        if len(body) < self.middleware.minimum_size:
+            await self._flush_start()
+            await self._send({"type": "http.response.body", "body": body})
+            return
+
+        self._compressor = self._new_compressor()
+        compressed = await self._compress(body, final=True)
+        headers = self._compressed_headers()
+        headers["Content-Length"] = str(len(compressed))
+        await self._flush_start()
+        await self._send({"type": "http.response.body", "body": compressed})
+
+    def _start_stream(self):
+        self._compressor = self._new_compressor()
+        headers = self._compressed_headers()
+        if "content-length" in headers:
+            del headers["content-length"]
+
+    async def _compress(self, body: bytes, final: bool) -> bytes:
+        if len(body) >= self.middleware.offload_size:
+            return await asyncio.to_thread(self._compress_sync, body, final)
+        return self._compress_sync(body, final)
+
+    def _compress_sync(self, body: bytes, final: bool) -> bytes:
+        data = self._compressor.compress(body)
+        # Sync flush hands every chunk to the client as soon as it is produced
+        return data + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+    def _new_compressor(self):
+        return zlib.compressobj(self.middleware.compress_level, zlib.DEFLATED, WBITS[self.encoding])
+
+    def _compressed_headers(self) -> MutableHeaders:
+        headers = MutableHeaders(scope=self._start_message)
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        _weaken_etag(headers)
+        return headers
+
+    async def _flush_start(self):
+        if self._start_message is not None:
+            await self._send(self._start_message)
+            self._start_message = None
@@ -0,0 +1,59 @@
+import hashlib
+from typing import Any, Optional
+from fastapi import Request
+from fastapi.responses import Response
+from models.api_responses import SuccessResponse
+from models.status_code import sc
+from .commons import to_json_response
+
+# Clients may keep the response but must revalidate it on every use
+REVALIDATE_PRIVATE = "private, no-cache"
+REVALIDATE_PUBLIC = "no-cache"
+
+
+def make_etag(*version_parts: Any) -> str:
+  """Strong ETag derived from a cheap version key, e.g. a token and a snapshot version"""
+  digest = hashlib.sha256("\x1f".join(str(part) for part in version_parts).encode('utf-8')).hexdigest()
+  return f'"{digest[:32]}"'
+
+def content_etag(body: bytes) -> str:
+  """Strong ETag derived from the serialized response"""
+  return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+def is_not_modified(request: Request, etag: str) -> bool:
+  """True if the client's If-None-Match already names the given ETag"""
+  if_none_match = request.headers.get("if-none-match")
+  if not if_none_match:
+    return False
+  if if_none_match.strip() == "*":
+    return True
+  # If-None-Match uses the weak comparison
+  candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+  return etag in candidates
+
+def not_modified_response(etag: str, cache_control: str) -> Response:
+  return Response(status_code=sc.NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": cache_control})
+
+def to_conditional_json_response(
+  request: Request,
+  result: SuccessResponse,
+  cache_control: str,
+  etag: Optional[str] = None
+) -> Response:
+  """
+  Like to_json_response, with an ETag and Cache-Control. Without a version based etag,
+  the ETag is derived from the serialized body, which saves bandwidth but not the work.
+  Routes that have a version key should check is_not_modified before building the result.
+  """
+  if etag is not None and is_not_modified(request, etag):
+    return not_modified_response(etag, cache_control)
+
+  response = to_json_response(result)
+  if etag is None:
+    etag = content_etag(response.body)
+    if is_not_modified(request, etag):
+      return not_modified_response(etag, cache_control)
+
+  response.headers["ETag"] = etag
+  response.headers["Cache-Control"] = cache_control
+  return response
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from pydantic import Field
+from typing import Optional, Literal
 import os
 from pathlib import Path
 
@@ -12,15 +13,74 @@ class Settings(BaseSettings):
   MONGO_USER: str
   MONGO_PASSWORD: str
   MONGODB_DATABASE: str
+  USER_PROFILE_WRITE_BATCHING: bool = False  # group concurrent user_profile inserts into insert_many
+  WRITE_BATCH_MAX_DELAY_MS: int = 5  # how long an insert may wait for others to join its batch
+  WRITE_BATCH_MAX_SIZE: int = 500
+  CACHE_BACKEND: Literal["memory", "shared"] = "memory"  # shared: one memory-mapped cache for all workers of the machine
+  SHARED_CACHE_DIR: str = "/dev/shm"  # where shared cache segments live, falls back to the temp dir
+  SHARED_CACHE_SLOT_BYTES: int = 1024  # size of a shared cache entry, larger values are not cached
+  USER_PROFILE_CACHE_MAX_ENTRIES: int = 10000  # user profiles kept in memory for lookups by email
+  USER_PROFILE_CACHE_TTL_SECONDS: int = 60  # how long a cached profile is served
+  USER_PROFILE_CACHE_NEGATIVE_TTL_SECONDS: int = 10  # how long "no such profile" is served
+  ANALYTICS_CACHE_TTL_SECONDS: int = 300  # how long computed user profile analytics are served
+  ANALYTICS_CHUNK_SIZE: int = 5000  # profiles read per round trip when streaming weights for percentiles
+  ANALYTICS_QUERY_TIMEOUT_SECONDS: float = 30.0  # deadline of an analytics pipeline or chunk read
   POSTGRE_HOST: str = "localhost"
   POSTGRE_PORT: int
   POSTGRE_USER: str
   POSTGRE_PASSWORD: str
   POSTGRE_DATABASE: str
+  POSTGRE_AUTO_MIGRATE: bool = True  # apply pending transactional schema migrations on startup
+  POSTGRE_STARTUP_MIGRATION_TIMEOUT_SECONDS: float = 60.0  # startup fails when its migrations take longer
+  POSTGRE_OPERATION_TIMEOUT_SECONDS: float = 5.0  # deadline of a Postgre query unless the caller passes its own
+  MONGO_OPERATION_TIMEOUT_SECONDS: float = 5.0  # deadline of a MongoDB operation unless the caller passes its own
+  CIRCUIT_WINDOW_SECONDS: int = 30  # rolling window of the data source circuit breakers
+  CIRCUIT_MINIMUM_CALLS: int = 20  # calls in the window before a circuit may open
+  CIRCUIT_FAILURE_RATIO: float = 0.5  # ratio of failed calls that opens a circuit
+  CIRCUIT_SLOW_CALL_SECONDS: float = 2.0  # calls this slow count as slow
+  CIRCUIT_SLOW_CALL_RATIO: float = 0.8  # ratio of slow calls that opens a circuit
+  CIRCUIT_OPEN_SECONDS: float = 15.0  # how long an open circuit fails fast before probing
+  CIRCUIT_HALF_OPEN_PROBES: int = 3  # successful probes that close a half open circuit
+  TRACE_EXPORTER: Literal["none", "stdout", "file"] = "file"  # where the spans of sampled requests are written as JSON lines
+  TRACE_SAMPLE_RATE: float = 0.01  # share of the requests traced
+  TRACE_FILE: str = "logs/traces.jsonl"
+  SLOW_QUERY_THRESHOLD_MS: int = 500  # database operations this slow are logged
+  QUERY_STATS_WINDOW_MINUTES: int = 15  # rolling window of the per query statistics
+  QUERY_STATS_MAX_FINGERPRINTS: int = 1000  # distinct queries tracked, the least recently seen are dropped
   JWT_SECRET_KEY: str
   JWT_EXPIRATION: int = 86400000  # Default 24 hours in milliseconds
+  VERIFIED_TOKEN_CACHE_MAX_ENTRIES: int = 50000  # tokens whose verified claims are kept, by digest
+  VERIFIED_TOKEN_CACHE_TTL_SECONDS: int = 300  # how long a verification is reused, never past the token expiry
+  INTROSPECTION_MAX_TOKENS: int = 100  # tokens in one introspection request
+  BCRYPT_ROUNDS: int = Field(12, ge=4, le=31)  # cost factor of new password hashes (bcrypt takes 4 to 31), see python -m auth.bcrypt_calibration
+  USER_IMPORT_MAX_ROWS: int = 200000  # rows accepted in one bulk user import
+  USER_IMPORT_LOAD_TIMEOUT_SECONDS: float = 300.0  # deadline of the COPY and of the merge into app_user of a user import
   ALLOWED_ROLES: str
   ALLOWED_PERMISSIONS: str
+  LOOP_MONITOR_ENABLED: bool = True  # measure event loop lag and capture the stacks of blocking code
+  LOOP_MONITOR_INTERVAL_MS: int = 100  # how often the loop lag is sampled
+  LOOP_BLOCKING_THRESHOLD_MS: int = 200  # a loop stuck this long has the stack of the blocking code captured
+  MEMORY_ROUTE_SAMPLE_RATE: float = 0.1  # share of the requests whose allocations are measured while tracemalloc runs, 0 disables
+  LOAD_SHEDDING_ENABLED: bool = True  # reject requests beyond the concurrency limits below instead of queueing them
+  MAX_CONCURRENT_REQUESTS: int = 256  # in flight across auth, user and admin routes, lower priority groups are shed first
+  AUTH_CONCURRENCY_LIMIT: int = 128
+  USER_CONCURRENCY_LIMIT: int = 128  # user routes, jobs and anything not in another group
+  ADMIN_CONCURRENCY_LIMIT: int = 16
+  HEALTH_CONCURRENCY_LIMIT: int = 16  # reserved for health probes, on top of MAX_CONCURRENT_REQUESTS
+  ERROR_STACK_TRACES_PER_MINUTE: int = 10  # stack traces logged for unexpected errors, the rest are logged on one line
+  COMPRESSION_MINIMUM_SIZE: int = 1024  # responses smaller than this (bytes) are not compressed
+  COMPRESSION_LEVEL: int = 6  # zlib level 1 (fastest) - 9 (smallest)
+  COMPRESSION_OFFLOAD_SIZE: int = 262144  # bodies or chunks this large are compressed off the event loop
+  USER_CACHE_MAX_ENTRIES: int = 10000  # users whose roles/permissions are kept in memory
+  USER_CACHE_REFRESH_SECONDS: int = 30  # interval of the delta refresh against app_user
+  AUDIT_FLUSH_INTERVAL_MS: int = 1000  # how long an audit event may wait in memory before being written
+  AUDIT_BATCH_SIZE: int = 500  # audit events written per insert_many
+  AUDIT_MAX_QUEUE: int = 10000  # audit events held in memory, beyond that they go to the spill file directly
+  AUDIT_SPILL_FILE: str = "logs/audit-spill.ndjson"  # audit events MongoDB could not take, written back once it recovers (one file per process, PID added to the name)
+  JOB_WORKERS: int = 4  # background jobs running concurrently on the event loop
+  JOB_QUEUE_SIZE: int = 100  # submitted jobs waiting for a worker, beyond that submissions are rejected
+  JOB_PROCESS_WORKERS: int = os.cpu_count() or 1  # processes for CPU bound job steps (one per core), 0 runs them in threads instead
+  JOB_SHUTDOWN_TIMEOUT_SECONDS: int = 30  # how long shutdown waits for queued and running jobs
 
   model_config = {"env_file": ".env"}
   
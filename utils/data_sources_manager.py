@@ -1,7 +1,10 @@
 from .mongo_db_manager import mongodb_manager
 from .postgre_db_manager import postgre_manager
 from .logger import logger
-from typing import Dict, Any
+from .config import settings
+from .postgre_migration_runner import Migration, MigrationRunner
+import asyncio
+from typing import Dict, Any, List, Optional
 
 class DataSourcesManager:
     """
@@ -12,9 +15,10 @@ class DataSourcesManager:
         self.postgresql = postgre_manager
         self.is_connected = False
 
-    async def connect_all(self):
+    async def connect_all(self, migrations: Optional[List[Migration]] = None):
         """
-        Connect to both MongoDB and PostgreSQL databases
+        Connect to both MongoDB and PostgreSQL databases, and apply the pending transactional
+        Postgre migrations when given some
         """
         try:
             logger.info("Initializing database connections...")
@@ -24,6 +28,10 @@ class DataSourcesManager:
 
             # Connect to PostgreSQL
             await self.postgresql.connect()
+            if migrations:
+                # Startup must not wait on a long schema change, the deadline fails it instead
+                async with asyncio.timeout(settings.POSTGRE_STARTUP_MIGRATION_TIMEOUT_SECONDS):
+                    await MigrationRunner(self.postgresql, migrations).migrate(transactional_only=True)
 
             self.is_connected = True
             logger.info("All database connections established successfully")
@@ -58,17 +66,24 @@ class DataSourcesManager:
         """
         mongodb_status = await self.mongodb.health_check()
         postgresql_status = await self.postgresql.health_check()
+        mongodb_indexes = await self.mongodb.index_report()
+        mongodb_circuit = self.mongodb.circuit_breaker.stats()
+        postgresql_circuit = self.postgresql.circuit_breaker.stats()
+        circuits_closed = mongodb_circuit["state"] == "closed" and postgresql_circuit["state"] == "closed"
 
         return {
             "mongodb": {
                 "status": "healthy" if mongodb_status else "unhealthy",
-                "connected": mongodb_status
+                "connected": mongodb_status,
+                "indexes": mongodb_indexes,
+                "circuit": mongodb_circuit
             },
             "postgresql": {
                 "status": "healthy" if postgresql_status else "unhealthy",
-                "connected": postgresql_status
+                "connected": postgresql_status,
+                "circuit": postgresql_circuit
             },
-            "overall_status": "healthy" if (mongodb_status and postgresql_status) else "degraded"
+            "overall_status": "healthy" if (mongodb_status and postgresql_status and circuits_closed) else "degraded"
         }
 
 #global instance
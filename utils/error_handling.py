@@ -0,0 +1,85 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from fastapi.responses import JSONResponse, Response
+from models.api_responses import ErrorResponse
+from .config import settings
+from .logger import logger
+from .metrics import metrics_registry
+
+
+class StackTraceSampler:
+    """
+    Rate limits stack traces of unexpected errors to max_per_interval per interval_seconds.
+    Errors beyond the limit are still logged, on one line without the stack.
+    """
+
+    def __init__(self, max_per_interval: int, interval_seconds: float = 60.0):
+        self.max_per_interval = max_per_interval
+        self.interval_seconds = interval_seconds
+        self._interval_start = 0.0
+        self._logged = 0
+        self.suppressed = 0
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if now - self._interval_start >= self.interval_seconds:
+            self._interval_start = now
+            self._logged = 0
+        if self._logged < self.max_per_interval:
+            self._logged += 1
+            return True
+        self.suppressed += 1
+        return False
+
+    def log_unexpected(self, message: str, exc: BaseException):
+        if self.allow():
+            logger.error(message, exc_info=exc)
+        else:
+            logger.error(f"{message}: {exc!r} (stack trace sampled out, {self.suppressed} suppressed so far)")
+
+
+class ErrorBodyCache:
+    """
+    Serialized bodies of error responses without details, keyed by status code and message.
+    Routine errors like "Invalid credentials" are serialized once instead of on every failure.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._bodies: "OrderedDict[Tuple[int, str], bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, status_code: int, error: str) -> bytes:
+        key = (status_code, error)
+        body = self._bodies.get(key)
+        if body is not None:
+            self._bodies.move_to_end(key)
+            self.hits += 1
+            return body
+
+        self.misses += 1
+        body = JSONResponse(content=ErrorResponse(error=error, status_code=status_code).model_dump(exclude_none=True)).body
+        self._bodies[key] = body
+        if len(self._bodies) > self.max_entries:
+            self._bodies.popitem(last=False)
+        return body
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._bodies), "hits": self.hits, "misses": self.misses}
+
+
+def to_error_response(error: str, status_code: int, details: Optional[Any] = None) -> Response:
+    """Error response in the ErrorResponse format, prebuilt when there are no details"""
+    if details is not None:
+        error_response = ErrorResponse(error=error, status_code=status_code, details=details)
+        return JSONResponse(status_code=status_code, content=error_response.model_dump(exclude_none=True))
+    return Response(content=error_body_cache.get(status_code, error), status_code=status_code, media_type="application/json")
+
+
+# Global instances
+stack_trace_sampler = StackTraceSampler(max_per_interval=settings.ERROR_STACK_TRACES_PER_MINUTE)
+error_body_cache = ErrorBodyCache()
+metrics_registry.register("error_body_cache", error_body_cache.stats)
+metrics_registry.register("stack_trace_sampler", lambda: {"suppressed": stack_trace_sampler.suppressed})
@@ -0,0 +1,246 @@
+import asyncio
+import multiprocessing
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from business_exception import BusinessException
+from models.api_responses import SuccessResponse
+from models.job_models import JobStatus, JobSubmission
+from models.status_code import sc
+from mongo_collection_names import CollectionNames
+from .mongo_db_manager import mongodb_manager
+from .metrics import metrics_registry
+from .config import settings
+from .logger import logger
+
+
+class JobContext:
+    """Handed to a running job to report progress and offload CPU bound work"""
+
+    def __init__(self, runner: "JobRunner", job_id: str):
+        self.runner = runner
+        self.job_id = job_id
+
+    async def report_progress(self, progress: float, message: Optional[str] = None):
+        await self.runner._update(self.job_id, {"progress": round(min(max(progress, 0), 100), 2), "message": message})
+
+    async def run_cpu_bound(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return await self.runner.run_cpu_bound(fn, *args)
+
+
+JobFunction = Callable[[JobContext], Awaitable[Any]]
+
+
+class JobRunner:
+    """
+    Runs submitted jobs in the background on a bounded pool of asyncio workers.
+    The state of every job is recorded in the job collection, so it can be polled
+    through the job status endpoint, also from another instance.
+    CPU bound steps run in an optional process pool, so they don't block the event loop.
+    """
+
+    def __init__(self, workers: int, queue_size: int, process_workers: int, shutdown_timeout: int):
+        self.workers = workers
+        self.process_workers = process_workers
+        self.shutdown_timeout = shutdown_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._queue_size = queue_size
+        self._worker_tasks: List[asyncio.Task] = []
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._accepting = False
+        # Queue slots taken by submits still recording their job
+        self._reserved = 0
+
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.running = 0
+        metrics_registry.register("job_runner", self.stats)
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        if self.process_workers > 0:
+            # Spawned rather than forked, the children must not inherit the threads and locks of the running app
+            self._process_pool = ProcessPoolExecutor(max_workers=self.process_workers, mp_context=multiprocessing.get_context("spawn"))
+        self._worker_tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._accepting = True
+        logger.info(f"Job runner started with {self.workers} workers and {self.process_workers} processes")
+
+    async def stop(self):
+        """Stops accepting jobs and waits up to shutdown_timeout for queued and running jobs"""
+        if not self._accepting:
+            return
+        self._accepting = False
+        logger.info("Draining background jobs...")
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Background jobs still running after {self.shutdown_timeout}s, cancelling them")
+
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+        # Jobs that never got a worker
+        while not self._queue.empty():
+            job_id, _ = self._queue.get_nowait()
+            await self._finish(job_id, "cancelled", error="Application shut down before the job started")
+
+        if self._process_pool:
+            self._process_pool.shutdown(wait=True, cancel_futures=True)
+            self._process_pool = None
+        logger.info("Job runner stopped")
+
+    async def submit(self, job_type: str, fn: JobFunction, submitted_by: str) -> str:
+        """Records a new job and queues it. Returns the job id."""
+        if not self._accepting:
+            raise BusinessException(
+                message="Background jobs are not accepted at the moment",
+                error_code=sc.SERVICE_UNAVAILABLE
+            )
+        if self._queue.qsize() + self._reserved >= self._queue_size:
+            raise BusinessException(
+                message="Too many background jobs are queued, try again later",
+                error_code=sc.SERVICE_UNAVAILABLE
+            )
+
+        job_id = uuid.uuid4().hex
+        # The slot is taken before the record is written, so that concurrent submits can't overfill the queue
+        self._reserved += 1
+        try:
+            await self._collection().insert_one({
+                "_id": job_id,
+                "type": job_type,
+                "status": "queued",
+                "progress": 0,
+                "submitted_by": submitted_by,
+                "submitted_on": datetime.now(timezone.utc)
+            })
+        finally:
+            self._reserved -= 1
+        if not self._accepting:
+            # Stopped while the record was written, no worker would pick the job up
+            await self._finish(job_id, "cancelled", error="Application shut down before the job started")
+            raise BusinessException(
+                message="Background jobs are not accepted at the moment",
+                error_code=sc.SERVICE_UNAVAILABLE
+            )
+        self._queue.put_nowait((job_id, fn))
+        self.submitted += 1
+        logger.info(f"Job {job_id} of type {job_type} submitted by {submitted_by}")
+        return job_id
+
+    async def get_job(self, job_id: str) -> Optional[JobStatus]:
+        record = await self._collection().find_one({"_id": job_id})
+        if not record:
+            return None
+        return JobStatus(
+            id=record["_id"],
+            type=record["type"],
+            status=record["status"],
+            progress=record.get("progress", 0),
+            message=record.get("message"),
+            result=record.get("result"),
+            error=record.get("error"),
+            submittedBy=record["submitted_by"],
+            submittedOn=self._isoformat(record["submitted_on"]),
+            startedOn=self._isoformat(record.get("started_on")),
+            finishedOn=self._isoformat(record.get("finished_on"))
+        )
+
+    async def run_cpu_bound(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Runs fn in the process pool, or in a thread if there is none. fn and args must be picklable."""
+        return await asyncio.get_running_loop().run_in_executor(self._process_pool, fn, *args)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "process_workers": self.process_workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "running": self.running,
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed
+        }
+
+    async def _work(self):
+        while True:
+            job_id, fn = await self._queue.get()
+            try:
+                await self._run(job_id, fn)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str, fn: JobFunction):
+        self.running += 1
+        try:
+            await self._update(job_id, {"status": "running", "started_on": datetime.now(timezone.utc)})
+            result = await fn(JobContext(self, job_id))
+            if await self._finish(job_id, "succeeded", result=result):
+                self.succeeded += 1
+            else:
+                self.failed += 1
+        except asyncio.CancelledError:
+            await asyncio.shield(self._finish(job_id, "cancelled", error="Application shut down while the job was running"))
+            raise
+        except Exception as e:
+            logger.error(f"Job {job_id} failed", exc_info=True)
+            self.failed += 1
+            await self._finish(job_id, "failed", error=str(e))
+        finally:
+            self.running -= 1
+
+    async def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> bool:
+        """Records the end of the job, returns whether it was recorded with this status"""
+        changes = {"status": status, "finished_on": datetime.now(timezone.utc), "result": result, "error": error}
+        if status == "succeeded":
+            changes["progress"] = 100
+        if await self._update(job_id, changes):
+            return True
+        if status == "succeeded":
+            # Most likely a result MongoDB can't store, the job must not look like it is still running
+            await self._update(job_id, {
+                "status": "failed",
+                "finished_on": changes["finished_on"],
+                "result": None,
+                "error": "The job succeeded but its result could not be recorded"
+            })
+        return False
+
+    async def _update(self, job_id: str, changes: Dict[str, Any]) -> bool:
+        """Returns whether the changes were recorded"""
+        try:
+            await self._collection().update_one({"_id": job_id}, {"$set": changes})
+        except Exception as e:
+            logger.error(f"Failed to record state of job {job_id}: {str(e)}")
+            return False
+        return True
+
+    @staticmethod
+    def _collection():
+        return mongodb_manager.get_collection(CollectionNames.JOB)
+
+    @staticmethod
+    def _isoformat(value: Optional[datetime]) -> Optional[str]:
+        return value.isoformat() if value else None
+
+
+def job_accepted(job_id: str) -> SuccessResponse[JobSubmission]:
+    """Response of a route that handed its work to the job runner"""
+    return SuccessResponse(
+        data=JobSubmission(jobId=job_id, statusUrl=f"/api/v1/jobs/{job_id}"),
+        message="Request accepted for background processing",
+        status_code=sc.REQUEST_ACCEPTED
+    )
+
+
+# Global instance
+job_runner = JobRunner(
+    workers=settings.JOB_WORKERS,
+    queue_size=settings.JOB_QUEUE_SIZE,
+    process_workers=settings.JOB_PROCESS_WORKERS,
+    shutdown_timeout=settings.JOB_SHUTDOWN_TIMEOUT_SECONDS
+)
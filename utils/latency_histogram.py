@@ -0,0 +1,62 @@
+import bisect
+from typing import List, Optional
+
+
+def _log_bounds(smallest: float, largest: float, growth: float) -> List[float]:
+    bounds = []
+    bound = smallest
+    while bound < largest:
+        bounds.append(bound)
+        bound *= growth
+    bounds.append(largest)
+    return bounds
+
+
+# Upper bounds (seconds) of the buckets, 50us to 120s growing by 25%: percentiles are accurate to 25%
+DEFAULT_BOUNDS = _log_bounds(0.00005, 120.0, 1.25)
+
+
+class LatencyHistogram:
+    """
+    Counts of latencies in log scaled buckets: constant memory however many latencies are added,
+    histograms can be merged, and percentiles are read as the upper bound of their bucket.
+    """
+
+    def __init__(self, bounds: List[float] = DEFAULT_BOUNDS):
+        self.bounds = bounds
+        # The last bucket holds everything above the largest bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: "LatencyHistogram"):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Latency under which percent of the latencies fall, None when empty"""
+        if not self.count:
+            return None
+        rank = percent / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                # The max is exact and closer than the bound of the top bucket
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
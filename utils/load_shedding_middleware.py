@@ -0,0 +1,109 @@
+from typing import Any, Dict, List, Optional, Tuple
+from starlette.types import ASGIApp, Receive, Scope, Send
+from models.status_code import sc
+from .error_handling import to_error_response
+from .metrics import metrics_registry
+
+# Seconds a shed client is asked to wait before retrying
+RETRY_AFTER_SECONDS = "1"
+
+
+class RouteGroup:
+    """
+    Requests whose path starts with one of the prefixes. At most limit of them are in flight
+    (bulkhead), and a new one is only admitted while the requests in flight across the shared
+    groups stay below admit_below of the shared capacity: a group with a lower admit_below is
+    shed earlier as load rises. A reserved group does not use the shared capacity at all.
+    """
+
+    def __init__(self, name: str, prefixes: Tuple[str, ...], limit: int, admit_below: float = 1.0, reserved: bool = False):
+        self.name = name
+        self.prefixes = prefixes
+        self.limit = limit
+        self.admit_below = admit_below
+        self.reserved = reserved
+
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.admitted = 0
+        self.shed_overload = 0
+        self.shed_limit = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "admitted": self.admitted,
+            "shed_overload": self.shed_overload,
+            "shed_limit": self.shed_limit
+        }
+
+
+class LoadSheddingMiddleware:
+    """
+    Admission control in front of the routes. A request over the limit of its route group
+    gets 429, a request arriving while the instance is too busy for its priority gets 503,
+    both with Retry-After and without reaching the route. Reserved groups (health probes)
+    keep their own capacity, so they are answered even when everything else is shed.
+    A request belongs to the first group one of whose prefixes its path starts with, or to
+    default_group when there is none.
+    """
+
+    def __init__(self, app: ASGIApp, groups: List[RouteGroup], default_group: str, shared_capacity: int):
+        self.app = app
+        self.groups = groups
+        self.default_group = next(group for group in groups if group.name == default_group)
+        self.shared_capacity = shared_capacity
+        self.shared_in_flight = 0
+        metrics_registry.register("load_shedding", self.stats)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        group = self._group(scope["path"])
+        rejection = self._admit(group)
+        if rejection is not None:
+            status_code, error = rejection
+            response = to_error_response(error=error, status_code=status_code)
+            response.headers["Retry-After"] = RETRY_AFTER_SECONDS
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            group.in_flight -= 1
+            if not group.reserved:
+                self.shared_in_flight -= 1
+
+    def _group(self, path: str) -> RouteGroup:
+        for group in self.groups:
+            if path.startswith(group.prefixes):
+                return group
+        return self.default_group
+
+    def _admit(self, group: RouteGroup) -> Optional[Tuple[int, str]]:
+        """Counts the request in, or returns the status code and error it is rejected with"""
+        if group.in_flight >= group.limit:
+            group.shed_limit += 1
+            return sc.TOO_MANY_REQUESTS, f"Too many concurrent {group.name} requests, try again later"
+        if not group.reserved and self.shared_in_flight >= self.shared_capacity * group.admit_below:
+            group.shed_overload += 1
+            return sc.SERVICE_UNAVAILABLE, "Server is too busy, try again later"
+
+        group.in_flight += 1
+        group.peak_in_flight = max(group.peak_in_flight, group.in_flight)
+        group.admitted += 1
+        if not group.reserved:
+            self.shared_in_flight += 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "shared_capacity": self.shared_capacity,
+            "shared_in_flight": self.shared_in_flight,
+            "groups": {group.name: group.stats() for group in self.groups}
+        }
@@ -1,6 +1,7 @@
 import logging
 import logging.handlers
 import os
+from contextvars import ContextVar
 from datetime import datetime
 
 # Create logger
@@ -8,6 +9,18 @@ logger = logging.getLogger("Template-Project")
 logger.setLevel(logging.DEBUG)  # minimum log level
 
 
+# ID of the request being handled, set by the tracing middleware
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds the ID of the current request to every record"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
 # Create logs directory
 log_directory = "logs"
 os.makedirs(log_directory, exist_ok=True)
@@ -23,9 +36,12 @@ rotating_file_handler = logging.handlers.RotatingFileHandler(
 
 # Log Format
 formatter = logging.Formatter(
-    "%(asctime)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s"
+    "%(asctime)s - %(levelname)s - [%(request_id)s] - %(filename)s:%(lineno)d - %(message)s"
 )
 rotating_file_handler.setFormatter(formatter)
 
+# On the logger rather than the handler, so that every handler using formatter gets the request ID
+logger.addFilter(RequestIdFilter())
+
 # Add handlers to logger
 logger.addHandler(rotating_file_handler)
@@ -0,0 +1,126 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
+from .latency_histogram import LatencyHistogram
+from .config import settings
+from .logger import logger
+from .metrics import metrics_registry
+
+# Innermost frames kept of a captured stack
+MAX_STACK_FRAMES = 40
+
+
+class LoopMonitor:
+    """
+    Measures event loop lag: a task sleeps interval_seconds in a loop and records how late
+    it wakes up. A watchdog thread checks that the task keeps running; once the loop has been
+    stuck for threshold_seconds, it captures the stack of the loop thread, which is the code
+    blocking the loop at that moment. One stack is captured per blocking episode, the latest
+    max_captures are kept.
+    """
+
+    def __init__(self, interval_seconds: float, threshold_seconds: float, max_captures: int = 20):
+        self.interval_seconds = interval_seconds
+        self.threshold_seconds = threshold_seconds
+        self.histogram = LatencyHistogram()
+        self.captures: Deque[Dict[str, Any]] = deque(maxlen=max_captures)
+        self.blocking_episodes = 0
+
+        self._heartbeat = 0.0
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        metrics_registry.register("event_loop", self.stats)
+
+    def start(self):
+        """Starts monitoring the running loop, call it from the loop thread"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._measure())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Event loop monitor started, blocking threshold {self.threshold_seconds * 1000:.0f}ms")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopping.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._watchdog.join()
+        self._watchdog = None
+
+    async def _measure(self):
+        while True:
+            expected = time.monotonic() + self.interval_seconds
+            await asyncio.sleep(self.interval_seconds)
+            now = time.monotonic()
+            self.histogram.add(max(now - expected, 0.0))
+            self._heartbeat = now
+
+    def _watch(self):
+        captured_heartbeat = None
+        # Checking twice per threshold detects an episode at most 1.5 thresholds after it began
+        while not self._stopping.wait(self.threshold_seconds / 2):
+            heartbeat = self._heartbeat
+            stuck_for = time.monotonic() - heartbeat - self.interval_seconds
+            if stuck_for < self.threshold_seconds or heartbeat == captured_heartbeat:
+                continue
+            captured_heartbeat = heartbeat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self._capture(stuck_for, traceback.format_stack(frame)[-MAX_STACK_FRAMES:])
+
+    def _capture(self, stuck_for: float, stack: List[str]):
+        self.blocking_episodes += 1
+        self.captures.append({
+            "capturedOn": datetime.now(timezone.utc).isoformat(),
+            "blockedMs": round(stuck_for * 1000, 1),
+            "stack": [line.rstrip() for line in stack]
+        })
+        logger.warning(
+            f"Event loop blocked for {stuck_for * 1000:.0f}ms so far, by:\n{''.join(stack).rstrip()}"
+        )
+
+    def recent_captures(self) -> List[Dict[str, Any]]:
+        """Captured blocking stacks, newest first"""
+        return list(reversed(self.captures))
+
+    def stats(self) -> Dict[str, Any]:
+        histogram = self.histogram
+        buckets = {}
+        for index, count in enumerate(histogram.counts):
+            if count:
+                bound = f"{histogram.bounds[index] * 1000:.3f}" if index < len(histogram.bounds) else "+Inf"
+                buckets[bound] = count
+        return {
+            "samples": histogram.count,
+            "lag_mean_ms": round(histogram.mean * 1000, 3) if histogram.count else None,
+            "lag_p50_ms": round(histogram.percentile(50) * 1000, 3) if histogram.count else None,
+            "lag_p99_ms": round(histogram.percentile(99) * 1000, 3) if histogram.count else None,
+            "lag_max_ms": round(histogram.max * 1000, 3),
+            # upper bound of the bucket (ms) -> samples
+            "lag_histogram_ms": buckets,
+            "blocking_episodes": self.blocking_episodes
+        }
+
+
+# Global instance
+loop_monitor = LoopMonitor(
+    interval_seconds=settings.LOOP_MONITOR_INTERVAL_MS / 1000,
+    threshold_seconds=settings.LOOP_BLOCKING_THRESHOLD_MS / 1000
+)
@@ -0,0 +1,226 @@
+import asyncio
+import gc
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+from starlette.types import ASGIApp, Receive, Scope, Send
+from business_exception import BusinessException
+from models.status_code import sc
+from .logger import logger
+from .metrics import metrics_registry
+
+# Allocations of tracemalloc itself and of the import machinery are left out of snapshots
+SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+# ru_maxrss is in kilobytes on Linux, in bytes on macOS
+MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+class RouteAllocations:
+    """Allocation figures of the sampled requests of one route"""
+
+    def __init__(self):
+        self.samples = 0
+        self.total_peak_bytes = 0
+        self.max_peak_bytes = 0
+        self.total_retained_bytes = 0
+
+    def record(self, peak_bytes: int, retained_bytes: int):
+        self.samples += 1
+        self.total_peak_bytes += peak_bytes
+        self.max_peak_bytes = max(self.max_peak_bytes, peak_bytes)
+        self.total_retained_bytes += retained_bytes
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "mean_peak_kb": round(self.total_peak_bytes / self.samples / 1024, 1),
+            "max_peak_kb": round(self.max_peak_bytes / 1024, 1),
+            "mean_retained_kb": round(self.total_retained_bytes / self.samples / 1024, 1)
+        }
+
+
+class MemoryDiagnostics:
+    """
+    Process memory figures (RSS, garbage collector) for the metrics, and on demand tracemalloc
+    sessions: between start and stop, every allocation is traced so that snapshots can be
+    compared to show which lines of code grow the heap. Tracing slows allocations down and
+    takes memory of its own, so it only runs while someone is looking.
+    """
+
+    def __init__(self):
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.started_on: Optional[float] = None
+        self.routes: Dict[str, RouteAllocations] = {}
+        self._gc_started: Optional[float] = None
+        self.gc_pause_seconds = [0.0, 0.0, 0.0]
+        self.gc_max_pause_seconds = [0.0, 0.0, 0.0]
+        gc.callbacks.append(self._on_gc)
+        metrics_registry.register("memory", self.stats)
+
+    def start(self, frames: int):
+        """Starts tracing allocations with frames frames of traceback each, and takes the baseline snapshot"""
+        if tracemalloc.is_tracing():
+            raise BusinessException(
+                message="Allocations are already traced, stop tracing first",
+                error_code=sc.CONFLICT
+            )
+        tracemalloc.start(frames)
+        self.started_on = time.time()
+        self.routes = {}
+        self.baseline = self._snapshot()
+        logger.info(f"Tracing allocations with {frames} frames")
+
+    def stop(self):
+        """Stops tracing and frees the traces"""
+        self._check_tracing()
+        tracemalloc.stop()
+        self.baseline = None
+        self.started_on = None
+        logger.info("Stopped tracing allocations")
+
+    async def top_growth(self, limit: int, group_by: str, rebase: bool) -> List[Dict[str, Any]]:
+        """
+        Allocation sites that grew the most since the baseline snapshot, biggest first.
+        With rebase, the new snapshot becomes the baseline of the next call.
+        """
+        self._check_tracing()
+        # Taken once: tracing may be stopped or restarted while the snapshot is taken
+        baseline = self.baseline
+        if baseline is None:
+            raise BusinessException(
+                message="There is no baseline snapshot to compare to, restart tracing",
+                error_code=sc.CONFLICT
+            )
+        # Snapshots of a large heap take a while, off the event loop
+        try:
+            snapshot = await asyncio.to_thread(self._snapshot)
+        except RuntimeError:
+            # Tracing stopped meanwhile
+            self._check_tracing()
+            raise
+        differences = await asyncio.to_thread(snapshot.compare_to, baseline, group_by)
+        if rebase and self.baseline is baseline:
+            self.baseline = snapshot
+
+        return [
+            {
+                "site": [f"{frame.filename}:{frame.lineno}" for frame in difference.traceback],
+                "sizeKb": round(difference.size / 1024, 1),
+                "sizeDiffKb": round(difference.size_diff / 1024, 1),
+                "count": difference.count,
+                "countDiff": difference.count_diff
+            }
+            for difference in differences[:limit]
+        ]
+
+    def route_allocations(self) -> Dict[str, Dict[str, Any]]:
+        return {route: allocations.stats() for route, allocations in sorted(self.routes.items())}
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            "rss_mb": self._rss_mb(),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * MAXRSS_UNIT / 1024 / 1024, 1),
+            "gc": {
+                f"generation_{generation}": {
+                    "collections": generation_stats["collections"],
+                    "collected": generation_stats["collected"],
+                    "uncollectable": generation_stats["uncollectable"],
+                    "pending": pending,
+                    "pause_ms": round(self.gc_pause_seconds[generation] * 1000, 1),
+                    "max_pause_ms": round(self.gc_max_pause_seconds[generation] * 1000, 2)
+                }
+                for generation, (generation_stats, pending) in enumerate(zip(gc.get_stats(), gc.get_count()))
+            },
+            "gc_garbage": len(gc.garbage),
+            "tracing": tracemalloc.is_tracing()
+        }
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            stats["traced_mb"] = round(current / 1024 / 1024, 1)
+            stats["traced_peak_mb"] = round(peak / 1024 / 1024, 1)
+            stats["tracing_overhead_mb"] = round(tracemalloc.get_tracemalloc_memory() / 1024 / 1024, 1)
+            stats["tracing_since"] = self.started_on
+        return stats
+
+    def _on_gc(self, phase: str, info: Dict[str, int]):
+        if phase == "start":
+            self._gc_started = time.perf_counter()
+        elif self._gc_started is not None:
+            pause = time.perf_counter() - self._gc_started
+            generation = info["generation"]
+            self.gc_pause_seconds[generation] += pause
+            self.gc_max_pause_seconds[generation] = max(self.gc_max_pause_seconds[generation], pause)
+            self._gc_started = None
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+    @staticmethod
+    def _check_tracing():
+        if not tracemalloc.is_tracing():
+            raise BusinessException(
+                message="Allocations are not traced, start tracing first",
+                error_code=sc.CONFLICT
+            )
+
+    @staticmethod
+    def _rss_mb() -> Optional[float]:
+        """Resident set size, from /proc on Linux, unknown elsewhere"""
+        try:
+            with open("/proc/self/statm") as statm:
+                resident_pages = int(statm.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            return None
+        return round(resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024, 1)
+
+
+class AllocationTrackingMiddleware:
+    """
+    While allocations are traced, measures a sample of the requests: the peak of traced memory
+    during the request above its level at the start, and what is still allocated at the end,
+    per route. tracemalloc counts the whole process, so one request is measured at a time and
+    the figures include what concurrent requests allocated meanwhile: read them as upper
+    bounds, and compare routes under light load.
+    """
+
+    def __init__(self, app: ASGIApp, diagnostics: MemoryDiagnostics, sample_rate: float):
+        self.app = app
+        self.diagnostics = diagnostics
+        self.sample_rate = sample_rate
+        self._measuring = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (scope["type"] != "http" or self._measuring or not tracemalloc.is_tracing()
+                or random.random() >= self.sample_rate):
+            await self.app(scope, receive, send)
+            return
+
+        self._measuring = True
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._measuring = False
+            # Tracing may have been stopped by this very request
+            if tracemalloc.is_tracing():
+                end, peak = tracemalloc.get_traced_memory()
+                route = scope.get("route")
+                # Not the path of an unmatched request, there is no end to those
+                name = f"{scope['method']} {route.path}" if route is not None else "unmatched"
+                self.diagnostics.routes.setdefault(name, RouteAllocations()).record(max(peak - start, 0), end - start)
+
+
+# Global instance
+memory_diagnostics = MemoryDiagnostics()
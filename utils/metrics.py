@@ -0,0 +1,29 @@
+from typing import Callable, Dict, Any
+from .logger import logger
+
+
+class MetricsRegistry:
+    """
+    Collects runtime statistics from the components that register a provider,
+    served by the admin metrics endpoint
+    """
+
+    def __init__(self):
+        self._providers: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def register(self, name: str, provider: Callable[[], Dict[str, Any]]):
+        self._providers[name] = provider
+
+    def collect(self) -> Dict[str, Any]:
+        metrics = {}
+        for name, provider in sorted(self._providers.items()):
+            try:
+                metrics[name] = provider()
+            except Exception as e:
+                logger.warning(f"Failed to collect metrics of {name}: {str(e)}")
+                metrics[name] = {"error": str(e)}
+        return metrics
+
+
+# Global instance
+metrics_registry = MetricsRegistry()
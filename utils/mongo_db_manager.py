@@ -1,13 +1,122 @@
+import asyncio
+import functools
+import time
+import pymongo
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import Optional
+from pymongo import IndexModel
+from pymongo.errors import ConnectionFailure, ExecutionTimeout, PyMongoError, WTimeoutError
+from typing import Optional, Dict, Any, List
+from .circuit_breaker import CircuitBreaker, data_source_circuit_breaker
+from .query_stats import query_stats, mongo_fingerprint
+from .tracing import tracer
 from .logger import logger
 from .config import settings
 from mongo_collection_names import CollectionNames
 
+# Index options that make two indexes with the same key pattern different
+INDEX_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds", "collation", "hidden")
+
+# Collection methods that are coroutines, run through the circuit breaker
+GUARDED_OPERATIONS = frozenset({
+    "insert_one", "insert_many", "find_one", "find_one_and_update", "find_one_and_replace", "find_one_and_delete",
+    "update_one", "update_many", "replace_one", "delete_one", "delete_many", "bulk_write",
+    "count_documents", "estimated_document_count", "distinct", "create_index", "create_indexes"
+})
+
+# Collection methods returning a cursor, whose to_list is run through the circuit breaker
+CURSOR_OPERATIONS = frozenset({"find", "aggregate"})
+
+
+def is_mongo_failure(e: BaseException) -> bool:
+    """Tells errors of the server or the network (timeouts included) from errors of the operation itself"""
+    if isinstance(e, (ConnectionFailure, ExecutionTimeout, WTimeoutError)):
+        return True
+    return isinstance(e, PyMongoError) and e.timeout
+
+
+class GuardedCollection:
+    """
+    Motor collection whose operations run through the circuit breaker of MongoDB, with a deadline
+    (pymongo.timeout, which also bounds the work of the driver thread and the server), and are
+    recorded in the query stats. Everything else is delegated to the collection as is.
+    """
+
+    def __init__(self, collection, circuit_breaker: CircuitBreaker, timeout: float):
+        self._collection = collection
+        self._circuit_breaker = circuit_breaker
+        self._timeout = timeout
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._collection, name)
+        if name in GUARDED_OPERATIONS:
+            return functools.partial(self._operation, name, attribute)
+        if name in CURSOR_OPERATIONS:
+            return functools.partial(self._cursor, name, attribute)
+        return attribute
+
+    async def _operation(self, name: str, operation, *args, **kwargs):
+        fingerprint = mongo_fingerprint(self._collection.name, name, args)
+        return await self._guarded(fingerprint, operation, *args, **kwargs)
+
+    async def _guarded(self, fingerprint: str, operation, *args, **kwargs):
+        async def run():
+            started = time.perf_counter()
+            failed = True
+            try:
+                with tracer.span("mongodb", "db", statement=fingerprint), pymongo.timeout(self._timeout):
+                    result = await operation(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                query_stats.record("mongodb", fingerprint, time.perf_counter() - started, failed)
+        return await self._circuit_breaker.call(run, None, is_mongo_failure)
+
+    def _cursor(self, name: str, operation, *args, **kwargs):
+        self._circuit_breaker.check()
+        fingerprint = mongo_fingerprint(self._collection.name, name, args)
+        return GuardedCursor(operation(*args, **kwargs), self, fingerprint)
+
+
+class GuardedCursor:
+    """
+    Motor cursor whose to_list runs through the circuit breaker. Iterating with async for
+    is delegated to the cursor as is, without a deadline.
+    """
+
+    def __init__(self, cursor, collection: GuardedCollection, fingerprint: str):
+        self._cursor = cursor
+        self._collection = collection
+        self._fingerprint = fingerprint
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._cursor, name)
+        if not callable(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        def chained(*args, **kwargs):
+            result = attribute(*args, **kwargs)
+            # sort, limit, skip... return the cursor itself
+            return self if result is self._cursor else result
+        return chained
+
+    def __aiter__(self):
+        return self._cursor.__aiter__()
+
+    async def to_list(self, length: Optional[int] = None):
+        return await self._collection._guarded(self._fingerprint, self._cursor.to_list, length)
+
+
 class MongoDBManager:
     def __init__(self):
         self.client: Optional[AsyncIOMotorClient] = None
         self.database = None
+        self.circuit_breaker = data_source_circuit_breaker("mongodb")
+        self._index_task: Optional[asyncio.Task] = None
+        # collection -> index name -> state (pending, building, present, created, conflict, failed)
+        self.index_states: Dict[str, Dict[str, str]] = {}
+        # collection -> names of indexes present in the database but not declared
+        self.undeclared_indexes: Dict[str, List[str]] = {}
 
     async def connect(self):
         try:
@@ -16,26 +125,128 @@ class MongoDBManager:
             self.client = AsyncIOMotorClient(settings.mongo_db_url)
             self.database = self.client[settings.MONGODB_DATABASE]
 
-            # Create indexes for better performance
-            await self._create_indexes()
+            # Reconcile declared indexes in the background so that startup does not wait for index builds
+            self._index_task = asyncio.create_task(self._ensure_indexes())
 
         except Exception as e:
             logger.error(f"Failed to connect to MongoDB: {str(e)}")
             raise
 
-    async def _create_indexes(self):
-        try:
-            #replace the following statement with your project specific indexes
-            await self.database[CollectionNames.USER_PROFILE].create_index("email", unique=True)
-            logger.info("MongoDB indexes created successfully")
-        except Exception as e:
-            logger.warning(f"Error creating MongoDB indexes: {str(e)}")
+    async def _ensure_indexes(self):
+        """
+        Compares the indexes declared in CollectionNames.INDEXES with list_indexes
+        and creates only the missing ones
+        """
+        for collection_name, index_models in CollectionNames.INDEXES.items():
+            self.index_states[collection_name] = {model.document["name"]: "pending" for model in index_models}
+
+        for collection_name, index_models in CollectionNames.INDEXES.items():
+            try:
+                await self._ensure_collection_indexes(collection_name, index_models)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error reconciling MongoDB indexes of {collection_name}: {str(e)}")
+                states = self.index_states[collection_name]
+                for name, state in states.items():
+                    if state in ("pending", "building"):
+                        states[name] = "failed"
+
+    async def _ensure_collection_indexes(self, collection_name: str, index_models: List[IndexModel]):
+        collection = self.database[collection_name]
+        existing = {index["name"]: index async for index in collection.list_indexes()}
+        states = self.index_states[collection_name]
+
+        matched = set()
+        missing = []
+        for model in index_models:
+            declared = model.document
+            name = declared["name"]
+            same_key = [index for index in existing.values() if list(index["key"].items()) == list(declared["key"].items())]
+            if not same_key:
+                missing.append(model)
+                continue
+
+            matched.update(index["name"] for index in same_key)
+            if any(self._index_options(index) == self._index_options(declared) for index in same_key):
+                states[name] = "present"
+            else:
+                states[name] = "conflict"
+                logger.error(f"MongoDB index drift on {collection_name}: index {name} exists with different options")
+
+        self.undeclared_indexes[collection_name] = sorted(set(existing) - matched - {"_id_"})
+        if self.undeclared_indexes[collection_name]:
+            logger.warning(f"MongoDB indexes not declared for {collection_name}: {self.undeclared_indexes[collection_name]}")
+
+        for model in missing:
+            name = model.document["name"]
+            states[name] = "building"
+            logger.info(f"Creating MongoDB index {name} on {collection_name}")
+            try:
+                await collection.create_indexes([model])
+                states[name] = "created"
+                logger.info(f"MongoDB index {name} on {collection_name} created successfully")
+            except Exception as e:
+                states[name] = "failed"
+                logger.error(f"Error creating MongoDB index {name} on {collection_name}: {str(e)}")
+
+    @staticmethod
+    def _index_options(index: Dict[str, Any]) -> Dict[str, Any]:
+        return {option: index[option] for option in INDEX_OPTIONS if index.get(option)}
+
+    async def index_report(self) -> Dict[str, Any]:
+        """
+        Reports the state of declared indexes, drift against the database
+        and the progress of index builds that are still running
+        """
+        report = {}
+        for collection_name, states in self.index_states.items():
+            report[collection_name] = {
+                "indexes": dict(states),
+                "undeclared": self.undeclared_indexes.get(collection_name, [])
+            }
+
+        building = any(state == "building" for states in self.index_states.values() for state in states.values())
+        if building and self.client:
+            try:
+                for build in await self._index_builds_in_progress():
+                    collection_report = report.get(build["collection"])
+                    if collection_report is not None:
+                        collection_report.setdefault("progress", []).append(build)
+            except Exception as e:
+                logger.debug(f"Unable to read MongoDB index build progress: {str(e)}")
+
+        failed = any(state in ("failed", "conflict") for states in self.index_states.values() for state in states.values())
+        drift = any(self.undeclared_indexes.values())
+        report["status"] = "failed" if failed else "building" if building else "drift" if drift else "ok"
+        return report
+
+    async def _index_builds_in_progress(self) -> List[Dict[str, Any]]:
+        pipeline = [
+            {"$currentOp": {"allUsers": True}},
+            {"$match": {"command.createIndexes": {"$exists": True}, "command.$db": settings.MONGODB_DATABASE}}
+        ]
+        builds = []
+        async for op in self.client.admin.aggregate(pipeline):
+            progress = op.get("progress", {})
+            builds.append({
+                "collection": op["command"]["createIndexes"],
+                "indexes": [index.get("name") for index in op["command"].get("indexes", [])],
+                "done": progress.get("done"),
+                "total": progress.get("total"),
+                "message": op.get("msg")
+            })
+        return builds
 
     async def disconnect(self):
 
         """
         Close MongoDB connection
         """
+        if self._index_task and not self._index_task.done():
+            self._index_task.cancel()
+        self._index_task = None
+
         if self.client:
             self.client.close()
             self.client = None
@@ -56,10 +267,18 @@ class MongoDBManager:
             logger.error(f"MongoDB health check failed: {str(e)}")
             return False
 
-    def get_collection(self, collection_name: str):
+    def get_collection(self, collection_name: str, timeout: Optional[float] = None) -> GuardedCollection:
+        """
+        Returns the collection guarded by the circuit breaker. Its operations time out
+        after timeout seconds, MONGO_OPERATION_TIMEOUT_SECONDS when not given.
+        """
         if self.database is None:
             raise RuntimeError("Database not connected. Call connect() first.")
-        return self.database[collection_name]
+        return GuardedCollection(
+            self.database[collection_name],
+            self.circuit_breaker,
+            timeout if timeout is not None else settings.MONGO_OPERATION_TIMEOUT_SECONDS
+        )
 
 
 # Global MongoDB manager instance
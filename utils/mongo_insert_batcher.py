@@ -0,0 +1,107 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Set, Tuple
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteError
+from .mongo_db_manager import mongodb_manager
+from .metrics import metrics_registry
+from .logger import logger
+
+DUPLICATE_KEY_ERROR_CODE = 11000
+
+
+class MongoInsertBatcher:
+    """
+    Group commit for inserts into one collection: concurrent inserts arriving within
+    max_delay_ms (or until max_batch_size documents are pending) are written with a single
+    unordered insert_many. Every caller gets the inserted_id of its own document, or the
+    same exception insert_one would have raised for it (e.g. DuplicateKeyError).
+    """
+
+    def __init__(self, collection_name: str, max_delay_ms: int, max_batch_size: int):
+        self.collection_name = collection_name
+        self.max_delay = max_delay_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._writes: Set[asyncio.Task] = set()
+
+        self.batches = 0
+        self.documents = 0
+        self.largest_batch = 0
+        metrics_registry.register(f"mongo_insert_batcher.{collection_name}", self.stats)
+
+    async def insert(self, document: Dict[str, Any]) -> Any:
+        """Queues the document for the next batch and returns its inserted_id once written"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((document, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_timer is None:
+            self._flush_timer = asyncio.get_running_loop().call_later(self.max_delay, self._flush)
+
+        return await future
+
+    async def drain(self):
+        """Writes the pending documents and waits for the writes in progress"""
+        self._flush()
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def _flush(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        task = asyncio.create_task(self._write(batch))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def _write(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        self.batches += 1
+        self.documents += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+
+        documents = [document for document, _ in batch]
+        write_errors = {}
+        try:
+            collection = mongodb_manager.get_collection(self.collection_name)
+            # insert_many assigns the _id of every document before sending them
+            await collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            write_errors = {error["index"]: error for error in e.details.get("writeErrors", [])}
+            if not write_errors:
+                self._fail(batch, e)
+                return
+        except Exception as e:
+            logger.error(f"Batched insert of {len(batch)} documents into {self.collection_name} failed: {str(e)}")
+            self._fail(batch, e)
+            return
+
+        for index, (document, future) in enumerate(batch):
+            if future.done():
+                continue
+            error = write_errors.get(index)
+            if error is None:
+                future.set_result(document["_id"])
+            elif error.get("code") == DUPLICATE_KEY_ERROR_CODE:
+                future.set_exception(DuplicateKeyError(error.get("errmsg"), error.get("code"), error))
+            else:
+                future.set_exception(WriteError(error.get("errmsg"), error.get("code"), error))
+
+    @staticmethod
+    def _fail(batch: List[Tuple[Dict[str, Any], asyncio.Future]], error: Exception):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "documents": self.documents,
+            "average_batch_size": round(self.documents / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "pending": len(self._pending)
+        }
@@ -1,11 +1,27 @@
+import time
 from databases import Database
+from asyncpg.exceptions import (
+    PostgresConnectionError, InterfaceError, OperatorInterventionError, InsufficientResourcesError
+)
+from .circuit_breaker import data_source_circuit_breaker
+from .query_stats import query_stats, sql_fingerprint
+from .tracing import tracer
 from .config import settings
 from .logger import logger
-from typing import Dict,Optional,Any
+from typing import Dict,List,Optional,Any,Tuple,Callable,Awaitable
+
+# Errors telling that the server or the connection is in trouble, as opposed to errors of the query itself
+CONNECTION_ERRORS = (OSError, PostgresConnectionError, InterfaceError, OperatorInterventionError, InsufficientResourcesError)
+
+# Marks the timeout parameter as not given, None means no deadline
+DEFAULT_TIMEOUT: Any = object()
 
 class PostgreDbManager:
     def __init__(self):
         self.database = None
+        # name -> (query, sample values) of queries whose plans are checked by the migration runner
+        self.hot_queries: Dict[str, Tuple[str, Optional[Dict[str, Any]]]] = {}
+        self.circuit_breaker = data_source_circuit_breaker("postgresql")
 
     async def connect(self):
         try:
@@ -34,17 +50,69 @@ class PostgreDbManager:
             logger.error(f"PostgreSQL health check failed: {str(e)}")
             return False
 
-    async def execute(self,query:str, values: Optional[Dict[str,Any]] = None):
-        await self.database.execute(query=query, values=values)
+    def register_hot_query(self, name: str, query: str, values: Optional[Dict[str, Any]] = None):
+        """
+        Registers a latency critical query. Its plan must never fall back to a sequential scan,
+        see MigrationRunner.check_query_plans
+        """
+        self.hot_queries[name] = (query, values)
+
+    def connection(self):
+        """Pins one pooled connection to the current task for the duration of the context"""
+        return self.database.connection()
+
+    def transaction(self):
+        return self.database.transaction()
+
+    # timeout is in seconds, POSTGRE_OPERATION_TIMEOUT_SECONDS when not given and no deadline when None
+
+    async def execute(self,query:str, values: Optional[Dict[str,Any]] = None, timeout: Optional[float] = DEFAULT_TIMEOUT):
+        await self._run(query, values, lambda: self.database.execute(query=query, values=values), timeout)
+
+    async def fetch_one(self,query:str, values: Optional[Dict[str,Any]] = None, timeout: Optional[float] = DEFAULT_TIMEOUT):
+        return await self._run(query, values, lambda: self.database.fetch_one(query=query, values=values), timeout)
+
+    async def fetch_value(self,query:str, values: Optional[Dict[str,Any]] = None, timeout: Optional[float] = DEFAULT_TIMEOUT):
+        return await self._run(query, values, lambda: self.database.fetch_val(query=query, values=values), timeout)
+
+    async def fetch_all(self,query:str,values: Optional[Dict[str,Any]] = None, timeout: Optional[float] = DEFAULT_TIMEOUT):
+        return await self._run(query, values, lambda: self.database.fetch_all(query=query, values=values), timeout)
+
+    async def copy_records(self, table: str, records: List[tuple], columns: List[str], timeout: Optional[float] = DEFAULT_TIMEOUT):
+        """Loads records into table through the COPY protocol, on the connection pinned to the current task"""
+        connection = self.database.connection()
+        await self._run(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN", None,
+            # asyncpg connection under the pooled one, the only way to COPY
+            lambda: connection.raw_connection.copy_records_to_table(table, records=records, columns=columns),
+            timeout
+        )
+
+    async def _run(self, query: str, values: Optional[Dict[str, Any]], operation: Callable[[], Awaitable[Any]],
+                   timeout: Optional[float]):
+        """
+        Runs the query through the circuit breaker and records its latency in the query stats.
+        The deadline runs in the calling task (asyncio.timeout, not wait_for), so queries keep using
+        the connection or transaction pinned to that task; asyncpg cancels the query on the server
+        when it expires.
+        """
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = settings.POSTGRE_OPERATION_TIMEOUT_SECONDS
 
-    async def fetch_one(self,query:str, values: Optional[Dict[str,Any]] = None):
-        return await self.database.fetch_one(query=query, values=values)
+        fingerprint = sql_fingerprint(query)
 
-    async def fetch_value(self,query:str, values: Optional[Dict[str,Any]] = None):
-        return await self.database.fetch_val(query=query, values=values)
+        async def timed():
+            started = time.perf_counter()
+            failed = True
+            try:
+                with tracer.span("postgresql", "db", statement=fingerprint):
+                    result = await operation()
+                failed = False
+                return result
+            finally:
+                query_stats.record("postgresql", fingerprint, time.perf_counter() - started, failed, values)
 
-    async def fetch_all(self,query:str,values: Optional[Dict[str,Any]] = None):
-        return await self.database.fetch_all(query=query, values=values)
+        return await self.circuit_breaker.call(timed, timeout, lambda e: isinstance(e, CONNECTION_ERRORS))
 
 #global instance
 postgre_manager = PostgreDbManager()
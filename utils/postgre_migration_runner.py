@@ -0,0 +1,123 @@
+import json
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Set
+from .postgre_db_manager import PostgreDbManager
+from .logger import logger
+
+# Arbitrary key of the advisory lock that serializes migrations across app instances
+MIGRATION_LOCK_KEY = 72010001
+
+CREATE_MIGRATION_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migration (
+        version INTEGER NOT NULL,
+        description VARCHAR(500) NOT NULL,
+        applied_on TIMESTAMP NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (version)
+    )
+"""
+
+
+class Migration(BaseModel):
+    """A versioned schema change, applied at most once"""
+    version: int = Field(..., description="unique, increasing version number")
+    description: str = Field(..., description="what the migration does")
+    statements: List[str] = Field(..., description="SQL statements, executed in order")
+    transactional: bool = Field(True, description="False for statements that can't run in a transaction, e.g. CREATE INDEX CONCURRENTLY. "
+                                                  "Such statements must be idempotent, they are executed again if the migration fails midway")
+
+
+class MigrationRunner:
+    """Applies pending migrations and checks the plans of registered hot queries"""
+
+    def __init__(self, manager: PostgreDbManager, migrations: List[Migration]):
+        self.manager = manager
+        self.migrations = sorted(migrations, key=lambda migration: migration.version)
+
+    async def migrate(self, transactional_only: bool = False) -> List[int]:
+        """
+        Applies the migrations that have not been applied yet.
+        With transactional_only, stops before the first pending non-transactional migration
+        (backfills, CREATE INDEX CONCURRENTLY), which may run for long on a large table and is
+        left to the postgre_migrations.py command; later migrations may depend on it.
+        Returns the versions that were applied.
+        """
+        applied_now = []
+        async with self.manager.connection():
+            await self.manager.execute(CREATE_MIGRATION_TABLE)
+            # Waits for another instance applying migrations, and DDL may run long: no deadline
+            await self.manager.execute("SELECT pg_advisory_lock(:key)", {"key": MIGRATION_LOCK_KEY}, timeout=None)
+            try:
+                applied = await self.applied_versions()
+                for migration in self.migrations:
+                    if migration.version in applied:
+                        continue
+                    if transactional_only and not migration.transactional:
+                        pending = [remaining.version for remaining in self.migrations
+                                   if remaining.version not in applied and remaining.version not in applied_now]
+                        logger.warning(f"Postgre migrations {pending} are pending, apply them with postgre_migrations.py")
+                        break
+                    await self._apply(migration)
+                    applied_now.append(migration.version)
+            finally:
+                await self.manager.execute("SELECT pg_advisory_unlock(:key)", {"key": MIGRATION_LOCK_KEY})
+
+        if applied_now:
+            logger.info(f"Applied Postgre migrations: {applied_now}")
+        else:
+            logger.info("Postgre schema is up to date")
+        return applied_now
+
+    async def applied_versions(self) -> Set[int]:
+        records = await self.manager.fetch_all("SELECT version FROM schema_migration")
+        return {record['version'] for record in records}
+
+    async def _apply(self, migration: Migration):
+        logger.info(f"Applying Postgre migration {migration.version}: {migration.description}")
+        if migration.transactional:
+            async with self.manager.transaction():
+                await self._execute_statements(migration)
+        else:
+            await self._execute_statements(migration)
+
+    async def _execute_statements(self, migration: Migration):
+        for statement in migration.statements:
+            await self.manager.execute(statement, timeout=None)
+        await self.manager.execute(
+            "INSERT INTO schema_migration (version, description) VALUES (:version, :description)",
+            {"version": migration.version, "description": migration.description}
+        )
+
+    async def check_query_plans(self) -> Dict[str, List[str]]:
+        """
+        Runs EXPLAIN on every registered hot query with sequential scans disabled,
+        so that the planner falls back to one only when no usable index exists.
+        Returns query name -> relations read by a sequential scan, for the offending queries only.
+        """
+        failures = {}
+        async with self.manager.connection():
+            for name, (query, values) in self.manager.hot_queries.items():
+                transaction = self.manager.transaction()
+                await transaction.start()
+                try:
+                    await self.manager.execute("SET LOCAL enable_seqscan = off")
+                    plan = await self.manager.fetch_value(f"EXPLAIN (FORMAT JSON) {query}", values)
+                finally:
+                    await transaction.rollback()
+
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                seq_scans = self._seq_scans(plan[0]["Plan"])
+                if seq_scans:
+                    failures[name] = seq_scans
+                    logger.error(f"Hot query {name} uses a sequential scan on {seq_scans}")
+                else:
+                    logger.info(f"Hot query {name} plan OK")
+        return failures
+
+    def _seq_scans(self, plan: Dict[str, Any]) -> List[str]:
+        relations = []
+        if plan.get("Node Type") == "Seq Scan":
+            relations.append(plan.get("Relation Name"))
+        for child in plan.get("Plans", []):
+            relations.extend(self._seq_scans(child))
+        return relations
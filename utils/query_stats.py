@@ -0,0 +1,170 @@
+import functools
+import json
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from models.admin_models import QueryStatsEntry
+from .latency_histogram import LatencyHistogram
+from .config import settings
+from .logger import logger
+from .metrics import metrics_registry
+
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+# Mongo operations whose arguments are documents to write, not a query shape
+_UNSHAPED_OPERATIONS = frozenset({"insert_one", "insert_many", "bulk_write", "create_index", "create_indexes"})
+
+
+@functools.lru_cache(maxsize=2048)
+def sql_fingerprint(query: str) -> str:
+    """The SQL text with literals replaced by ? and whitespace collapsed, bind parameters are kept"""
+    return _WHITESPACE.sub(" ", _SQL_LITERALS.sub("?", query)).strip()
+
+
+def mongo_fingerprint(collection: str, operation: str, args: Tuple[Any, ...]) -> str:
+    """Collection, operation and the shape of the filter/pipeline/update, every value replaced by ?"""
+    if operation in _UNSHAPED_OPERATIONS or not args:
+        return f"{collection}.{operation}"
+    if operation == "distinct":
+        key, args = args[0], args[1:]
+        return f"{collection}.distinct({key}) {_render_shape(args)}"
+    return f"{collection}.{operation} {_render_shape(args[:2])}"
+
+
+def _render_shape(args: Tuple[Any, ...]) -> str:
+    return " ".join(json.dumps(_shape(arg)) for arg in args)
+
+
+def _shape(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {str(key): _shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            return [_shape(item) for item in value]
+        return ["?"]
+    return "?"
+
+
+def redact_params(values: Optional[Dict[str, Any]]) -> Optional[Dict[str, str]]:
+    """Parameter names with the type of their value (and length of lists), never the value itself"""
+    if not values:
+        return None
+    redacted = {}
+    for name, value in values.items():
+        if isinstance(value, (list, tuple)):
+            redacted[name] = f"<{type(value).__name__}[{len(value)}]>"
+        else:
+            redacted[name] = f"<{type(value).__name__}>"
+    return redacted
+
+
+class _FingerprintStats:
+    def __init__(self):
+        # (bucket start, latencies, errors), oldest first
+        self.buckets: Deque[Tuple[int, LatencyHistogram, List[int]]] = deque()
+
+
+class QueryStats:
+    """
+    Latency of every database operation per fingerprint, over a rolling window made of
+    bucket_seconds buckets. Operations slower than slow_threshold_seconds are logged with
+    their parameters redacted. At most max_fingerprints are tracked, the least recently
+    seen one is dropped first.
+    """
+
+    def __init__(self, window_seconds: int, slow_threshold_seconds: float, max_fingerprints: int,
+                 bucket_seconds: int = 60):
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.slow_threshold_seconds = slow_threshold_seconds
+        self.max_fingerprints = max_fingerprints
+        self._fingerprints: "OrderedDict[Tuple[str, str], _FingerprintStats]" = OrderedDict()
+
+        self.recorded = 0
+        self.slow = 0
+        self.evicted = 0
+        metrics_registry.register("query_stats", self.stats)
+
+    def record(self, source: str, fingerprint: str, seconds: float, failed: bool = False,
+               params: Optional[Dict[str, Any]] = None):
+        self.recorded += 1
+        key = (source, fingerprint)
+        entry = self._fingerprints.get(key)
+        if entry is None:
+            entry = self._fingerprints[key] = _FingerprintStats()
+            if len(self._fingerprints) > self.max_fingerprints:
+                self._fingerprints.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._fingerprints.move_to_end(key)
+
+        bucket_start = int(time.time()) // self.bucket_seconds * self.bucket_seconds
+        if not entry.buckets or entry.buckets[-1][0] != bucket_start:
+            entry.buckets.append((bucket_start, LatencyHistogram(), [0]))
+            self._expire(entry)
+        _, histogram, errors = entry.buckets[-1]
+        histogram.add(seconds)
+        errors[0] += failed
+
+        if seconds >= self.slow_threshold_seconds:
+            self.slow += 1
+            logger.warning(
+                f"Slow {source} query took {seconds * 1000:.1f}ms{' and failed' if failed else ''}: "
+                f"{fingerprint} params={redact_params(params)}"
+            )
+
+    def top(self, limit: int, order_by: str = "total", source: Optional[str] = None) -> List[QueryStatsEntry]:
+        """The limit fingerprints with the highest order_by (total, count, mean, p99 or max) over the window"""
+        entries = []
+        for (entry_source, fingerprint), entry in list(self._fingerprints.items()):
+            if source and entry_source != source:
+                continue
+            self._expire(entry)
+            histogram = LatencyHistogram()
+            errors = 0
+            for _, bucket_histogram, bucket_errors in entry.buckets:
+                histogram.merge(bucket_histogram)
+                errors += bucket_errors[0]
+            if not histogram.count:
+                continue
+            entries.append(QueryStatsEntry(
+                source=entry_source,
+                fingerprint=fingerprint,
+                count=histogram.count,
+                errors=errors,
+                totalMs=round(histogram.total * 1000, 3),
+                meanMs=round(histogram.mean * 1000, 3),
+                p50Ms=round(histogram.percentile(50) * 1000, 3),
+                p99Ms=round(histogram.percentile(99) * 1000, 3),
+                maxMs=round(histogram.max * 1000, 3)
+            ))
+
+        sort_field = {"total": "totalMs", "count": "count", "mean": "meanMs", "p99": "p99Ms", "max": "maxMs"}[order_by]
+        entries.sort(key=lambda item: getattr(item, sort_field), reverse=True)
+        return entries[:limit]
+
+    def reset(self):
+        self._fingerprints.clear()
+
+    def _expire(self, entry: _FingerprintStats):
+        horizon = time.time() - self.window_seconds
+        while entry.buckets and entry.buckets[0][0] + self.bucket_seconds <= horizon:
+            entry.buckets.popleft()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "fingerprints": len(self._fingerprints),
+            "recorded": self.recorded,
+            "slow": self.slow,
+            "evicted": self.evicted
+        }
+
+
+# Global instance
+query_stats = QueryStats(
+    window_seconds=settings.QUERY_STATS_WINDOW_MINUTES * 60,
+    slow_threshold_seconds=settings.SLOW_QUERY_THRESHOLD_MS / 1000,
+    max_fingerprints=settings.QUERY_STATS_MAX_FINGERPRINTS
+)
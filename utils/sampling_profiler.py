@@ -0,0 +1,106 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+from business_exception import BusinessException
+from models.status_code import sc
+from .logger import logger
+from .metrics import metrics_registry
+
+# Outermost frames of deeper stacks are dropped
+MAX_STACK_DEPTH = 64
+
+# Leaf frames of a thread waiting for work, left out of the profile unless idle threads are asked for
+IDLE_LEAVES = {
+    ("threading.py", "wait"), ("queue.py", "get"), ("selectors.py", "select"), ("selectors.py", "poll"),
+    ("threading.py", "_wait_for_tstate_lock"), ("thread.py", "_worker"), ("periodic_executor.py", "_run"),
+}
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler: a thread samples the stacks of all other threads (the event loop
+    thread and the executor threads) every interval and counts identical stacks. The result
+    is in collapsed stack format ("thread;outer;...;inner count" per line), as read by
+    flamegraph.pl, speedscope or inferno. Sampling reads frames without tracing, so the
+    overhead only depends on the interval. One session runs at a time.
+    """
+
+    def __init__(self):
+        self._busy = False
+        self.sessions = 0
+        self.last_session: Optional[Dict[str, Any]] = None
+        metrics_registry.register("sampling_profiler", self.stats)
+
+    async def profile(self, seconds: float, interval_seconds: float, include_idle: bool = False) -> str:
+        """Samples for seconds and returns the collapsed stacks. Call it from the event loop."""
+        if self._busy:
+            raise BusinessException(
+                message="A profiling session is already running, try again when it is done",
+                error_code=sc.CONFLICT
+            )
+        self._busy = True
+        loop_thread_id = threading.get_ident()
+        logger.info(f"Profiling for {seconds}s every {interval_seconds * 1000:.1f}ms")
+        sampling = asyncio.ensure_future(asyncio.to_thread(self._sample, seconds, interval_seconds, loop_thread_id, include_idle))
+        # The session ends with the sampler thread, not with the request: a cancelled request
+        # (client gone, load shedding) leaves the thread sampling until its deadline
+        sampling.add_done_callback(self._end_session)
+        stacks, samples = await asyncio.shield(sampling)
+        self.sessions += 1
+        self.last_session = {"seconds": seconds, "samples": samples, "distinct_stacks": len(stacks)}
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+    def _end_session(self, sampling: asyncio.Future):
+        self._busy = False
+        if not sampling.cancelled() and sampling.exception() is not None:
+            logger.error(f"Profiling session failed: {sampling.exception()!r}")
+
+    def _sample(self, seconds: float, interval_seconds: float, loop_thread_id: int, include_idle: bool):
+        sampler_thread_id = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        next_sample = time.monotonic()
+
+        while next_sample < deadline:
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_thread_id:
+                    continue
+                stack = self._collapse(frame, include_idle)
+                if stack is None:
+                    continue
+                thread_name = "event-loop" if thread_id == loop_thread_id else thread_names.get(thread_id, str(thread_id))
+                stacks[f"{thread_name};{stack}"] += 1
+            samples += 1
+
+            next_sample += interval_seconds
+            delay = next_sample - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Sampling fell behind (e.g. GIL contention), skip the missed samples rather than bursting
+                next_sample = time.monotonic()
+        return stacks, samples
+
+    @staticmethod
+    def _collapse(frame, include_idle: bool) -> Optional[str]:
+        if not include_idle and (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_LEAVES:
+            return None
+        names = []
+        while frame is not None and len(names) < MAX_STACK_DEPTH:
+            module = frame.f_globals.get("__name__", "?")
+            names.append(f"{module}.{frame.f_code.co_qualname}")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"busy": self._busy, "sessions": self.sessions, "last_session": self.last_session}
+
+
+# Global instance
+sampling_profiler = SamplingProfiler()
@@ -0,0 +1,225 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from pydantic import TypeAdapter
+from .metrics import metrics_registry
+from .single_flight import SingleFlight
+from .ttl_cache import MISSING
+
+MAGIC = b"TPLCACH1"
+# magic, slot count, slot size, generation
+HEADER = struct.Struct("<8sIIQ")
+HEADER_SIZE = 64
+# key hash (0 for a free slot), expires at, last access, key length, value length, negative
+SLOT_HEADER = struct.Struct("<QddHIB")
+# Slots a key may live in: eviction picks the least recently used of them
+WAYS = 8
+
+FLAG_NEGATIVE = 1
+
+
+class SharedMemoryCache:
+    """
+    Cache kept in a memory-mapped file (in /dev/shm by default), shared by the worker
+    processes of the machine: entries loaded by one worker are hits for the others, and
+    memory is spent once. Same API as TTLCache.
+
+    The segment is an array of fixed size slots, grouped in sets of WAYS slots; a key may
+    only live in the set its hash selects, so lookups read at most WAYS slots. A full set
+    evicts its least recently used slot (LRU within the set, approximate overall). Keys are
+    stored as repr(key), values as JSON through a pydantic TypeAdapter of value_type;
+    entries larger than a slot are not cached. Access is serialized across processes with
+    flock; within a process, use it from the event loop thread only.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl_seconds: float, negative_ttl_seconds: float,
+                 directory: str, namespace: str, slot_bytes: int, value_type: Any = Any):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.slot_bytes = slot_bytes
+        self.sets = max(1, -(-max_entries // WAYS))
+        self.slots = self.sets * WAYS
+        # Workers of one deployment share the segment, other deployments on the machine get their own.
+        # The geometry is part of the name: workers still mapping a segment of another geometry
+        # (rolling restart after a settings change) keep theirs, it is never resized under them.
+        self.path = os.path.join(directory, f"template-cache-{namespace}-{name}-{self.slots}x{slot_bytes}.bin")
+        self._adapter = TypeAdapter(value_type)
+        self._loads = SingleFlight(name)
+
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = HEADER_SIZE + self.slots * slot_bytes
+        with self._locked(fcntl.LOCK_EX):
+            if os.fstat(self._fd).st_size < size:
+                # New segment, only ever grown
+                os.ftruncate(self._fd, size)
+            self._map = mmap.mmap(self._fd, size)
+            if not self._has_layout():
+                # New segment, or one left half made by a crashed worker: start empty
+                self._map[:] = bytes(size)
+                HEADER.pack_into(self._map, 0, MAGIC, self.slots, slot_bytes, 0)
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.oversized = 0
+        metrics_registry.register(f"cache.{name}", self.stats)
+
+    def get(self, key: Hashable) -> Any:
+        """Returns the cached value (None for a cached miss), or MISSING"""
+        key_bytes, key_hash = self._key(key)
+        now = time.time()
+        with self._locked(fcntl.LOCK_SH):
+            offset = self._find(key_bytes, key_hash)
+            if offset is None:
+                self.misses += 1
+                return MISSING
+            _, expires_at, _, key_length, value_length, flags = SLOT_HEADER.unpack_from(self._map, offset)
+            if expires_at <= now:
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            # Racy under the shared lock, but only the eviction order depends on it
+            struct.pack_into("<d", self._map, offset + 16, now)
+            start = offset + SLOT_HEADER.size + key_length
+            data = self._map[start:start + value_length]
+
+        if flags & FLAG_NEGATIVE:
+            self.negative_hits += 1
+            return None
+        self.hits += 1
+        return self._adapter.validate_json(data)
+
+    def put(self, key: Hashable, value: Any):
+        key_bytes, key_hash = self._key(key)
+        data = b"" if value is None else self._adapter.dump_json(value)
+        if SLOT_HEADER.size + len(key_bytes) + len(data) > self.slot_bytes:
+            self.oversized += 1
+            return
+
+        now = time.time()
+        ttl = self.negative_ttl_seconds if value is None else self.ttl_seconds
+        with self._locked(fcntl.LOCK_EX):
+            offset = self._find(key_bytes, key_hash)
+            if offset is None:
+                offset = self._victim(key_hash, now)
+            SLOT_HEADER.pack_into(self._map, offset, key_hash, now + ttl, now, len(key_bytes), len(data),
+                                  FLAG_NEGATIVE if value is None else 0)
+            start = offset + SLOT_HEADER.size
+            self._map[start:start + len(key_bytes)] = key_bytes
+            self._map[start + len(key_bytes):start + len(key_bytes) + len(data)] = data
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Returns the cached value, or loads, caches and returns it on a miss"""
+        value = self.get(key)
+        if value is not MISSING:
+            return value
+        return await self._loads.do(key, lambda: self._load(key, loader))
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        generation = self._generation()
+        value = await loader()
+        # Any worker invalidating meanwhile bumps the generation, the value may already be stale
+        if generation == self._generation():
+            self.put(key, value)
+        return value
+
+    def invalidate(self, key: Hashable):
+        """Drops the entry for every worker, and makes loads in flight skip caching their result"""
+        key_bytes, key_hash = self._key(key)
+        with self._locked(fcntl.LOCK_EX):
+            offset = self._find(key_bytes, key_hash)
+            if offset is not None:
+                struct.pack_into("<Q", self._map, offset, 0)
+            self._bump_generation()
+        self._loads.forget(key)
+        self.invalidations += 1
+
+    def clear(self):
+        with self._locked(fcntl.LOCK_EX):
+            for slot in range(self.slots):
+                struct.pack_into("<Q", self._map, HEADER_SIZE + slot * self.slot_bytes, 0)
+            self._bump_generation()
+
+    def _key(self, key: Hashable):
+        key_bytes = repr(key).encode("utf-8")
+        key_hash = int.from_bytes(hashlib.blake2b(key_bytes, digest_size=8).digest(), "little") or 1
+        return key_bytes, key_hash
+
+    def _set_offset(self, key_hash: int) -> int:
+        return HEADER_SIZE + (key_hash % self.sets) * WAYS * self.slot_bytes
+
+    def _find(self, key_bytes: bytes, key_hash: int) -> Optional[int]:
+        offset = self._set_offset(key_hash)
+        for _ in range(WAYS):
+            slot_hash, _, _, key_length, _, _ = SLOT_HEADER.unpack_from(self._map, offset)
+            if slot_hash == key_hash:
+                start = offset + SLOT_HEADER.size
+                if self._map[start:start + key_length] == key_bytes:
+                    return offset
+            offset += self.slot_bytes
+        return None
+
+    def _victim(self, key_hash: int, now: float) -> int:
+        """A free or expired slot of the set, else its least recently used one"""
+        offset = self._set_offset(key_hash)
+        victim, victim_access = offset, None
+        for _ in range(WAYS):
+            slot_hash, expires_at, last_access, _, _, _ = SLOT_HEADER.unpack_from(self._map, offset)
+            if slot_hash == 0 or expires_at <= now:
+                return offset
+            if victim_access is None or last_access < victim_access:
+                victim, victim_access = offset, last_access
+            offset += self.slot_bytes
+        self.evictions += 1
+        return victim
+
+    def _has_layout(self) -> bool:
+        magic, slots, slot_bytes, _ = HEADER.unpack_from(self._map, 0)
+        return magic == MAGIC and slots == self.slots and slot_bytes == self.slot_bytes
+
+    def _generation(self) -> int:
+        return HEADER.unpack_from(self._map, 0)[3]
+
+    def _bump_generation(self):
+        magic, slots, slot_bytes, generation = HEADER.unpack_from(self._map, 0)
+        HEADER.pack_into(self._map, 0, magic, slots, slot_bytes, generation + 1)
+
+    @contextmanager
+    def _locked(self, operation: int):
+        fcntl.flock(self._fd, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._locked(fcntl.LOCK_SH):
+            size = 0
+            for slot in range(self.slots):
+                slot_hash, expires_at = struct.unpack_from("<Qd", self._map, HEADER_SIZE + slot * self.slot_bytes)
+                size += slot_hash != 0 and expires_at > now
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "backend": "shared",
+            "size": size,
+            "max_entries": self.slots,
+            # the counters below are of this worker
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "oversized": self.oversized
+        }
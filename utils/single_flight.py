@@ -0,0 +1,57 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar, Any
+from .metrics import metrics_registry
+
+T = TypeVar('T')
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: while a call is in flight,
+    callers with the same key wait for it and share its result or exception
+    instead of issuing their own.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+        self.merged = 0
+        metrics_registry.register(f"single_flight.{name}", self.stats)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.merged += 1
+        else:
+            self.executions += 1
+            # Runs in its own task so that a cancelled caller doesn't cancel the call for the others
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def forget(self, key: Hashable):
+        """
+        Makes callers arriving from now on issue a new call, e.g. after the data behind the key changed.
+        Callers already waiting still get the result of the call in flight.
+        """
+        self._in_flight.pop(key, None)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Marks the exception as retrieved when every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "merged": self.merged,
+            "merged_ratio": round(self.merged / self.calls, 4) if self.calls else 0.0,
+            "in_flight": len(self._in_flight)
+        }
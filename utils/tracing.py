@@ -0,0 +1,251 @@
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import secrets
+import sys
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from .config import settings
+from .logger import request_id
+from .metrics import metrics_registry
+
+T = TypeVar("T")
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# A request ID sent by the caller (gateway, other service) is kept when it looks like one
+VALID_REQUEST_ID = re.compile(r"[A-Za-z0-9._:-]{1,64}")
+
+# Used for the calls made outside of a sampled request
+NO_SPAN = nullcontext()
+
+
+class Span:
+    """One timed operation of a trace: the request, a service or repository call, a query"""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "attributes", "start", "started", "duration_ms", "error")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, kind: str, attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "error": self.error,
+            "attributes": self.attributes
+        }
+
+
+# Span of the current call, None outside of a sampled request
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    Lightweight request tracing. A sampled request gets a root span, and the services,
+    repositories and database managers called while handling it open child spans, linked
+    through a context variable. Finished spans are exported as JSON lines (one per span,
+    trace_id being the request ID found in the log lines) to a file or stdout, written by a
+    background thread.
+
+    Calls made outside of a sampled request cost a context variable lookup.
+    """
+
+    def __init__(self, exporter: str, sample_rate: float, file_path: str):
+        self.sample_rate = sample_rate
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        self._export = self._create_exporter(exporter, file_path)
+        self.requests = 0
+        self.sampled_requests = 0
+        self.exported_spans = 0
+        metrics_registry.register("tracing", self.stats)
+
+    def _create_exporter(self, exporter: str, file_path: str) -> Optional[logging.Logger]:
+        if exporter == "none":
+            return None
+        export_logger = logging.getLogger("Template-Project.traces")
+        export_logger.setLevel(logging.INFO)
+        # Spans only go to the exporter, not to app.log
+        export_logger.propagate = False
+        if exporter == "stdout":
+            handler = logging.StreamHandler(sys.stdout)
+        else:
+            os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                filename=file_path,
+                maxBytes=10 * 1024 * 1024,
+                backupCount=5,
+                encoding="utf-8"
+            )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        # The event loop only queues the spans, a thread writes them (and rolls the file over)
+        spans = queue.SimpleQueue()
+        export_logger.addHandler(logging.handlers.QueueHandler(spans))
+        self._listener = logging.handlers.QueueListener(spans, handler)
+        self._listener.start()
+        return export_logger
+
+    def stop(self):
+        """Writes the spans still queued"""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    def start_trace(self, trace_id: str, name: str, **attributes) -> Optional[Span]:
+        """Root span of a request, or None when the request is not sampled"""
+        self.requests += 1
+        if self._export is None or random.random() >= self.sample_rate:
+            return None
+        self.sampled_requests += 1
+        return Span(trace_id, None, name, "server", attributes)
+
+    def span(self, name: str, kind: str = "internal", **attributes):
+        """Context manager timing a child span of the current one, yields None outside of a sampled request"""
+        parent = current_span.get()
+        if parent is None:
+            return NO_SPAN
+        return self._child(Span(parent.trace_id, parent.span_id, name, kind, attributes))
+
+    @contextmanager
+    def _child(self, span: Span):
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            current_span.reset(token)
+            self.finish(span)
+
+    def finish(self, span: Span):
+        span.duration_ms = round((time.perf_counter() - span.started) * 1000, 3)
+        self.exported_spans += 1
+        self._export.info(json.dumps(span.to_dict(), default=str))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sample_rate": self.sample_rate,
+            "exporter": settings.TRACE_EXPORTER,
+            "requests": self.requests,
+            "sampled_requests": self.sampled_requests,
+            "exported_spans": self.exported_spans
+        }
+
+
+def traced(kind: str):
+    """
+    Decorator timing each call of an async function as a child span, named after the
+    method (UserService.get_user) or the module and function (auth_repository.get_app_user)
+    """
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        qualified_name = func.__qualname__
+        if "." not in qualified_name:
+            qualified_name = f"{func.__module__.rsplit('.', 1)[-1]}.{qualified_name}"
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs) -> T:
+            if current_span.get() is None:
+                return await func(*args, **kwargs)
+            with tracer.span(qualified_name, kind):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TracingMiddleware:
+    """
+    Gives every request an ID, taken from the X-Request-ID header when the caller sent one,
+    that is added to the log records and returned in the X-Request-ID response header, and
+    starts the root span of the sampled requests.
+
+    Unhandled exceptions are answered here with error_handler, while the request ID is still
+    set: Starlette would otherwise run the Exception handler outside of every middleware,
+    without the ID in its log lines or on the 500 response.
+    """
+
+    def __init__(self, app: ASGIApp, error_handler: Callable[[Request, Exception], Awaitable[Response]]):
+        self.app = app
+        self.error_handler = error_handler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = Headers(scope=scope).get(REQUEST_ID_HEADER)
+        trace_id = incoming if incoming and VALID_REQUEST_ID.fullmatch(incoming) else uuid.uuid4().hex
+        span = tracer.start_trace(trace_id, f"{scope['method']} {scope['path']}", method=scope["method"])
+        request_id_token = request_id.set(trace_id)
+        span_token = current_span.set(span)
+        response_started = False
+
+        async def send_with_request_id(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+                MutableHeaders(scope=message).append(REQUEST_ID_HEADER, trace_id)
+                if span is not None:
+                    span.set_attribute("status_code", message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        except Exception as e:
+            if span is not None:
+                span.error = type(e).__name__
+            if response_started:
+                # Too late for an error response
+                raise
+            response = await self.error_handler(Request(scope, receive), e)
+            await response(scope, receive, send_with_request_id)
+        except BaseException as e:
+            if span is not None:
+                span.error = type(e).__name__
+            raise
+        finally:
+            current_span.reset(span_token)
+            request_id.reset(request_id_token)
+            if span is not None:
+                # Named after the route template once routing is done, so that spans of a route group together
+                route = scope.get("route")
+                if route is not None:
+                    span.name = f"{scope['method']} {route.path}"
+                tracer.finish(span)
+
+
+# Global instance
+tracer = Tracer(
+    exporter=settings.TRACE_EXPORTER,
+    sample_rate=settings.TRACE_SAMPLE_RATE,
+    file_path=settings.TRACE_FILE
+)
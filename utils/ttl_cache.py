@@ -0,0 +1,108 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from .metrics import metrics_registry
+from .single_flight import SingleFlight
+
+# Returned by get when the key is not cached (None is a cached miss)
+MISSING: Any = object()
+
+
+class TTLCache:
+    """
+    Bounded in-process read-through cache: least recently used entries are evicted beyond
+    max_entries and entries expire ttl_seconds after they were loaded. A load returning None
+    (the entity does not exist) is cached as well, for negative_ttl_seconds, so repeated
+    lookups of missing keys don't reach the database either.
+
+    Concurrent misses for the same key share one load. A load that overlaps an invalidation
+    is returned to its callers but not cached, as it may already be stale.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl_seconds: float, negative_ttl_seconds: float):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        # key -> (expires at, value)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._loads = SingleFlight(name)
+        # Bumped on every invalidation
+        self._version = 0
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        metrics_registry.register(f"cache.{name}", self.stats)
+
+    def get(self, key: Hashable) -> Any:
+        """Returns the cached value (None for a cached miss), or MISSING"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return MISSING
+
+        self._entries.move_to_end(key)
+        if value is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        ttl = self.negative_ttl_seconds if value is None else self.ttl_seconds
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Returns the cached value, or loads, caches and returns it on a miss"""
+        value = self.get(key)
+        if value is not MISSING:
+            return value
+        return await self._loads.do(key, lambda: self._load(key, loader))
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        version = self._version
+        value = await loader()
+        if version == self._version:
+            self.put(key, value)
+        return value
+
+    def invalidate(self, key: Hashable):
+        """Drops the entry, and makes loads in flight for any key skip caching their result"""
+        self._entries.pop(key, None)
+        self._loads.forget(key)
+        self._version += 1
+        self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._version += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "backend": "memory",
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }